@@ -0,0 +1,448 @@
+#!/bin/python3
+"""Micro-benchmarks for hot paths of the Zoia compiler. Run from the top level
+or from the scripts folder, e.g.:
+
+    python scripts/benchmark.py parse-args"""
+import argparse
+import gc
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+# The benchmarks import from src, which only works once main has put it on
+# sys.path
+# pylint: disable=import-outside-toplevel
+
+def _find_src_path() -> Path:
+    """Returns the path to the src folder, see fixups.py."""
+    curr_path = Path.cwd()
+    src_path = curr_path.parent / 'src'
+    if not src_path.is_dir():
+        src_path = curr_path / 'src'
+        if not src_path.is_dir():
+            raise RuntimeError('Failed to find src path, run this script from '
+                               'top level or from scripts folder')
+    return src_path
+
+def _time(label: str, bench_func, num_rounds: int, calls_per_round: int):
+    """Times the specified function and prints the time per call, using the
+    best of five repetitions to filter out noise."""
+    best_secs = min(timeit.repeat(bench_func, number=num_rounds, repeat=5))
+    per_call = best_secs / (num_rounds * calls_per_round)
+    print(f'{label:<40} {per_call * 1e6:10.1f} us/call')
+
+# Typical command argument strings, like the Default values of commands
+_ARG_STRINGS = ['x', 'foo bar', '*emphasized* text', r'\command[a; b=c]',
+                'some longer sentence, with punctuation: and more!']
+
+def bench_parse_args(num_rounds: int):
+    """Compares parsing small argument strings through sa_zoia.parse with and
+    without reusing pooled recognizers."""
+    from _vendor.antlr4 import InputStream
+    from grammar import parse
+    from parsing import recognizer_pool
+    def parse_args():
+        for arg_str in _ARG_STRINGS:
+            parse(InputStream(arg_str), 'lineElementsArg')
+    # Warm up the DFAs first so that only the per-call overhead differs
+    parse_args()
+    # pylint: disable=protected-access
+    max_idle = recognizer_pool._MAX_IDLE
+    recognizer_pool._MAX_IDLE = 0
+    try:
+        _time('new recognizers per call', parse_args, num_rounds,
+              len(_ARG_STRINGS))
+    finally:
+        recognizer_pool._MAX_IDLE = max_idle
+    _time('pooled recognizers', parse_args, num_rounds, len(_ARG_STRINGS))
+
+# The largest Zoia file in the repository, used by the whole-file benchmarks
+_OTHELLO_PROJECT = Path('doc', 'examples', 'othello')
+_OTHELLO_CHAPTER = _OTHELLO_PROJECT / 'src' / 'work1' / 'ch1' / 'main.zoia'
+
+def _count_nodes(zoia_ast) -> int:
+    """Returns the number of nodes in the specified AST."""
+    from ast_nodes import AASTNode
+    num_nodes = 0
+    to_check = [zoia_ast]
+    while to_check:
+        node_val = to_check.pop()
+        if isinstance(node_val, list):
+            to_check.extend(node_val)
+        elif isinstance(node_val, AASTNode):
+            num_nodes += 1
+            to_check.extend(getattr(node_val, a) for a in node_val.__slots__
+                            if hasattr(node_val, a))
+    return num_nodes
+
+def _traced_alloc(alloc_func):
+    """Calls the specified function and returns its result, along with the
+    amount of memory (in bytes) that is still allocated once it returns."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        mem_before = tracemalloc.get_traced_memory()[0]
+        alloc_result = alloc_func()
+        gc.collect()
+        mem_alloc = tracemalloc.get_traced_memory()[0] - mem_before
+    finally:
+        tracemalloc.stop()
+    return alloc_result, mem_alloc
+
+def _parse_othello(leaf_pool=None):
+    """Parses the Othello example's largest chapter. Validation is skipped,
+    since the example uses commands that have not been implemented yet."""
+    from zoia_processor import process_zoia_file
+    top_path = _find_src_path().parent
+    return process_zoia_file(top_path / _OTHELLO_CHAPTER,
+                             top_path / _OTHELLO_PROJECT,
+                             skip_validation=True, leaf_pool=leaf_pool)
+
+def bench_ast_memory(_num_rounds: int):
+    """Measures how much memory the AST of the Othello example's largest
+    chapter keeps alive once parsing is done."""
+    # Warm up first, so that lazily initialized modules and caches don't end
+    # up in the measurement
+    _parse_othello()
+    zoia_ast, mem_ast = _traced_alloc(_parse_othello)
+    num_nodes = _count_nodes(zoia_ast)
+    print(f'{"AST nodes":<40} {num_nodes:10}')
+    print(f'{"retained AST memory":<40} {mem_ast / 2**20:10.2f} MiB')
+    print(f'{"per node":<40} {mem_ast / num_nodes:10.1f} B')
+
+def bench_columnar_ast(_num_rounds: int):
+    """Compares the regular and columnar ASTs of the Othello example's largest
+    chapter in terms of memory, serialization and scanning all text."""
+    import pickle
+    from ast_visitor import AASTVisitor
+    from columnar_ast import ColumnarAST, NodeKind
+    zoia_ast = _parse_othello()
+    col_ast = ColumnarAST.from_node(zoia_ast)
+    # Go through bytes, so that the columnar AST does not share its strings
+    # with the regular one
+    col_bytes = col_ast.to_bytes()
+    col_ast, mem_col = _traced_alloc(lambda: ColumnarAST.from_bytes(
+        col_bytes))
+    print(f'{"columnar AST memory":<40} {mem_col / 2**20:10.2f} MiB')
+    print(f'{"columnar AST serialized size":<40} '
+          f'{len(col_bytes) / 2**20:10.2f} MiB')
+    pickled_ast = pickle.dumps(zoia_ast, protocol=pickle.HIGHEST_PROTOCOL)
+    pickled_col = pickle.dumps(col_ast, protocol=pickle.HIGHEST_PROTOCOL)
+    _time('pickle.dumps (regular)', lambda: pickle.dumps(
+        zoia_ast, protocol=pickle.HIGHEST_PROTOCOL), 1, 1)
+    _time('pickle.dumps (columnar)', lambda: pickle.dumps(
+        col_ast, protocol=pickle.HIGHEST_PROTOCOL), 1, 1)
+    _time('pickle.loads (regular)', lambda: pickle.loads(pickled_ast), 1, 1)
+    _time('pickle.loads (columnar)', lambda: pickle.loads(pickled_col), 1, 1)
+    class _TextLength(AASTVisitor):
+        __slots__ = ('text_len',)
+        def __init__(self):
+            self.text_len = 0
+        def visit_text_fragment(self, node):
+            self.text_len += len(node.text_val)
+    _time('text scan (regular, visitor)',
+          lambda: _TextLength().visit(zoia_ast), 1, 1)
+    def _scan_columnar():
+        strings = col_ast.strings
+        str_indices = col_ast.str_indices
+        return sum(len(strings[str_indices[i]]) for i in
+                   col_ast.indices_of_kind(NodeKind.TEXT_FRAGMENT))
+    _time('text scan (columnar, arrays)', _scan_columnar, 1, 1)
+
+def bench_visitor(num_rounds: int):
+    """Compares a full default visit and an identity mapping of the Othello
+    example's largest chapter with the compiled field accessors against the
+    reflection-based implementation they replaced, and against the iterative
+    walks."""
+    from ast_mapper import AASTMapper
+    from ast_nodes import AASTNode
+    from ast_visitor import AASTVisitor, WALK_POST_ORDER, WALK_PRE_ORDER
+    class _ReflectiveVisitor(AASTVisitor):
+        __slots__ = ()
+        def _visit_default(self, node: AASTNode):
+            last_tf = None
+            for node_attr in node.__slots__:
+                if not hasattr(node, node_attr):
+                    continue
+                last_tf = self._try_visit_val(
+                    getattr(node, node_attr)) or last_tf
+            return last_tf
+    class _ReflectiveMapper(AASTMapper):
+        __slots__ = ()
+        def _visit_default(self, node: AASTNode):
+            for node_attr in node.__slots__:
+                if not hasattr(node, node_attr):
+                    continue
+                setattr(node, node_attr,
+                        self._try_visit_val(getattr(node, node_attr)))
+            return node
+    class _PreOrderVisitor(AASTVisitor):
+        __slots__ = ()
+        walk_order = WALK_PRE_ORDER
+    class _PostOrderVisitor(AASTVisitor):
+        __slots__ = ()
+        walk_order = WALK_POST_ORDER
+    class _PreOrderMapper(AASTMapper):
+        __slots__ = ()
+        walk_order = WALK_PRE_ORDER
+    class _PostOrderMapper(AASTMapper):
+        __slots__ = ()
+        walk_order = WALK_POST_ORDER
+    zoia_ast = _parse_othello()
+    num_rounds = max(1, num_rounds // 40)
+    for visitor_label, visitor in (
+            ('default visit (reflection)', _ReflectiveVisitor()),
+            ('default visit (compiled)', AASTVisitor()),
+            ('default visit (pre-order walk)', _PreOrderVisitor()),
+            ('default visit (post-order walk)', _PostOrderVisitor()),
+            ('identity mapping (reflection)', _ReflectiveMapper()),
+            ('identity mapping (compiled)', AASTMapper()),
+            ('identity mapping (pre-order walk)', _PreOrderMapper()),
+            ('identity mapping (post-order walk)', _PostOrderMapper())):
+        _time(visitor_label, lambda v=visitor: v.visit(zoia_ast), num_rounds,
+              1)
+
+def bench_node_index(num_rounds: int):
+    """Compares finding all commands of the Othello example's largest chapter
+    by walking its AST with a command visitor to going through the index
+    recorded while parsing it."""
+    from ast_nodes import NodeIndex
+    from ast_visitor import ACommandVisitor
+    class _CommandCollector(ACommandVisitor):
+        __slots__ = ('found_cmds',)
+        def __init__(self):
+            self.found_cmds = []
+        def visit_command(self, node):
+            self.found_cmds.append(node)
+            super().visit_command(node)
+    zoia_ast = _parse_othello()
+    num_rounds = max(1, num_rounds // 10)
+    _time('find commands (visitor)', lambda: _CommandCollector().visit(
+        zoia_ast), num_rounds, 1)
+    _time('find commands (index)', zoia_ast.node_index.all_commands,
+          num_rounds, 1)
+    _time('build index by walking', lambda: NodeIndex.from_nodes(
+        [zoia_ast.header, *zoia_ast.lines]), num_rounds, 1)
+
+def _bench_leaf_pool_mode(num_rounds: int, new_pool):
+    """Runs bench_leaf_pool for one mode. new_pool is called to create the
+    pool for each parse."""
+    mode_label = 'unshared' if new_pool() is None else 'shared'
+    _parse_othello(new_pool())
+    leaf_pool = new_pool()
+    zoia_ast, mem_ast = _traced_alloc(lambda: _parse_othello(leaf_pool))
+    print(f'{f"retained AST memory ({mode_label})":<40} '
+          f'{mem_ast / 2**20:10.2f} MiB')
+    _time(f'parse ({mode_label})', lambda: _parse_othello(new_pool()),
+          num_rounds, 1)
+    other_ast = _parse_othello(leaf_pool)
+    if zoia_ast != other_ast:
+        raise RuntimeError('Parsing the same file twice produced different '
+                           'ASTs')
+    _time(f'compare two parses ({mode_label})', lambda: zoia_ast == other_ast,
+          num_rounds, 1)
+
+def bench_leaf_pool(num_rounds: int):
+    """Compares parsing the Othello example's largest chapter with and
+    without sharing its leaves via a LeafPool, as well as comparing two
+    separately parsed copies of it."""
+    from ast_nodes import LeafPool
+    num_rounds = max(1, num_rounds // 10)
+    _bench_leaf_pool_mode(num_rounds, lambda: None)
+    _bench_leaf_pool_mode(num_rounds, LeafPool)
+
+def bench_ast_diff(num_rounds: int):
+    """Diffs the Othello example's largest chapter against a version of it
+    with one word in the middle changed: first with two separately parsed
+    ASTs, whose lines all have to be hashed the first time, then again with
+    their hashes cached and finally with an AST that was updated in place by
+    reparse_zoia_edit, whose unchanged lines are the very same objects."""
+    from ast_diff import diff_lines, diff_zoia_files
+    from zoia_processor import process_zoia_string, reparse_zoia_edit
+    top_path = _find_src_path().parent
+    old_src = (top_path / _OTHELLO_CHAPTER).read_bytes().decode('utf-8')
+    edit_start = old_src.index(' the ', len(old_src) // 2) + 1
+    edit_end = edit_start + len('the')
+    new_src = old_src[:edit_start] + 'a' + old_src[edit_end:]
+    def _parse(zoia_src: str):
+        return process_zoia_string(zoia_src, '<othello>',
+                                   skip_validation=True)
+    # _time calls the function five times and each call needs fresh ASTs
+    cold_pairs = [(_parse(old_src), _parse(new_src)) for _i in range(5)]
+    _time('diff (cold)', lambda: diff_zoia_files(*cold_pairs.pop()), 1, 1)
+    old_ast = _parse(old_src)
+    new_ast = _parse(new_src)
+    ast_diff = diff_zoia_files(old_ast, new_ast)
+    if len(ast_diff.line_changes) != 1:
+        raise RuntimeError(f'Expected one changed line, got '
+                           f'{ast_diff.line_changes}')
+    _time('diff (hashes cached)', lambda: diff_zoia_files(old_ast, new_ast),
+          num_rounds, 1)
+    old_lines = list(old_ast.lines)
+    reparse_zoia_edit(old_ast, old_src, edit_start, edit_end, 'a',
+                      skip_validation=True)
+    _time('diff (after reparse_zoia_edit)', lambda: diff_lines(
+        old_lines, old_ast.lines), num_rounds, 1)
+
+def bench_bind_args(num_rounds: int):
+    """Binds the arguments of every command in a generated chapter with tens
+    of thousands of commands to a signature with all kinds of parameters,
+    then validates a chapter made up of \\def_alias commands."""
+    from ast_nodes import NodeIndex
+    from ast_validator import ASTValidator
+    from validation import AnyTy, Default, Signature
+    from zoia_processor import process_zoia_string
+    signature = Signature(
+        std_only={'a': AnyTy(), 'b': AnyTy()},
+        either_or={'c': AnyTy(), 'd': Default(AnyTy(), 'dee')},
+        kwd_only={'e': Default(AnyTy(), 'eee'), 'f': Default(AnyTy(), 'f')},
+    )
+    signature.init_default_values()
+    cmd_srcs = ['\\c[x; y; z]', '\\c[x; y; z; d = w]',
+                '\\c[x; y; c = z; f = v]', '\\c[x; y; z; w; e = v; f = u]']
+    chapter_src = '\\header[chapter]\n\n' + ''.join(
+        f'Line {i} with {cmd_srcs[i % 4]} and {cmd_srcs[(i + 1) % 4]}.\n'
+        for i in range(15_000))
+    chapter_ast = process_zoia_string(chapter_src, '<bind-args>',
+                                      skip_validation=True)
+    all_cmds = NodeIndex.from_nodes(chapter_ast.lines).all_commands()
+    print(f'{"commands":<40} {len(all_cmds):10}')
+    def _bind_all():
+        for cmd_node in all_cmds:
+            signature.validate_args(cmd_node)
+    _time('bind arguments', _bind_all, max(1, num_rounds // 100),
+          len(all_cmds))
+    alias_src = '\\header[chapter]\n\n' + ''.join(
+        f'\\def_alias[a{i}; Some *value*]\n' for i in range(20_000))
+    alias_ast = process_zoia_string(alias_src, '<bind-args>',
+                                    skip_validation=True)
+    _time('validate \\def_alias chapter', lambda: ASTValidator().visit(
+        alias_ast), 1, 1)
+    # The same, but with a handful of commands repeated over and over again
+    repeated_src = '\\header[chapter]\n\n' + ''.join(
+        f'\\def_alias[a{i % 8}; Some *value*]\n' for i in range(20_000))
+    repeated_ast = process_zoia_string(repeated_src, '<bind-args>',
+                                       skip_validation=True)
+    _time('validate repeated \\def_alias chapter',
+          lambda: ASTValidator().visit(repeated_ast), 1, 1)
+
+def bench_validate_tys(num_rounds: int):
+    """Validates typical command arguments against the types that the
+    standard commands use."""
+    from validation import ContentTy, IntTy, PureTextTy, TextTy, WordTy
+    from zoia_processor import process_zoia_arg
+    for arg_ty, arg_src in ((WordTy(), 'word'), (IntTy(), '0x1F'),
+                            (PureTextTy(), 'a sentence, with punctuation'),
+                            (TextTy(), 'a short text'),
+                            (ContentTy(), '*emphasized* and ***strongly***')):
+        ty_arg = process_zoia_arg(arg_src, '<validate-tys>')
+        _time(f'validate {arg_ty.compact()}', lambda t=arg_ty, a=ty_arg:
+              t.validate_arg(a), num_rounds * 10, 1)
+
+def _peak_alloc(alloc_func) -> int:
+    """Calls the specified function and returns the peak amount of memory
+    (in bytes) that it allocated."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        mem_before = tracemalloc.get_traced_memory()[0]
+        alloc_func()
+        return tracemalloc.get_traced_memory()[1] - mem_before
+    finally:
+        tracemalloc.stop()
+
+def bench_mapper_cow(_num_rounds: int):
+    """Resolves the aliases of the Othello example's largest chapter (by
+    replacing them with text fragments) with a mapper that changes the AST in
+    place and with a copy-on-write one, comparing time and peak memory."""
+    from ast_mapper import AASTMapper
+    from ast_nodes import TextFragmentNode
+    class _AliasResolver(AASTMapper):
+        __slots__ = ()
+        def visit_alias(self, node):
+            return TextFragmentNode(node.alias_key, src_table=node.src_table,
+                                    src_packed=node.src_packed)
+    class _CopyOnWriteResolver(_AliasResolver):
+        __slots__ = ()
+        copy_on_write = True
+    # Mapping in place changes the AST, so every call needs a fresh one
+    fresh_asts = [_parse_othello() for _i in range(6)]
+    _time('resolve aliases (in place)', lambda: _AliasResolver().visit(
+        fresh_asts.pop()), 1, 1)
+    zoia_ast = _parse_othello()
+    _time('resolve aliases (copy-on-write)',
+          lambda: _CopyOnWriteResolver().visit(zoia_ast), 1, 1)
+    mem_in_place = _peak_alloc(lambda: _AliasResolver().visit(
+        fresh_asts.pop()))
+    mem_cow = _peak_alloc(lambda: _CopyOnWriteResolver().visit(zoia_ast))
+    print(f'{"peak memory (in place)":<40} {mem_in_place / 2**20:10.2f} MiB')
+    print(f'{"peak memory (copy-on-write)":<40} '
+          f'{mem_cow / 2**20:10.2f} MiB')
+
+def bench_canonical(num_rounds: int):
+    """Round-trips a large file made up of ten copies of the Othello
+    example's largest chapter (parse -> canonical -> parse) and compares
+    building the canonical representation as a string to streaming it into a
+    file."""
+    import tempfile
+    from zoia_processor import process_zoia_string
+    chapter_src = _parse_othello().canonical()
+    header_src, body_src = chapter_src.split('\n', 1)
+    large_src = header_src + '\n' + body_src * 10
+    print(f'{"source size":<40} {len(large_src) / 2**20:10.2f} MiB')
+    zoia_ast = process_zoia_string(large_src, '<large>',
+                                   skip_validation=True)
+    num_rounds = max(1, num_rounds // 100)
+    _time('parse', lambda: process_zoia_string(
+        large_src, '<large>', skip_validation=True), num_rounds, 1)
+    _time('canonical', zoia_ast.canonical, num_rounds, 1)
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as out_file:
+        def _write_file():
+            out_file.seek(0)
+            zoia_ast.write_canonical_file(out_file)
+        _time('write_canonical_file', _write_file, num_rounds, 1)
+        print(f'{"canonical peak memory":<40} '
+              f'{_peak_alloc(zoia_ast.canonical) / 2**20:10.2f} MiB')
+        print(f'{"write_canonical_file peak memory":<40} '
+              f'{_peak_alloc(_write_file) / 2**20:10.2f} MiB')
+        out_file.seek(0)
+        written_src = out_file.read()
+    round_tripped = process_zoia_string(written_src, '<large>',
+                                        skip_validation=True)
+    if round_tripped.canonical() != written_src:
+        raise RuntimeError('Canonical representation did not round-trip')
+
+_BENCHMARKS = {
+    'parse-args': bench_parse_args,
+    'ast-memory': bench_ast_memory,
+    'columnar-ast': bench_columnar_ast,
+    'visitor': bench_visitor,
+    'node-index': bench_node_index,
+    'canonical': bench_canonical,
+    'leaf-pool': bench_leaf_pool,
+    'ast-diff': bench_ast_diff,
+    'mapper-cow': bench_mapper_cow,
+    'bind-args': bench_bind_args,
+    'validate-tys': bench_validate_tys,
+}
+
+def main():
+    """Runs the benchmarks selected on the command line."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('benchmarks', nargs='*', metavar='benchmark',
+                            help=f'The benchmarks to run (default: all). '
+                                 f'Choices: {", ".join(_BENCHMARKS)}.')
+    arg_parser.add_argument('-n', '--rounds', type=int, default=200,
+                            help='How many times to repeat each benchmark.')
+    args = arg_parser.parse_args()
+    for bench_name in args.benchmarks:
+        if bench_name not in _BENCHMARKS:
+            arg_parser.error(f'unknown benchmark: {bench_name}')
+    sys.path.insert(0, str(_find_src_path()))
+    for bench_name in args.benchmarks or _BENCHMARKS:
+        print(f'=== {bench_name}')
+        _BENCHMARKS[bench_name](args.rounds)
+
+if __name__ == '__main__':
+    main()
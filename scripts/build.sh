@@ -74,3 +74,11 @@ then
 else
     python fixups.py
 fi
+
+# Regenerate the command manifest
+if [ -f scripts/gen_manifest.py ]
+then
+    python scripts/gen_manifest.py
+else
+    python gen_manifest.py
+fi
@@ -4,15 +4,62 @@ from pathlib import Path
 
 _ANTLR4_REGEX = re.compile(r'(?<!vendor\.)\bantlr4\b')
 
-_SZ_ORIG_CODE = """    from . import sa_zoia_cpp_parser
-except ImportError:"""
-_SZ_PATCH_CODE = """    from . import sa_zoia_cpp_parser
+_SZ_REPLACEMENTS = {
+    # Hack sys.modules for the C++ code to use the vendored copy of ANTLR
+    """    from . import sa_zoia_cpp_parser
+except ImportError:""": """    from . import sa_zoia_cpp_parser
     # Need to create entries in sys.modules for the C++ code to use
     vendor_strip = len('_vendor.')
     for module_name, module in list(sys.modules.items()):
         if module_name.startswith('_vendor.antlr4'):
             sys.modules[module_name[vendor_strip:]] = module
-except ImportError:"""
+except ImportError:""",
+    # Make the Python fallback use our hand-written lexer (see
+    # parsing/fast_lexer.py)
+    """USE_CPP_IMPLEMENTATION = True
+""": """USE_CPP_IMPLEMENTATION = True
+
+#: Defines whether the Python fallback implementation uses the hand-written
+#: ZoiaFastLexer instead of the generated zoiaLexer. Both produce the same
+#: tokens, but ZoiaFastLexer is much faster.
+#: You may override this to False to force use of the generated lexer.
+USE_FAST_LEXER = True
+""",
+    # Reuse lexers and parsers instead of creating new ones for every call
+    # (see parsing/recognizer_pool.py)
+    """
+    # Lex
+    lexer = zoiaLexer(stream)
+    if sa_err_listener is not None:
+        lexer.removeErrorListeners()
+        lexer.addErrorListener(err_listener)
+    token_stream = CommonTokenStream(lexer)
+
+    # Parse
+    parser = zoiaParser(token_stream)
+    if sa_err_listener is not None:
+        parser.removeErrorListeners()
+        parser.addErrorListener(err_listener)
+
+    entry_rule_func = getattr(parser, entry_rule_name, None)
+    if not isinstance(entry_rule_func, types.MethodType):
+        raise ValueError("Invalid entry_rule_name '%s'" % entry_rule_name)
+    return entry_rule_func()""": """    else:
+        err_listener = None
+
+    # Lex and parse, using pooled recognizers. The parsing package imports
+    # from this package, so it can't be imported at module level
+    import parsing
+    lexer_type = parsing.ZoiaFastLexer if USE_FAST_LEXER else zoiaLexer
+    parser = parsing.acquire_parser(lexer_type, stream, err_listener)
+    try:
+        entry_rule_func = getattr(parser, entry_rule_name, None)
+        if not isinstance(entry_rule_func, types.MethodType):
+            raise ValueError("Invalid entry_rule_name '%s'" % entry_rule_name)
+        return entry_rule_func()
+    finally:
+        parsing.release_parser(lexer_type, parser, err_listener)""",
+}
 
 _CPP_REPLACEMENTS = {
     # Add any future C++ replacements here
@@ -37,13 +84,14 @@ def main():
         with ftp.open('w', encoding='utf-8') as out:
             out.write(ftp_contents)
     # Patch sa_zoia.py to hack sys.modules for the C++ code to use the vendored
-    # copy of ANTLR
+    # copy of ANTLR, to hook up our hand-written lexer and to pool recognizers
     print('Patching sa_zoia.py to add workaround for C++ code to use vendored '
-          'ANTLR runtimem')
+          'ANTLR runtime, to use the fast lexer and to pool recognizers')
     sa_zoia = src_path / 'grammar' / 'sa_zoia.py'
     with sa_zoia.open('r', encoding='utf-8') as ins:
         sz_contents = ins.read()
-    sz_contents = sz_contents.replace(_SZ_ORIG_CODE, _SZ_PATCH_CODE)
+    for target, sub in _SZ_REPLACEMENTS.items():
+        sz_contents = sz_contents.replace(target, sub)
     with sa_zoia.open('w', encoding='utf-8') as out:
         out.write(sz_contents)
     # Patch C++ code (currently unused)
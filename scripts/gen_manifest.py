@@ -0,0 +1,22 @@
+#!/bin/python3
+import sys
+from pathlib import Path
+
+def main():
+    curr_path = Path.cwd()
+    src_path = curr_path.parent / 'src'
+    if not src_path.is_dir():
+        src_path = curr_path / 'src'
+        if not src_path.is_dir():
+            raise RuntimeError('Failed to find src path, run this script from '
+                               'top level or from scripts folder')
+    # The command modules import each other by their top-level names
+    sys.path.insert(0, str(src_path))
+    import commands
+    # Generate the command manifest, so that commands can be imported lazily
+    # (see src/commands/__init__.py)
+    print('Generating command manifest')
+    commands.write_manifest()
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@
 #
 
 import codecs
+import mmap
 from _vendor.antlr4.InputStream import InputStream
 
 
@@ -25,3 +26,21 @@ class FileStream(InputStream):
         with open(fileName, 'rb') as file:
             bytes = file.read()
             return codecs.decode(bytes, encoding, errors)
+
+
+#
+#  Variant of FileStream that maps the file into memory and decodes it from
+#  there, instead of reading a full copy of its bytes first.
+#
+class MappedFileStream(FileStream):
+    __slots__ = ()
+
+    def readDataFrom(self, fileName:str, encoding:str, errors:str='strict'):
+        with open(fileName, 'rb') as file:
+            try:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                return codecs.decode(file.read(), encoding, errors)
+            with mapped:
+                return codecs.decode(mapped, encoding, errors)
@@ -8,11 +8,15 @@
 #
 #  Vacuum all input from a string and then treat it like a buffer.
 #
+#  Code points are read straight from the string instead of being copied into
+#  a list of ints first, which would cost several times the size of the input.
+#  Python strings are indexed by code point, so this is equivalent.
+#
 from _vendor.antlr4.Token import Token
 
 
 class InputStream (object):
-    __slots__ = ('name', 'strdata', '_index', 'data', '_size')
+    __slots__ = ('name', 'strdata', '_index', '_size')
 
     def __init__(self, data: str):
         self.name = "<empty>"
@@ -21,8 +25,7 @@ class InputStream (object):
 
     def _loadString(self):
         self._index = 0
-        self.data = [ord(c) for c in self.strdata]
-        self._size = len(self.data)
+        self._size = len(self.strdata)
 
     @property
     def index(self):
@@ -53,7 +56,7 @@ class InputStream (object):
         pos = self._index + offset - 1
         if pos < 0 or pos >= self._size: # invalid
             return Token.EOF
-        return self.data[pos]
+        return ord(self.strdata[pos])
 
     def LT(self, offset: int):
         return self.LA(offset)
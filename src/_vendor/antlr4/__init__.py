@@ -1,6 +1,6 @@
 from _vendor.antlr4.Token import Token
 from _vendor.antlr4.InputStream import InputStream
-from _vendor.antlr4.FileStream import FileStream
+from _vendor.antlr4.FileStream import FileStream, MappedFileStream
 from _vendor.antlr4.StdinStream import StdinStream
 from _vendor.antlr4.BufferedTokenStream import TokenStream
 from _vendor.antlr4.CommonTokenStream import CommonTokenStream
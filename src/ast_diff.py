@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements structural diffing of Zoia ASTs, e.g. to find out which parts
+of a file have to be rebuilt after it was edited."""
+from collections import Counter
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+
+from ast_nodes import AASTNode, CommandNode, LineNode, NodeIndex, \
+    ZoiaFileNode
+
+@dataclass(slots=True)
+class LineChange:
+    """A range of lines that differs between two versions of a file: the
+    old version's lines[old_start:old_end] were replaced by the new
+    version's lines[new_start:new_end]. One of the ranges is empty if lines
+    were only inserted or deleted."""
+    old_start: int
+    old_end: int
+    new_start: int
+    new_end: int
+
+@dataclass(slots=True)
+class ASTDiff:
+    """The differences between two versions of a Zoia file, see
+    diff_zoia_files."""
+    header_changed: bool = False
+    line_changes: list[LineChange] = field(default_factory=list)
+    # Commands (at any nesting level) in the changed parts of the new version
+    # that have no identical counterpart in the changed parts of the old
+    # version, sorted by position
+    added_commands: list[CommandNode] = field(default_factory=list)
+    # The same for the old version, i.e. the commands that are gone
+    removed_commands: list[CommandNode] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return self.header_changed or bool(self.line_changes)
+
+def _same_subtree(old_node: AASTNode, new_node: AASTNode) -> bool:
+    """Checks if the two specified nodes are structurally identical. Nodes
+    that are the very same object (e.g. unchanged lines after
+    zoia_processor.reparse_zoia_edit) don't even need to be hashed."""
+    return (old_node is new_node or
+            old_node.subtree_hash() == new_node.subtree_hash())
+
+def _diff_commands(old_nodes: list[AASTNode], new_nodes: list[AASTNode],
+                   ast_diff: ASTDiff) -> None:
+    """Adds the commands that differ between the two specified lists of
+    changed nodes to the specified diff."""
+    old_cmds = NodeIndex.from_nodes(old_nodes).all_commands()
+    new_cmds = NodeIndex.from_nodes(new_nodes).all_commands()
+    unmatched_old = Counter(c.subtree_hash() for c in old_cmds)
+    for new_cmd in new_cmds:
+        new_hash = new_cmd.subtree_hash()
+        if unmatched_old[new_hash]:
+            unmatched_old[new_hash] -= 1
+        else:
+            ast_diff.added_commands.append(new_cmd)
+    unmatched_new = Counter(c.subtree_hash() for c in new_cmds)
+    for old_cmd in old_cmds:
+        old_hash = old_cmd.subtree_hash()
+        if unmatched_new[old_hash]:
+            unmatched_new[old_hash] -= 1
+        else:
+            ast_diff.removed_commands.append(old_cmd)
+
+def diff_lines(old_lines: list[LineNode], new_lines: list[LineNode]) \
+        -> ASTDiff:
+    """Compares two versions of a file's lines, see diff_zoia_files. Useful
+    if the AST was updated in place, e.g. by reparse_zoia_edit - pass a copy
+    of its lines list from before the edit in that case."""
+    ast_diff = ASTDiff()
+    num_old = len(old_lines)
+    num_new = len(new_lines)
+    # Edits usually only touch a small part of a file, so skip everything
+    # before and after that first. These loops run over (almost) every line,
+    # so they inline _same_subtree
+    prefix_len = 0
+    for old_line, new_line in zip(old_lines, new_lines):
+        if (old_line is not new_line and
+                old_line.subtree_hash() != new_line.subtree_hash()):
+            break
+        prefix_len += 1
+    max_suffix = min(num_old, num_new) - prefix_len
+    suffix_len = 0
+    for old_line, new_line in zip(reversed(old_lines), reversed(new_lines)):
+        if suffix_len == max_suffix or (
+                old_line is not new_line and
+                old_line.subtree_hash() != new_line.subtree_hash()):
+            break
+        suffix_len += 1
+    old_changed = old_lines[prefix_len:num_old - suffix_len]
+    new_changed = new_lines[prefix_len:num_new - suffix_len]
+    if not old_changed and not new_changed:
+        return ast_diff
+    # The remaining part may still contain unchanged lines, e.g. between two
+    # edits
+    line_matcher = SequenceMatcher(
+        None, [l.subtree_hash() for l in old_changed],
+        [l.subtree_hash() for l in new_changed], autojunk=False)
+    old_diff_lines = []
+    new_diff_lines = []
+    for op_tag, old_start, old_end, new_start, new_end in \
+            line_matcher.get_opcodes():
+        if op_tag == 'equal':
+            continue
+        ast_diff.line_changes.append(LineChange(
+            old_start + prefix_len, old_end + prefix_len,
+            new_start + prefix_len, new_end + prefix_len))
+        old_diff_lines.extend(old_changed[old_start:old_end])
+        new_diff_lines.extend(new_changed[new_start:new_end])
+    _diff_commands(old_diff_lines, new_diff_lines, ast_diff)
+    return ast_diff
+
+def diff_zoia_files(old_ast: ZoiaFileNode, new_ast: ZoiaFileNode) \
+        -> ASTDiff:
+    """Compares two versions of a Zoia file's AST and returns the ranges of
+    lines and the commands that differ between them. Source positions are
+    ignored, so lines that merely moved (e.g. because lines were inserted
+    above them) count as unchanged.
+
+    Identical subtrees are skipped via LineNode.subtree_hash and
+    CommandNode.subtree_hash, which are computed at most once per node.
+    Lines that are the same object in both versions are never hashed at
+    all, so comparing an AST to the result of reparse_zoia_edit only has to
+    hash the reparsed lines."""
+    ast_diff = diff_lines(old_ast.lines, new_ast.lines)
+    if not _same_subtree(old_ast.header, new_ast.header):
+        ast_diff.header_changed = True
+        header_diff = ASTDiff()
+        _diff_commands([old_ast.header], [new_ast.header], header_diff)
+        ast_diff.added_commands[:0] = header_diff.added_commands
+        ast_diff.removed_commands[:0] = header_diff.removed_commands
+    return ast_diff
@@ -20,14 +20,80 @@
 #
 # =============================================================================
 """Implements an API that can be used to map Zoia AST nodes and leaves."""
-from ast_nodes import AASTNode
-from ast_visitor import AASTVisitor
+import copy
+import dataclasses
+from itertools import repeat
+
+from ast_nodes import AASTNode, ZoiaFileNode
+from ast_visitor import AASTVisitor, WALK_PRE_ORDER, WALK_RECURSIVE, \
+    _FIELD_LEAF, _FIELD_NODE, _FIELD_NODE_LIST, _FIELD_OPT_NODE, \
+    _FIELD_OTHER, _compile_fields, _push_fields
+
+# Slots that cache data derived from a node's subtree, which is stale once the
+# subtree has been mapped, see _discard_derived
+_DERIVED_SLOTS = ('_subtree_hash', '_node_index')
+# Maps node classes to the fields that _visit_default has to map. Filled in by
+# _map_fields the first time a node class is mapped
+_compiled_map_fields: dict[type, tuple[tuple[str, int], ...]] = {}
+
+def _discard_derived(node: AASTNode) -> None:
+    """Discards all data that the specified node caches about its subtree
+    (see _DERIVED_SLOTS). Needed for every node whose subtree was mapped,
+    since that may have changed it."""
+    for derived_slot in _DERIVED_SLOTS:
+        if hasattr(node, derived_slot):
+            delattr(node, derived_slot)
+
+def _map_fields(node_type: type) -> tuple[tuple[str, int], ...]:
+    """Returns the names and kinds of all dataclass fields of the specified
+    node class (including the source position), see
+    ast_visitor._compile_fields."""
+    compiled_fields = _compile_fields(node_type, tuple(
+        f.name for f in dataclasses.fields(node_type)))
+    _compiled_map_fields[node_type] = compiled_fields
+    return compiled_fields
 
 class AASTMapper(AASTVisitor):
-    """Abstract base class for Zoia AST mappers."""
-    __slots__ = ()
+    """Abstract base class for Zoia AST mappers.
+
+    Mappers can walk the AST iteratively as well (see AASTVisitor.walk_order).
+    Each node is then replaced by whatever its visit_* method returns, right
+    after that method was called. With WALK_POST_ORDER, the children of a
+    node have all been mapped by that point. With WALK_PRE_ORDER, they are
+    mapped afterwards, but only if the visit_* method called _visit_default
+    (i.e. the children of a node that was replaced by a new one are not
+    mapped, just like when walking recursively).
 
+    By default, mappers change the nodes of the mapped AST in place and copy
+    every list in it. Every node that goes through _visit_default discards
+    the data it caches about its subtree (e.g. cached subtree hashes), and
+    mapping a ZoiaFileNode discards its node index. Both get created again
+    from the mapped AST on the next access.
+
+    Set copy_on_write to True in a subclass to leave the mapped AST untouched
+    instead: _visit_default then returns the node itself if none of its
+    fields changed and a copy with the changed fields otherwise, so only the
+    nodes and lists along the paths to changed nodes get copied. Copies keep
+    everything that is not a dataclass field (e.g. CommandNode.proc_cmd),
+    except for the data cached about their subtree. Copy-on-write only works
+    when walking the AST recursively."""
+    __slots__ = ()
     """Base class for Zoia AST mappers. Based on AASTVisitor."""
+    # Whether _visit_default copies changed nodes instead of changing them in
+    # place, see above
+    copy_on_write = False
+
+    def visit(self, tree: AASTNode):
+        if self.copy_on_write and self.walk_order is not WALK_RECURSIVE:
+            raise ValueError('Copy-on-write mappers have to walk the AST '
+                             'recursively')
+        mapped_tree = super().visit(tree)
+        if not self.copy_on_write and isinstance(tree, ZoiaFileNode):
+            # The walk may have changed any part of the file in place, so the
+            # index recorded for it can't be trusted anymore
+            tree.set_node_index(None)
+        return mapped_tree
+
     def _try_visit_val(self, node_val):
         if isinstance(node_val, AASTNode):
             return node_val.accept(self)
@@ -38,12 +104,160 @@ class AASTMapper(AASTVisitor):
             return ret_list
         return self._map_leaf(node_val)
 
+    def _try_map_val_cow(self, node_val):
+        """Version of _try_visit_val for copy-on-write mappers. Returns
+        node_val itself if nothing in it changed."""
+        if isinstance(node_val, AASTNode):
+            return node_val.accept(self)
+        elif isinstance(node_val, list):
+            return self._map_list_cow(node_val, self._try_map_val_cow)
+        return self._map_leaf(node_val)
+
+    @staticmethod
+    def _map_list_cow(node_list: list, map_element) -> list:
+        """Maps every element of the specified list via map_element. Returns
+        the list itself if every element was mapped to itself, otherwise a
+        new list with the mapped elements."""
+        mapped_list = None
+        for i, list_el in enumerate(node_list):
+            mapped_el = map_element(list_el)
+            if mapped_list is not None:
+                mapped_list.append(mapped_el)
+            elif mapped_el is not list_el:
+                mapped_list = node_list[:i]
+                mapped_list.append(mapped_el)
+        return node_list if mapped_list is None else mapped_list
+
+    def _map_fields_cow(self, node: AASTNode,
+                        map_fields: tuple[tuple[str, int], ...]):
+        """Implements _visit_default for copy-on-write mappers."""
+        changed_fields = None
+        for field_name, field_kind in map_fields:
+            field_val = getattr(node, field_name)
+            if field_kind == _FIELD_NODE_LIST:
+                mapped_val = self._map_list_cow(field_val, self._accept_self)
+            elif field_kind == _FIELD_NODE:
+                mapped_val = field_val.accept(self)
+            elif field_kind == _FIELD_LEAF:
+                mapped_val = self._map_leaf(field_val)
+            else: # May be None, a node, a list, etc.
+                mapped_val = self._try_map_val_cow(field_val)
+            if mapped_val is not field_val:
+                if changed_fields is None:
+                    changed_fields = {}
+                changed_fields[field_name] = mapped_val
+        if changed_fields is None:
+            return node
+        mapped_node = copy.copy(node)
+        for field_name, mapped_val in changed_fields.items():
+            setattr(mapped_node, field_name, mapped_val)
+        _discard_derived(mapped_node)
+        return mapped_node
+
+    def _accept_self(self, node: AASTNode):
+        """Lets the specified node accept this mapper."""
+        return node.accept(self)
+
+    def _walk_pre_order(self, walk_stack: list):
+        # Each stack entry holds a node, followed by the list or node and the
+        # list index or attribute name where its mapped version has to be
+        # stored
+        mapped_root = [walk_stack.pop()]
+        walk_stack.append((mapped_root[0], mapped_root, 0))
+        while walk_stack:
+            node, map_target, map_key = walk_stack.pop()
+            if isinstance(map_target, list):
+                map_target[map_key] = node.accept(self)
+            else:
+                setattr(map_target, map_key, node.accept(self))
+        return mapped_root[0]
+
+    def _walk_post_order(self, walk_stack: list):
+        # Same stack entries as in _walk_pre_order. A None on top of an entry
+        # means that the children of its node have already been mapped
+        mapped_root = [walk_stack.pop()]
+        walk_stack.append((mapped_root[0], mapped_root, 0))
+        while walk_stack:
+            stack_entry = walk_stack.pop()
+            if stack_entry is None:
+                stack_entry = walk_stack.pop()
+            elif push_fields := _push_fields(type(stack_entry[0])):
+                walk_stack.append(stack_entry)
+                walk_stack.append(None)
+                self._push_children(stack_entry[0], push_fields)
+                continue
+            node, map_target, map_key = stack_entry
+            if isinstance(map_target, list):
+                map_target[map_key] = node.accept(self)
+            else:
+                setattr(map_target, map_key, node.accept(self))
+        return mapped_root[0]
+
+    def _push_children(self, node: AASTNode,
+                       push_fields: tuple[tuple[str, int], ...]) -> None:
+        """Pushes all children of the specified node onto the walk stack,
+        last child first, in the format used by _walk_pre_order and
+        _walk_post_order. push_fields must be the result of _push_fields for
+        the node's class. Lists of children are copied first, like
+        _visit_default does when walking recursively."""
+        walk_stack = self._walk_stack
+        for field_name, field_kind in push_fields:
+            field_val = getattr(node, field_name)
+            if field_kind == _FIELD_NODE_LIST:
+                mapped_list = list(field_val)
+                setattr(node, field_name, mapped_list)
+                walk_stack.extend(zip(reversed(mapped_list),
+                                      repeat(mapped_list),
+                                      range(len(mapped_list) - 1, -1, -1)))
+            elif field_kind == _FIELD_NODE:
+                walk_stack.append((field_val, node, field_name))
+            elif field_kind == _FIELD_OPT_NODE:
+                if field_val is None:
+                    # Same as _try_visit_val would do
+                    setattr(node, field_name, self._map_leaf(None))
+                else:
+                    walk_stack.append((field_val, node, field_name))
+            # _FIELD_OTHER is handled by _visit_default
+
+    def _map_fields_iterative(self, node: AASTNode,
+                              map_fields: tuple[tuple[str, int], ...]):
+        """Implements _visit_default when walking the AST iteratively."""
+        _discard_derived(node)
+        # The walk takes care of all child nodes, just map the rest
+        for field_name, field_kind in map_fields:
+            if field_kind == _FIELD_LEAF:
+                setattr(node, field_name,
+                        self._map_leaf(getattr(node, field_name)))
+            elif field_kind == _FIELD_OTHER:
+                setattr(node, field_name,
+                        self._try_visit_val(getattr(node, field_name)))
+        if self.walk_order is WALK_PRE_ORDER:
+            push_fields = _push_fields(type(node))
+            if push_fields:
+                self._push_children(node, push_fields)
+        return node
+
     def _visit_default(self, node: AASTNode):
-        for node_attr in node.__slots__:
-            if not hasattr(node, node_attr):
-                continue # Member descriptor, ignore
-            setattr(node, node_attr,
-                    self._try_visit_val(getattr(node, node_attr)))
+        try:
+            map_fields = _compiled_map_fields[type(node)]
+        except KeyError:
+            map_fields = _map_fields(type(node))
+        if self.copy_on_write:
+            return self._map_fields_cow(node, map_fields)
+        if self.walk_order is not WALK_RECURSIVE:
+            return self._map_fields_iterative(node, map_fields)
+        for field_name, field_kind in map_fields:
+            field_val = getattr(node, field_name)
+            if field_kind == _FIELD_NODE_LIST:
+                field_val = [e.accept(self) for e in field_val]
+            elif field_kind == _FIELD_NODE:
+                field_val = field_val.accept(self)
+            elif field_kind == _FIELD_LEAF:
+                field_val = self._map_leaf(field_val)
+            else: # May be None, a node, a list, etc.
+                field_val = self._try_visit_val(field_val)
+            setattr(node, field_name, field_val)
+        _discard_derived(node)
         return node
 
     # API that is intended for overriding by end users begins here
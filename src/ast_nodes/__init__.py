@@ -33,9 +33,11 @@ from ast_nodes.em1_line_element import *
 from ast_nodes.em2_line_element import *
 from ast_nodes.em3_line_element import *
 from ast_nodes.kwd_argument import *
+from ast_nodes.leaf_pool import *
 from ast_nodes.line import *
 from ast_nodes.line_element import *
 from ast_nodes.line_elements import *
+from ast_nodes.node_index import *
 from ast_nodes.std_argument import *
 from ast_nodes.text_fragment import *
 from ast_nodes.zoia_file import *
@@ -22,6 +22,7 @@
 """Implements the AST node for aliases."""
 from dataclasses import dataclass
 
+from ast_nodes.base import CanonicalWriter
 from ast_nodes.line_element import ALineElementNode
 
 @dataclass(slots=True)
@@ -32,5 +33,5 @@ class AliasNode(ALineElementNode):
     def accept(self, visitor):
         return visitor.visit_alias(self)
 
-    def canonical(self) -> str:
-        return f'@{self.alias_key}|'
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        write_out(f'@{self.alias_key}|')
@@ -23,13 +23,14 @@
 dependencies."""
 from dataclasses import dataclass
 
-from ast_nodes.base import AASTNode
+from ast_nodes.base import AASTNode, CanonicalWriter
 from ast_nodes.line_elements import LineElementsNode
 
-@dataclass(slots=True)
+@dataclass
 class AArgumentNode(AASTNode):
     """Base AST node for arguments. See KwdArgumentNode and StdArgumentNode."""
+    __slots__ = () # See AASTNode
     arg_value: LineElementsNode
 
-    def canonical(self) -> str:
-        return self.arg_value.canonical()
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        self.arg_value.write_canonical(write_out)
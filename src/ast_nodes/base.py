@@ -20,16 +20,42 @@
 #
 # =============================================================================
 """Implements the base class for all Zoia AST nodes."""
+from collections.abc import Callable
 from dataclasses import dataclass, field
-from io import StringIO
+from hashlib import blake2b
 
-from exception import AbstractError
-from src_pos import SourcePos
+from exception import AbstractError, InternalError
+from src_pos import SHARED_PACKED, SourcePos, SourceTable
 
-@dataclass(slots=True)
+# Anything that write_canonical can write to, e.g. the write method of a file
+# or the append method of a list
+CanonicalWriter = Callable[[str], object]
+
+@dataclass
 class AASTNode:
-    """Base class for all Zoia AST nodes."""
-    src_pos: SourcePos = field(kw_only=True, repr=False)
+    """Base class for all Zoia AST nodes. Nodes don't store their source
+    position directly, but the source table of their file and a packed
+    position within it. See src_pos.SourceTable."""
+    # Abstract node classes leave their slots to the concrete ones. On Python
+    # 3.10, dataclass(slots=True) creates a slot for every field, including
+    # inherited ones, so each slot here would take up space twice in every
+    # node
+    __slots__ = ()
+    src_table: SourceTable = field(kw_only=True, repr=False)
+    src_packed: int = field(kw_only=True, repr=False)
+
+    @property
+    def src_pos(self) -> SourcePos:
+        """The position in the source file at which this node starts. Created
+        anew on every access, so store it if you need it more than once.
+        Shared nodes (see LeafPool) have no position of their own, so this
+        raises an InternalError for them - use
+        LineElementsNode.element_src_pos instead."""
+        if (src_packed := self.src_packed) == SHARED_PACKED:
+            raise InternalError(
+                f'{self.__class__.__name__} is shared between multiple places '
+                f'and has no source position of its own')
+        return self.src_table.source_pos(src_packed)
 
     def accept(self, visitor):
         """Called by a visitor when it's about to visit this node. It should
@@ -38,24 +64,44 @@ class AASTNode:
         raise AbstractError()
 
     def canonical(self) -> str:
-        """Returns a canonical string representation of this node."""
+        """Returns a canonical string representation of this node. See
+        write_canonical for writing it somewhere else instead."""
+        canon_parts = []
+        self.write_canonical(canon_parts.append)
+        return ''.join(canon_parts)
+
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        """Writes the canonical string representation of this node by passing
+        it to write_out piece by piece, in a single pass over the AST.
+        write_out can be e.g. the write method of an open file, so that big
+        files can be written out without building the whole string first."""
         raise AbstractError()
 
-def _write_arguments(s: StringIO, arguments: list[AASTNode]) -> None:
+    def subtree_hash(self) -> bytes:
+        """Returns a hash of this node and everything below it that ignores
+        source positions, i.e. two nodes have the same hash if (and, barring
+        collisions, only if) they have the same canonical representation. The
+        hash is stable across processes. LineNode and CommandNode cache it, so
+        they must not be modified once it has been computed."""
+        return blake2b(self.canonical().encode('utf-8'),
+                       digest_size=16).digest()
+
+def _write_arguments(write_out: CanonicalWriter,
+                     arguments: list[AASTNode]) -> None:
     """Helper method for writing out a list of nodes as arguments to a
     command, including the brackets used to open and close the command (or a
     vertical bar as a terminator, if the command does not have any
     arguments)."""
     if arguments:
-        s.write('[')
         if len(arguments) == 1:
-            s.write(arguments[0].canonical())
+            write_out('[')
+            arguments[0].write_canonical(write_out)
         else:
-            s.write('\n')
+            write_out('[\n')
             for a in arguments:
-                s.write('    ')
-                s.write(a.canonical())
-                s.write(';\n')
-        s.write(']')
+                write_out('    ')
+                a.write_canonical(write_out)
+                write_out(';\n')
+        write_out(']')
     else:
-        s.write('|')
+        write_out('|')
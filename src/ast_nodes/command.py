@@ -21,10 +21,9 @@
 # =============================================================================
 """Implements the AST node for commands."""
 from dataclasses import dataclass
-from io import StringIO
 
 from ast_nodes.argument import AArgumentNode
-from ast_nodes.base import _write_arguments
+from ast_nodes.base import CanonicalWriter, _write_arguments
 from ast_nodes.line_element import ALineElementNode
 
 @dataclass
@@ -32,7 +31,9 @@ class CommandNode(ALineElementNode):
     """AST node for commands."""
     arguments: list[AArgumentNode]
     cmd_name: str
-    __slots__ = ('arguments', 'cmd_name', 'proc_cmd')
+    # Includes the fields of AASTNode, see there
+    __slots__ = ('src_table', 'src_packed', 'arguments', 'cmd_name',
+                 'proc_cmd', '_subtree_hash')
 
     # TODO I want this gone
     def accept_command(self, proc_cmd):
@@ -44,9 +45,14 @@ class CommandNode(ALineElementNode):
     def accept(self, visitor):
         return visitor.visit_command(self)
 
-    def canonical(self) -> str:
-        s = StringIO()
-        s.write('\\')
-        s.write(self.cmd_name)
-        _write_arguments(s, self.arguments)
-        return s.getvalue()
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        write_out(f'\\{self.cmd_name}')
+        _write_arguments(write_out, self.arguments)
+
+    def subtree_hash(self) -> bytes:
+        try:
+            return self._subtree_hash
+        except AttributeError:
+            # pylint: disable=attribute-defined-outside-init
+            self._subtree_hash = cmd_hash = super().subtree_hash()
+            return cmd_hash
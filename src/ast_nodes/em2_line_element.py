@@ -22,6 +22,7 @@
 """Implements the AST node for level 2 emphasized line elements."""
 from dataclasses import dataclass
 
+from ast_nodes.base import CanonicalWriter
 from ast_nodes.em_line_element import AEmLineElementNode
 
 @dataclass(slots=True)
@@ -30,7 +31,9 @@ class Em2LineElementNode(AEmLineElementNode):
     def accept(self, visitor):
         return visitor.visit_em2_line_element(self)
 
-    def canonical(self) -> str:
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        write_out('**')
         # @dataclass with slots=True breaks argument-less super
         # pylint: disable=super-with-arguments
-        return f'**{super(Em2LineElementNode, self).canonical()}**'
+        super(Em2LineElementNode, self).write_canonical(write_out)
+        write_out('**')
@@ -23,13 +23,15 @@
 circular dependencies."""
 from dataclasses import dataclass
 
+from ast_nodes.base import CanonicalWriter
 from ast_nodes.line_element import ALineElementNode
 from ast_nodes.line_elements import LineElementsNode
 
-@dataclass(slots=True)
+@dataclass
 class AEmLineElementNode(ALineElementNode):
     """Base AST node for emphasized line elements."""
+    __slots__ = () # See AASTNode
     elements: LineElementsNode
 
-    def canonical(self) -> str:
-        return self.elements.canonical()
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        self.elements.write_canonical(write_out)
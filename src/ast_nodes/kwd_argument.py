@@ -23,6 +23,7 @@
 from dataclasses import dataclass
 
 from ast_nodes.argument import AArgumentNode
+from ast_nodes.base import CanonicalWriter
 
 @dataclass(slots=True)
 class KwdArgumentNode(AArgumentNode):
@@ -32,8 +33,8 @@ class KwdArgumentNode(AArgumentNode):
     def accept(self, visitor):
         return visitor.visit_kwd_argument(self)
 
-    def canonical(self) -> str:
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        write_out(f'{self.kwd_name} = ')
         # @dataclass with slots=True breaks argument-less super
         # pylint: disable=super-with-arguments
-        args_canonical = super(KwdArgumentNode, self).canonical()
-        return f'{self.kwd_name} = {args_canonical}'
+        super(KwdArgumentNode, self).write_canonical(write_out)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements the pool used to share identical leaves between ASTs."""
+import sys
+
+from ast_nodes.text_fragment import TextFragmentNode
+from src_pos import SHARED_PACKED, SourceTable
+
+# The source table of all shared nodes. They don't belong to any one file
+_SHARED_TABLE = SourceTable('<shared>')
+
+class LeafPool:
+    """Hash-conses the leaves of Zoia ASTs. Parsers that are given a pool
+    create only one TextFragmentNode per distinct text and reuse it for every
+    occurrence of that text, instead of creating a new node each time. The
+    same pool can be used for multiple files to share nodes between them too.
+    Names (of commands, keyword arguments and aliases) are interned as well.
+
+    Shared nodes can't store a position of their own, so their src_packed is
+    src_pos.SHARED_PACKED and accessing their src_pos raises an InternalError.
+    The LineElementsNodes containing them store the positions of all their
+    elements out-of-line instead, so use LineElementsNode.element_src_pos to
+    find out where an element is. Shared nodes must not be modified, so
+    only run copy-on-write mappers on ASTs that contain them (see
+    AASTMapper)."""
+    __slots__ = ('_fragments',)
+
+    def __init__(self) -> None:
+        self._fragments: dict[str, TextFragmentNode] = {}
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+    def text_fragment(self, text_val: str) -> TextFragmentNode:
+        """Returns the shared TextFragmentNode for the specified text."""
+        try:
+            return self._fragments[text_val]
+        except KeyError:
+            text_val = sys.intern(text_val)
+            frag_node = self._fragments[text_val] = TextFragmentNode(
+                text_val, src_table=_SHARED_TABLE, src_packed=SHARED_PACKED)
+            return frag_node
+
+    @staticmethod
+    def intern_str(str_val: str) -> str:
+        """Returns the shared copy of the specified name."""
+        return sys.intern(str_val)
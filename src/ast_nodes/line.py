@@ -23,17 +23,28 @@
 from dataclasses import dataclass
 from typing import Optional
 
-from ast_nodes.base import AASTNode
+from ast_nodes.base import AASTNode, CanonicalWriter
 from ast_nodes.line_elements import LineElementsNode
 
-@dataclass(slots=True)
+@dataclass
 class LineNode(AASTNode):
     """AST node for lines."""
     elements: Optional[LineElementsNode]
+    # Includes the fields of AASTNode, see there
+    __slots__ = ('src_table', 'src_packed', 'elements', '_subtree_hash')
 
     def accept(self, visitor):
         return visitor.visit_line(self)
 
-    def canonical(self) -> str:
-        elements_canon = self.elements.canonical() if self.elements else ''
-        return elements_canon + '\n'
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        if self.elements:
+            self.elements.write_canonical(write_out)
+        write_out('\n')
+
+    def subtree_hash(self) -> bytes:
+        try:
+            return self._subtree_hash
+        except AttributeError:
+            # pylint: disable=attribute-defined-outside-init
+            self._subtree_hash = line_hash = super().subtree_hash()
+            return line_hash
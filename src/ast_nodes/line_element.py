@@ -25,8 +25,9 @@ from dataclasses import dataclass
 
 from ast_nodes.base import AASTNode
 
-@dataclass(slots=True)
+@dataclass
 class ALineElementNode(AASTNode):
     """Base AST node for single line elements. See AliasNode, CommandNode,
     Em1LineElementNode, Em2LineElementNode, Em3LineElementNode and
     TextFragmentNode."""
+    __slots__ = () # See AASTNode
@@ -20,18 +20,33 @@
 #
 # =============================================================================
 """Implements the AST node for collections of line elements."""
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
 
-from ast_nodes.base import AASTNode
+from ast_nodes.base import AASTNode, CanonicalWriter
 from ast_nodes.line_element import ALineElementNode
+from src_pos import SourcePos
 
 @dataclass(slots=True)
 class LineElementsNode(AASTNode):
     """AST node for collections of line elements."""
     elements: list[ALineElementNode]
+    # The packed positions of all elements, if some of them are shared (see
+    # LeafPool). None otherwise, since the elements then store their own
+    element_packed: array | None = field(default=None, kw_only=True,
+                                         repr=False)
+
+    def element_src_pos(self, element_index: int) -> SourcePos:
+        """Returns the position in the source file at which the element at
+        the specified index starts. Unlike elements[element_index].src_pos,
+        this also works for shared elements."""
+        if (element_packed := self.element_packed) is not None:
+            return self.src_table.source_pos(element_packed[element_index])
+        return self.elements[element_index].src_pos
 
     def accept(self, visitor):
         return visitor.visit_line_elements(self)
 
-    def canonical(self) -> str:
-        return ''.join([e.canonical() for e in self.elements])
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        for e in self.elements:
+            e.write_canonical(write_out)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements the side indexes that Zoia file ASTs keep of their commands and
+aliases."""
+from dataclasses import dataclass, field
+from itertools import chain
+from operator import attrgetter
+
+from ast_nodes.alias import AliasNode
+from ast_nodes.base import AASTNode
+from ast_nodes.command import CommandNode
+from ast_nodes.em_line_element import AEmLineElementNode
+from ast_nodes.header import HeaderNode
+from ast_nodes.line import LineNode
+from ast_nodes.line_elements import LineElementsNode
+
+# Sorts nodes from the same file in source order. Since a command starts
+# before its arguments, this is the same order in which a visitor would visit
+# them
+_src_order = attrgetter('src_packed')
+
+@dataclass(slots=True)
+class NodeIndex:
+    """Indexes all CommandNodes of a Zoia file by their cmd_name and all
+    AliasNodes by their alias_key, so that later stages can go through them
+    without walking the whole AST. Each list is in source order. The header
+    is not included (but any commands in its arguments are)."""
+    commands: dict[str, list[CommandNode]] = field(default_factory=dict)
+    aliases: dict[str, list[AliasNode]] = field(default_factory=dict)
+
+    @classmethod
+    def from_nodes(cls, ast_nodes: list[AASTNode]):
+        """Creates an index of all commands and aliases inside the specified
+        nodes (i.e. a header and/or lines) by walking them."""
+        node_index = cls()
+        add_command = node_index.add_command
+        add_alias = node_index.add_alias
+        # Walk with an explicit stack, arguments may be nested deeply
+        to_check = list(ast_nodes)
+        while to_check:
+            ast_node = to_check.pop()
+            if isinstance(ast_node, LineElementsNode):
+                to_check.extend(ast_node.elements)
+            elif isinstance(ast_node, CommandNode):
+                # Headers are not indexed, but their arguments are
+                if not isinstance(ast_node, HeaderNode):
+                    add_command(ast_node)
+                to_check.extend(a.arg_value for a in ast_node.arguments)
+            elif isinstance(ast_node, AliasNode):
+                add_alias(ast_node)
+            elif isinstance(ast_node, (AEmLineElementNode, LineNode)):
+                if ast_node.elements is not None:
+                    to_check.append(ast_node.elements)
+        node_index.sort()
+        return node_index
+
+    def add_command(self, cmd_node: CommandNode) -> None:
+        """Adds the specified command to this index. Call sort once you are
+        done adding nodes."""
+        try:
+            self.commands[cmd_node.cmd_name].append(cmd_node)
+        except KeyError:
+            self.commands[cmd_node.cmd_name] = [cmd_node]
+
+    def add_alias(self, alias_node: AliasNode) -> None:
+        """Adds the specified alias to this index. Call sort once you are
+        done adding nodes."""
+        try:
+            self.aliases[alias_node.alias_key].append(alias_node)
+        except KeyError:
+            self.aliases[alias_node.alias_key] = [alias_node]
+
+    def sort(self) -> None:
+        """Puts all lists in this index back into source order. Parsers
+        finish a command only after its arguments, so they add nested
+        commands before the ones containing them."""
+        for indexed_nodes in chain(self.commands.values(),
+                                   self.aliases.values()):
+            indexed_nodes.sort(key=_src_order)
+
+    def all_commands(self) -> list[CommandNode]:
+        """Returns all commands in this index, in source order."""
+        return sorted(chain.from_iterable(self.commands.values()),
+                      key=_src_order)
+
+    def replace_lines(self, old_lines: list[LineNode],
+                      new_lines: list[LineNode]) -> None:
+        """Updates this index after the specified old lines of its file have
+        been replaced by the specified new ones. Only walks those lines, not
+        the rest of the file. The source positions of the lines following
+        them must already have been updated."""
+        old_index = NodeIndex.from_nodes(old_lines)
+        new_index = NodeIndex.from_nodes(new_lines)
+        for own_groups, old_groups, new_groups in (
+                (self.commands, old_index.commands, new_index.commands),
+                (self.aliases, old_index.aliases, new_index.aliases)):
+            for group_key in old_groups.keys() | new_groups.keys():
+                old_ids = {id(n) for n in old_groups.get(group_key, ())}
+                group_nodes = [n for n in own_groups.get(group_key, ())
+                               if id(n) not in old_ids]
+                group_nodes.extend(new_groups.get(group_key, ()))
+                if group_nodes:
+                    group_nodes.sort(key=_src_order)
+                    own_groups[group_key] = group_nodes
+                else:
+                    del own_groups[group_key]
@@ -22,6 +22,7 @@
 """Implements the AST node for lines."""
 from dataclasses import dataclass
 
+from ast_nodes.base import CanonicalWriter
 from ast_nodes.line_element import ALineElementNode
 
 @dataclass(slots=True)
@@ -32,5 +33,5 @@ class TextFragmentNode(ALineElementNode):
     def accept(self, visitor):
         return visitor.visit_text_fragment(self)
 
-    def canonical(self) -> str:
-        return self.text_val
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        write_out(self.text_val)
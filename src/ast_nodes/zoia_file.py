@@ -21,25 +21,63 @@
 # =============================================================================
 """Implements the root AST node for entire Zoia files."""
 from dataclasses import dataclass
-from io import StringIO
+from typing import TextIO
 
-from ast_nodes.base import AASTNode
+from ast_nodes.base import AASTNode, CanonicalWriter
 from ast_nodes.header import HeaderNode
 from ast_nodes.line import LineNode
+from ast_nodes.node_index import NodeIndex
 
-@dataclass(slots=True)
+# How many pieces write_canonical_file collects before writing them out
+_FILE_BATCH_PARTS = 8192
+
+@dataclass
 class ZoiaFileNode(AASTNode):
     """AST node for Zoia files."""
     header: HeaderNode
     lines: list[LineNode]
+    # Includes the fields of AASTNode, see there
+    __slots__ = ('src_table', 'src_packed', 'header', 'lines', '_node_index')
+
+    @property
+    def node_index(self) -> NodeIndex:
+        """The index of all commands and aliases in this file. The parsers
+        record it while building the AST; otherwise it is created by walking
+        the AST on first access. Code that changes the AST has to update the
+        index or discard it via set_node_index."""
+        node_index = getattr(self, '_node_index', None)
+        if node_index is None:
+            node_index = NodeIndex.from_nodes([self.header, *self.lines])
+            self.set_node_index(node_index)
+        return node_index
+
+    def set_node_index(self, node_index: NodeIndex | None) -> None:
+        """Sets the index returned by node_index. None discards it, so that
+        it will be created again from the AST on the next access."""
+        # pylint: disable=attribute-defined-outside-init
+        self._node_index = node_index
 
     def accept(self, visitor):
         return visitor.visit_zoia_file(self)
 
-    def canonical(self) -> str:
-        s = StringIO()
-        s.write(self.header.canonical())
-        s.write('\n')
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        self.header.write_canonical(write_out)
+        write_out('\n')
+        for l in self.lines:
+            l.write_canonical(write_out)
+
+    def write_canonical_file(self, out_file: TextIO) -> None:
+        """Writes the canonical string representation of this file to the
+        specified text file. Like write_canonical, but hands the output to
+        the file in batches of whole lines, since writing each small piece
+        separately is much slower."""
+        canon_parts = []
+        add_part = canon_parts.append
+        self.header.write_canonical(add_part)
+        add_part('\n')
         for l in self.lines:
-            s.write(l.canonical())
-        return s.getvalue()
+            l.write_canonical(add_part)
+            if len(canon_parts) >= _FILE_BATCH_PARTS:
+                out_file.write(''.join(canon_parts))
+                canon_parts.clear()
+        out_file.write(''.join(canon_parts))
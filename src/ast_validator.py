@@ -21,19 +21,151 @@
 # =============================================================================
 """Performs validation on a parsed Zoia AST. High-level interface to the
 validation package."""
-from ast_nodes import HeaderNode, CommandNode
+from ast_nodes import AArgumentNode, AEmLineElementNode, AliasNode, \
+    ALineElementNode, CommandNode, HeaderNode, KwdArgumentNode, \
+    TextFragmentNode, ZoiaFileNode
 from ast_visitor import ACommandVisitor
 from commands import get_command_type
 
+# The maximum number of validated commands that an ASTValidator remembers.
+# Once there are more, it starts over with an empty cache
+_MAX_CACHED_COMMANDS = 1 << 16
+# Sentinel object used by _CachedArgs for processed values that are the
+# argument value itself
+_FROM_ARG_VALUE = object()
+
+def _add_elements_key(add_part, line_elements: list[ALineElementNode]):
+    """Adds the parts of the key for the specified line elements by calling
+    add_part with each of them, see _command_key."""
+    for line_element in line_elements:
+        element_type = type(line_element)
+        if element_type is TextFragmentNode:
+            add_part(line_element.text_val)
+            continue
+        # Prefix everything else with its type, so that it can't be confused
+        # with text fragments
+        add_part(element_type)
+        if element_type is CommandNode:
+            add_part(_command_key(line_element))
+        elif element_type is AliasNode:
+            add_part(line_element.alias_key)
+        elif isinstance(line_element, AEmLineElementNode):
+            _add_elements_key(add_part, line_element.elements.elements)
+            add_part(None) # Marks the end of the emphasized elements
+        else:
+            add_part(line_element.canonical())
+
+def _command_key(cmd_node: CommandNode) -> tuple:
+    """Returns a key that is equal for two commands if and only if they have
+    the same canonical representation, ignoring source positions. Much
+    cheaper to build than the canonical representation itself."""
+    key_parts = [cmd_node.cmd_name]
+    add_part = key_parts.append
+    for cmd_arg in cmd_node.arguments:
+        add_part(cmd_arg.kwd_name if isinstance(cmd_arg, KwdArgumentNode)
+                 else None)
+        _add_elements_key(add_part, cmd_arg.arg_value.elements)
+        add_part(None) # Marks the end of the argument
+    return tuple(key_parts)
+
+class _CachedArgs:
+    """The result of validating the arguments of a command, stored in a way
+    that can be applied to any command with the same canonical representation
+    (see ASTValidator). Identical commands have the same number of arguments
+    and each of them fills the same parameter, so the argument nodes are
+    taken from the command at hand by their index. The same goes for
+    processed values that are the argument values themselves (e.g. the
+    values of Content parameters)."""
+    __slots__ = ('bound_params', 'default_params', 'bound_varargs')
+
+    def __init__(self, cmd_node: CommandNode, validated_args: tuple) -> None:
+        c_a, c_an, c_v, c_vn = validated_args
+        node_indices = {id(a): i for i, a in enumerate(cmd_node.arguments)}
+        def _cached_val(proc_val, arg_node: AArgumentNode):
+            # Don't keep the argument values of this command alive
+            return (_FROM_ARG_VALUE if proc_val is arg_node.arg_value
+                    else proc_val)
+        # The name, argument index and processed value of each parameter
+        # that was filled by an argument. These come first, see Signature
+        self.bound_params = tuple(
+            (param_n, node_indices[id(arg_node)],
+             _cached_val(c_a[param_n], arg_node))
+            for param_n, arg_node in c_an.items() if arg_node is not None)
+        # The name and default value of each parameter that was not
+        self.default_params = tuple((param_n, c_a[param_n])
+                                    for param_n, arg_node in c_an.items()
+                                    if arg_node is None)
+        # The argument index and processed value of each vararg
+        self.bound_varargs = tuple(
+            (node_indices[id(va_node)], _cached_val(va_v, va_node))
+            for va_v, va_node in zip(c_v, c_vn))
+
+    def apply_to(self, cmd_node: CommandNode) -> tuple:
+        """Returns the validated arguments for the specified command, in the
+        format returned by Signature.validate_args."""
+        cmd_arguments = cmd_node.arguments
+        c_a = {}
+        c_an: dict[str, AArgumentNode | None] = {}
+        for param_n, arg_i, proc_val in self.bound_params:
+            c_an[param_n] = arg_node = cmd_arguments[arg_i]
+            c_a[param_n] = (arg_node.arg_value
+                            if proc_val is _FROM_ARG_VALUE else proc_val)
+        for param_n, proc_val in self.default_params:
+            c_a[param_n] = proc_val
+            c_an[param_n] = None
+        c_v = []
+        c_vn = []
+        for arg_i, proc_val in self.bound_varargs:
+            arg_node = cmd_arguments[arg_i]
+            c_v.append(arg_node.arg_value if proc_val is _FROM_ARG_VALUE
+                       else proc_val)
+            c_vn.append(arg_node)
+        return c_a, c_an, c_v, c_vn
+
 class ASTValidator(ACommandVisitor):
     """Performs validation on a Zoia AST, detecting and reporting errors that
-    cannot be detected during parsing."""
-    __slots__ = ()
+    cannot be detected during parsing.
+
+    Fiction tends to repeat the same commands verbatim over and over again,
+    so the validator remembers the validated arguments of every command it
+    has seen, keyed by the command's name and the contents of its arguments.
+    Identical commands then reuse those arguments instead of validating them
+    again, with the argument nodes (and thereby the source positions) of the
+    command at hand. The cache holds no references to any AST, so the
+    validator can live as long as the process does."""
+    __slots__ = ('_cached_args',)
+
+    def __init__(self) -> None:
+        self._cached_args: dict[tuple, _CachedArgs] = {}
+
+    def _validate_command(self, node: CommandNode) -> None:
+        """Validates the specified command (or header) and stores the
+        processed version in it."""
+        cmd_type = get_command_type(node)
+        cache_key = _command_key(node)
+        cached_args = self._cached_args.get(cache_key)
+        if cached_args is None:
+            validated_args = cmd_type.signature.validate_args(node)
+            if len(self._cached_args) >= _MAX_CACHED_COMMANDS:
+                self._cached_args.clear()
+            # Don't store the validated arguments themselves, they would keep
+            # this command (and thereby the whole AST) alive
+            self._cached_args[cache_key] = _CachedArgs(node, validated_args)
+        else:
+            validated_args = cached_args.apply_to(node)
+        node.accept_command(cmd_type(node, validated_args))
+
+    def visit_zoia_file(self, node: ZoiaFileNode):
+        # No need to walk the whole file, the index has all commands. It's in
+        # source order, i.e. the order in which they would get visited
+        self._validate_command(node.header)
+        for cmd_node in node.node_index.all_commands():
+            self._validate_command(cmd_node)
 
     def visit_header(self, node: HeaderNode):
-        node.accept_command(get_command_type(node)(node))
+        self._validate_command(node)
         super().visit_header(node)
 
     def visit_command(self, node: CommandNode):
-        node.accept_command(get_command_type(node)(node))
+        self._validate_command(node)
         super().visit_command(node)
@@ -20,26 +20,209 @@
 #
 # =============================================================================
 """Provides abstract APIs for visiting Zoia ASTs."""
+import dataclasses
+from enum import Enum
+from types import NoneType
+from typing import Union, get_args, get_origin
+
 from ast_nodes import AASTNode, ZoiaFileNode, HeaderNode, LineNode, \
     LineElementsNode, ALineElementNode, AEmLineElementNode, \
     Em1LineElementNode, Em2LineElementNode, Em3LineElementNode, \
     TextFragmentNode, AliasNode, CommandNode, AArgumentNode, KwdArgumentNode, \
     StdArgumentNode
+from columnar_ast import AColumnarView
 from commands import new_state_container
 
+# Everything that _try_visit_val treats as a node
+_NODE_TYPES = (AASTNode, AColumnarView)
+
+# The kinds of fields that _compile_fields can tell apart, based on their type
+# annotations. Fields of kind _FIELD_OTHER have to be checked at runtime via
+# _try_visit_val
+_FIELD_NODE = 0 # Always holds a node
+_FIELD_OPT_NODE = 1 # Holds a node or None
+_FIELD_NODE_LIST = 2 # Holds a list of nodes
+_FIELD_LEAF = 3 # Never holds a node or a list
+_FIELD_OTHER = 4
+
+def _is_node_type(field_type) -> bool:
+    return isinstance(field_type, type) and issubclass(field_type, AASTNode)
+
+def _field_kind(field_type) -> int:
+    """Determines the kind of a field from its type annotation."""
+    if _is_node_type(field_type):
+        return _FIELD_NODE
+    type_origin = get_origin(field_type)
+    type_args = get_args(field_type)
+    if type_origin is Union:
+        if (len(type_args) == 2 and NoneType in type_args and
+                all(map(_is_node_type, set(type_args) - {NoneType}))):
+            return _FIELD_OPT_NODE
+    elif type_origin is list:
+        if len(type_args) == 1 and _is_node_type(type_args[0]):
+            return _FIELD_NODE_LIST
+    elif isinstance(field_type, type) and not issubclass(field_type, list):
+        return _FIELD_LEAF
+    return _FIELD_OTHER
+
+def _compile_fields(node_type: type, field_names: tuple[str, ...]) \
+        -> tuple[tuple[str, int], ...]:
+    """Returns the names and kinds of the specified fields of the specified
+    node class. Fields without a (usable) type annotation, e.g. the
+    properties of columnar AST views, are of kind _FIELD_OTHER."""
+    field_types = {}
+    if dataclasses.is_dataclass(node_type):
+        field_types = {f.name: f.type for f in dataclasses.fields(node_type)}
+    return tuple((f, _field_kind(field_types.get(f))) for f in field_names)
+
+# Maps node classes to the fields that _visit_default has to visit. Filled in
+# by _visit_fields the first time a node class is visited
+_compiled_visit_fields: dict[type, tuple[tuple[str, int], ...]] = {}
+
+def _visit_fields(node_type: type) -> tuple[tuple[str, int], ...]:
+    """Returns the names and kinds of all fields of the specified node class
+    that may contain nodes. These are the dataclass fields of the node, minus
+    the source position. Views of columnar ASTs have these too, see
+    columnar_ast."""
+    compiled_fields = _compile_fields(node_type, node_type.__match_args__)
+    # Leaves never contain anything to visit
+    compiled_fields = tuple((f, k) for f, k in compiled_fields
+                            if k != _FIELD_LEAF)
+    _compiled_visit_fields[node_type] = compiled_fields
+    return compiled_fields
+
+def _push_val(walk_stack: list, node_val) -> None:
+    """Pushes the specified value onto the specified walk stack if it is a
+    node. Lists are searched for nodes the same way _try_visit_val does."""
+    if isinstance(node_val, _NODE_TYPES):
+        walk_stack.append(node_val)
+    elif isinstance(node_val, list):
+        for list_el in reversed(node_val):
+            _push_val(walk_stack, list_el)
+
+# Maps node classes to the fields that the iterative walks have to push onto
+# their stack, in reverse order. Filled in by _push_fields the first time a
+# node class is walked
+_compiled_push_fields: dict[type, tuple[tuple[str, int], ...]] = {}
+
+def _push_fields(node_type: type) -> tuple[tuple[str, int], ...]:
+    """Returns the result of _visit_fields for the specified node class, in
+    reverse order."""
+    try:
+        return _compiled_push_fields[node_type]
+    except KeyError:
+        pass
+    try:
+        visit_fields = _compiled_visit_fields[node_type]
+    except KeyError:
+        visit_fields = _visit_fields(node_type)
+    push_fields = visit_fields[::-1]
+    _compiled_push_fields[node_type] = push_fields
+    return push_fields
+
+def _push_children(walk_stack: list, node: AASTNode,
+                   push_fields: tuple[tuple[str, int], ...]) -> None:
+    """Pushes all children of the specified node onto the specified walk
+    stack, last child first, so that popping them visits them in order.
+    push_fields must be the result of _push_fields for the node's class."""
+    for field_name, field_kind in push_fields:
+        field_val = getattr(node, field_name)
+        if field_kind == _FIELD_NODE_LIST:
+            walk_stack.extend(reversed(field_val))
+        elif field_kind == _FIELD_NODE:
+            walk_stack.append(field_val)
+        elif field_kind == _FIELD_OPT_NODE:
+            if field_val is not None:
+                walk_stack.append(field_val)
+        else:
+            _push_val(walk_stack, field_val)
+
+class _WalkOrder(Enum):
+    """The ways in which a visitor can walk an AST. Use the constants defined
+    in this module directly instead of accessing this enum."""
+    WO_RECURSIVE = 0
+    WO_PRE_ORDER = 1
+    WO_POST_ORDER = 2
+
+    def __repr__(self) -> str:
+        return self.name
+
+# Each node's visit_* method recurses into its children via _visit_default.
+# The default
+WALK_RECURSIVE = _WalkOrder.WO_RECURSIVE
+# Walks the AST with an explicit stack. Each node's visit_* method is called
+# before any of its children are visited, and _visit_default merely schedules
+# the children to be visited next
+WALK_PRE_ORDER = _WalkOrder.WO_PRE_ORDER
+# Walks the AST with an explicit stack. Each node's visit_* method is called
+# after all of its children have been visited, and _visit_default does
+# nothing
+WALK_POST_ORDER = _WalkOrder.WO_POST_ORDER
+
 class AASTVisitor:
-    """Base class for Zoia AST visitors."""
-    __slots__ = ()
+    """Base class for Zoia AST visitors.
+
+    By default, visiting recurses through several Python call frames per node,
+    which is cheap for shallow ASTs but may hit the recursion limit on deeply
+    nested command arguments. Set walk_order to WALK_PRE_ORDER or
+    WALK_POST_ORDER in a subclass to walk the AST with an explicit stack
+    instead. The visit_* API stays the same, but return values no longer
+    propagate from children to their parents - visit returns the last value
+    that was not None instead."""
+    __slots__ = ('_walk_stack',)
+    # The order in which visit walks the AST, see WALK_* above
+    walk_order = WALK_RECURSIVE
 
     def visit(self, tree: AASTNode):
         """Begins visiting an AST (which need not be a full tree beginning at
         ZoiaFileNode)."""
-        return tree.accept(self)
+        walk_order = self.walk_order
+        if walk_order is WALK_RECURSIVE:
+            return tree.accept(self)
+        # The stack is kept in an attribute so that _visit_default can push
+        # onto it. Restore the previous one afterwards, in case this walk is
+        # nested inside another one
+        # pylint: disable=attribute-defined-outside-init
+        outer_stack = getattr(self, '_walk_stack', None)
+        self._walk_stack = walk_stack = [tree]
+        try:
+            if walk_order is WALK_PRE_ORDER:
+                return self._walk_pre_order(walk_stack)
+            return self._walk_post_order(walk_stack)
+        finally:
+            self._walk_stack = outer_stack
+
+    def _walk_pre_order(self, walk_stack: list):
+        """Implements visit for WALK_PRE_ORDER. The walk stack initially only
+        contains the root of the AST to visit."""
+        last_tf = None
+        while walk_stack:
+            # Do not override a present value with None
+            last_tf = walk_stack.pop().accept(self) or last_tf
+        return last_tf
+
+    def _walk_post_order(self, walk_stack: list):
+        """Implements visit for WALK_POST_ORDER. The walk stack initially only
+        contains the root of the AST to visit. A None on top of a node means
+        that its children have already been visited."""
+        last_tf = None
+        while walk_stack:
+            node = walk_stack.pop()
+            if node is None:
+                node = walk_stack.pop()
+            elif push_fields := _push_fields(type(node)):
+                walk_stack.append(node)
+                walk_stack.append(None)
+                _push_children(walk_stack, node, push_fields)
+                continue
+            # Do not override a present value with None
+            last_tf = node.accept(self) or last_tf
+        return last_tf
 
     def _try_visit_val(self, node_val):
         """Internal recursive method that attempts to visit the specified
         value."""
-        if isinstance(node_val, AASTNode):
+        if isinstance(node_val, _NODE_TYPES):
             return node_val.accept(self)
         elif isinstance(node_val, list):
             last_tf = None
@@ -54,12 +237,31 @@ class AASTVisitor:
         """Called when a non-overriden visit_* method is called. Visits all
         child nodes and returns the last value. You can override it if you want
         to do something different."""
+        walk_order = self.walk_order
+        if walk_order is not WALK_RECURSIVE:
+            if walk_order is WALK_PRE_ORDER:
+                push_fields = _push_fields(type(node))
+                if push_fields:
+                    _push_children(self._walk_stack, node, push_fields)
+            return None
+        try:
+            visit_fields = _compiled_visit_fields[type(node)]
+        except KeyError:
+            visit_fields = _visit_fields(type(node))
         last_tf = None
-        for node_attr in node.__slots__:
-            if not hasattr(node, node_attr):
-                continue # Member descriptor, ignore
-            # Do not override a present value with None
-            last_tf = self._try_visit_val(getattr(node, node_attr)) or last_tf
+        # Do not override a present value with None in any of these
+        for field_name, field_kind in visit_fields:
+            field_val = getattr(node, field_name)
+            if field_kind == _FIELD_NODE_LIST:
+                for list_el in field_val:
+                    last_tf = list_el.accept(self) or last_tf
+            elif field_kind == _FIELD_NODE:
+                last_tf = field_val.accept(self) or last_tf
+            elif field_kind == _FIELD_OPT_NODE:
+                if field_val is not None:
+                    last_tf = field_val.accept(self) or last_tf
+            else:
+                last_tf = self._try_visit_val(field_val) or last_tf
         return last_tf
 
     def _visit_line_element(self, node: ALineElementNode):
@@ -130,20 +332,33 @@ class ACommandVisitor(AASTVisitor):
     """Version of AASTVisitor meant to be used for visiting commands. Much
     faster than the naive approach since it can skip over things like text
     fragments and aliases. Override visit_command (and visit_header, if
-    needed), perform your logic, then call the super method."""
+    needed), perform your logic, then call the super method.
+
+    When walking the AST iteratively (see AASTVisitor.walk_order), every node
+    is visited like AASTVisitor does it, so commands are still visited in the
+    same order."""
     __slots__ = ()
 
     def visit_zoia_file(self, node: ZoiaFileNode):
+        if self.walk_order is not WALK_RECURSIVE:
+            super().visit_zoia_file(node)
+            return
         self.visit_header(node.header)
         for l in node.lines:
             if l_elems := l.elements:
                 self.visit_line_elements(l_elems)
 
     def visit_header(self, node: HeaderNode):
+        if self.walk_order is not WALK_RECURSIVE:
+            super().visit_header(node)
+            return
         for a in node.arguments:
             self.visit_line_elements(a.arg_value)
 
     def visit_line_elements(self, node: LineElementsNode):
+        if self.walk_order is not WALK_RECURSIVE:
+            super().visit_line_elements(node)
+            return
         for e in node.elements:
             if isinstance(e, CommandNode):
                 self.visit_command(e)
@@ -160,6 +375,9 @@ class ACommandVisitor(AASTVisitor):
                 self.visit_command(e)
 
     def visit_command(self, node: CommandNode):
+        if self.walk_order is not WALK_RECURSIVE:
+            super().visit_command(node)
+            return
         for a in node.arguments:
             self.visit_line_elements(a.arg_value)
 
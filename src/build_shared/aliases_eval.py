@@ -49,6 +49,6 @@ class AliasesEvaluator(ACommandEvaluator):
         header_kind = node.proc_cmd.cmd_args['header_kind']
         if header_kind != HeaderKind.ALIASES:
             raise EvalError(
-                node.arguments[0].arg_value.elements[0].src_pos,
+                node.arguments[0].arg_value.element_src_pos(0),
                 f"Aliases files must have header kind 'aliases', but had "
                 f"header kind '{header_kind}' instead")
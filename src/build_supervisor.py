@@ -27,15 +27,18 @@ import log
 from build_shared import AliasesEvaluator
 from project import Project, ZoiaFile
 
-def build(project: Project):
-    """Builds the specified project based on its config."""
+def build(project: Project) -> bool:
+    """Builds the specified project based on its config. Returns False if the
+    build had to be aborted due to errors."""
     log.info('Beginning to build project')
     proj_path = project.project_path
     series_f = project.series
     series_rel = series_f.series_path.relative_to(proj_path)
     log.info(log.arrow(1, f'Building series at {log.color_dir(series_rel)}'))
     # Stage 1: Evaluating the aliases.zoia file (TODO use, see stage 4)
-    evaluate_aliases(project)
+    if evaluate_aliases(project) is None:
+        log.warning('Aborting build due to errors in the aliases file')
+        return False
     # Stage 2: Evaluating the dictionary.zoia file (TODO)
     # Stage 3: Inserting fragments (TODO)
     # Stage 4: Resolving aliases (TODO)
@@ -48,14 +51,19 @@ def build(project: Project):
             log.info(log.arrow(3, f'Building chapter at '
                                   f'{log.color_dir(chapter_rel)}'))
             build_ir(proj_path, chapter.main_file)
+    return True
 
 def evaluate_aliases(project):
-    """Handles stage 1 of building, evaluating the aliases.zoia file."""
+    """Handles stage 1 of building, evaluating the aliases.zoia file. Returns
+    None if the file could not be loaded (which only happens here if the
+    project was parsed lazily) or evaluated."""
     aliases_f = project.aliases_file
     aliases_rel = aliases_f.file_path.relative_to(project.project_path)
     log.info(log.arrow(2, f'Evaluating aliases file at '
                           f'{log.color_file(aliases_rel)}'))
-    als_tree = aliases_f.file_ast
+    als_tree = aliases_f.load_file_ast(raise_errors=False)
+    if als_tree is None:
+        return None
     als_eval = AliasesEvaluator()
     return als_eval.visit(als_tree)
 
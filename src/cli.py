@@ -23,11 +23,12 @@
 import sys
 import time
 from pathlib import Path
+from typing import NoReturn
 
 import build_supervisor
 import log
 from exception import AbstractError
-from project import Project
+from project import Project, ZoiaLoader, CACHE_FOLDER_NAME
 
 def _print_legal_verbs(*, illegal_verb: str = ''):
     """Helper function for printing all recognized verbs (and optionally
@@ -96,27 +97,52 @@ class _CommonVerb(_Verb):
         boot/exit logging)."""
         raise AbstractError()
 
+def _usage_error(usage: str) -> NoReturn:
+    """Helper function for verbs that were given arguments they can't handle.
+    Prints the specified usage string and exits."""
+    print(f'Usage: {usage}', file=sys.stderr)
+    sys.exit(1)
+
+def _project_path_arg(args: list[str], usage: str) -> Path:
+    """Helper function for verbs that take the path to a project as their only,
+    optional argument. Falls back to the CWD if no path was given and prints
+    the specified usage string if too many arguments were given."""
+    match len(args):
+        case 0:
+            return Path.cwd()
+        case 1:
+            return Path(args[0])
+        case _:
+            _usage_error(usage)
+
 class _ProjectVerb(_CommonVerb):
     """Base class for common verbs that share an additional pattern of
     behavior: parsing a project from the first argument or CWD, while keeping
     track of time elapsed."""
     _time_msg: str
+    _verb_name: str
     __slots__ = ()
 
     def _run_common(self, args: list[str]) -> None:
         start_time = time.time()
-        match len(args):
-            case 0:
-                final_path = Path.cwd()
-            case 1:
-                final_path = Path(args[0])
-            case _:
-                print('Usage: zoia build [path]', file=sys.stderr)
-                sys.exit(1)
+        usage = f'zoia {self._verb_name} [--parallel | --no-parallel] [path]'
+        # --parallel and --no-parallel override the config option, but can't
+        # both be given at once
+        if '--parallel' in args and '--no-parallel' in args:
+            _usage_error(usage)
+        parallel = None
+        if '--parallel' in args:
+            parallel = True
+        elif '--no-parallel' in args:
+            parallel = False
+        args = [a for a in args if a not in ('--parallel', '--no-parallel')]
+        final_path = _project_path_arg(args, usage)
         log.info('Beginning to parse project')
-        project = Project.parse_project(final_path)
+        project = Project.parse_project(final_path, use_cache=True,
+                                        parallel=parallel)
         if project is not None:
-            self._run_on_project(project)
+            with project:
+                self._run_on_project(project)
         else:
             log.warning('Aborting build due to errors while parsing project')
         duration = time.time() - start_time
@@ -129,6 +155,7 @@ class _ProjectVerb(_CommonVerb):
 class _Build(_ProjectVerb):
     """Verb that builds a project."""
     _time_msg = 'Build took %ss'
+    _verb_name = 'build'
     __slots__ = ()
 
     def _run_on_project(self, project: Project) -> None:
@@ -138,11 +165,24 @@ class _Check(_ProjectVerb):
     """Verb that checks a project for spelling, grammar, style, etc.
     errors."""
     _time_msg = 'Check took %ss'
+    _verb_name = 'check'
     __slots__ = ()
 
     def _run_on_project(self, project: Path) -> None:
         pass # TODO implement checking
 
+class _Prune(_CommonVerb):
+    """Verb that removes stale entries (ones that no longer match any Zoia file
+    in the project) from a project's compiler cache."""
+    __slots__ = ()
+
+    def _run_common(self, args: list[str]) -> None:
+        final_path = _project_path_arg(args, 'zoia prune [path]').resolve()
+        log.info(f'Pruning cache at '
+                 f'{log.color_dir(final_path / CACHE_FOLDER_NAME)}')
+        num_pruned = ZoiaLoader.prune_cache(final_path)
+        log.info(f'Removed $fWl${num_pruned}$fT$ stale cache entries')
+
 class _Version(_Verb):
     """Verb that prints the Zoia version and exits."""
     __slots__ = ()
@@ -153,6 +193,7 @@ class _Version(_Verb):
 _verbs = {
     'build': _Build(),
     'check': _Check(),
+    'prune': _Prune(),
     'version': _Version(),
 }
 
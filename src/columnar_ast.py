@@ -0,0 +1,575 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements a columnar (struct-of-arrays) representation of Zoia ASTs. Instead
+of one Python object per node, a ColumnarAST stores every node as one row in a
+set of parallel arrays (kind, parent, first child, next sibling, string and
+packed source position), plus a table of all strings in the AST. That makes it
+far cheaper to keep large ASTs in memory, to serialize them (see to_bytes) and
+to scan them in tight loops (see indices_of_kind).
+
+Nodes are numbered in pre-order, so the root always has index 0 and the
+descendants of a node always directly follow it. Views (see ColumnarAST.view)
+wrap a single row and provide the same attributes as the matching AST node
+class, so that visitors, accept and canonical work on them as well. They are
+read-only though - use to_node to get a regular AST back."""
+import struct
+import sys
+from array import array
+from enum import IntEnum
+
+from ast_nodes import AASTNode, AliasNode, CanonicalWriter, CommandNode, \
+    Em1LineElementNode, Em2LineElementNode, Em3LineElementNode, HeaderNode, \
+    KwdArgumentNode, LineElementsNode, LineNode, StdArgumentNode, \
+    TextFragmentNode, ZoiaFileNode
+from exception import AbstractError
+from src_pos import SourceTable
+
+class NodeKind(IntEnum):
+    """The kinds of nodes that a ColumnarAST can contain, one per concrete AST
+    node class."""
+    ZOIA_FILE = 0
+    HEADER = 1
+    LINE = 2
+    LINE_ELEMENTS = 3
+    EM1_LINE_ELEMENT = 4
+    EM2_LINE_ELEMENT = 5
+    EM3_LINE_ELEMENT = 6
+    TEXT_FRAGMENT = 7
+    ALIAS = 8
+    COMMAND = 9
+    KWD_ARGUMENT = 10
+    STD_ARGUMENT = 11
+
+# Marks a missing parent, child, sibling or string
+NO_INDEX = -1
+
+# Typecodes of the index and position arrays. 'i' and 'q' are at least 32 and
+# 64 bits wide respectively, which is plenty
+_INDEX_TYPECODE = 'i'
+_POS_TYPECODE = 'q'
+# Number of nodes, strings and the length of the UTF-8 encoded string data
+_HEADER_FORMAT = '<3Q'
+_HEADER_SIZE = struct.calcsize(_HEADER_FORMAT)
+# The serialized format always uses little-endian numbers
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+def _no_children(_node: AASTNode) -> tuple[()]:
+    return ()
+
+def _arg_value_child(node: KwdArgumentNode | StdArgumentNode):
+    return (node.arg_value,)
+
+def _elements_child(node: LineNode | Em1LineElementNode):
+    return (node.elements,) if node.elements is not None else ()
+
+# Maps each AST node class to its kind, a function returning its children in
+# order and the name of the string attribute it has (if any)
+_NODE_LAYOUTS = {
+    ZoiaFileNode: (NodeKind.ZOIA_FILE, lambda n: (n.header, *n.lines), None),
+    HeaderNode: (NodeKind.HEADER, lambda n: n.arguments, 'cmd_name'),
+    LineNode: (NodeKind.LINE, _elements_child, None),
+    LineElementsNode: (NodeKind.LINE_ELEMENTS, lambda n: n.elements, None),
+    Em1LineElementNode: (NodeKind.EM1_LINE_ELEMENT, _elements_child, None),
+    Em2LineElementNode: (NodeKind.EM2_LINE_ELEMENT, _elements_child, None),
+    Em3LineElementNode: (NodeKind.EM3_LINE_ELEMENT, _elements_child, None),
+    TextFragmentNode: (NodeKind.TEXT_FRAGMENT, _no_children, 'text_val'),
+    AliasNode: (NodeKind.ALIAS, _no_children, 'alias_key'),
+    CommandNode: (NodeKind.COMMAND, lambda n: n.arguments, 'cmd_name'),
+    KwdArgumentNode: (NodeKind.KWD_ARGUMENT, _arg_value_child, 'kwd_name'),
+    StdArgumentNode: (NodeKind.STD_ARGUMENT, _arg_value_child, None),
+}
+
+class ColumnarAST:
+    """A Zoia AST stored as parallel arrays, one row per node. See the module
+    docstring for an overview. The arrays are public so that performance
+    critical code can scan them directly, but must not be modified."""
+    # One attribute per column, so there are bound to be a lot of them
+    # pylint: disable=too-many-instance-attributes
+    __slots__ = ('src_table', 'kinds', 'parents', 'first_children',
+                 'next_siblings', 'str_indices', 'positions', 'strings')
+
+    def __init__(self, src_table: SourceTable) -> None:
+        self.src_table = src_table
+        # One NodeKind per node, stored as bytes so that they can be searched
+        # quickly, see indices_of_kind
+        self.kinds = bytearray()
+        self.parents = array(_INDEX_TYPECODE)
+        self.first_children = array(_INDEX_TYPECODE)
+        self.next_siblings = array(_INDEX_TYPECODE)
+        # Index into strings of the node's text value, alias key, command name
+        # or keyword name
+        self.str_indices = array(_INDEX_TYPECODE)
+        # Packed source positions, see src_pos.pack_pos
+        self.positions = array(_POS_TYPECODE)
+        # Every distinct string in the AST, each stored only once
+        self.strings: list[str] = []
+
+    @classmethod
+    def from_node(cls, root_node: AASTNode) -> 'ColumnarAST':
+        """Converts the AST starting at the specified node (usually a
+        ZoiaFileNode) into a ColumnarAST."""
+        col_ast = cls(root_node.src_table)
+        kinds = col_ast.kinds
+        parents = col_ast.parents
+        first_children = col_ast.first_children
+        next_siblings = col_ast.next_siblings
+        str_indices = col_ast.str_indices
+        positions = col_ast.positions
+        strings = col_ast.strings
+        string_indices: dict[str, int] = {}
+        # The index of the last child added to each node so far, used to link
+        # up the siblings
+        last_children = []
+        to_add = [(root_node, NO_INDEX)]
+        while to_add:
+            node, parent_index = to_add.pop()
+            node_index = len(kinds)
+            node_kind, get_children, str_attr = _NODE_LAYOUTS[type(node)]
+            kinds.append(node_kind)
+            parents.append(parent_index)
+            first_children.append(NO_INDEX)
+            next_siblings.append(NO_INDEX)
+            if str_attr is None:
+                str_indices.append(NO_INDEX)
+            else:
+                node_str = getattr(node, str_attr)
+                str_index = string_indices.get(node_str)
+                if str_index is None:
+                    str_index = string_indices[node_str] = len(strings)
+                    strings.append(node_str)
+                str_indices.append(str_index)
+            positions.append(node.src_packed)
+            last_children.append(NO_INDEX)
+            if parent_index != NO_INDEX:
+                prev_sibling = last_children[parent_index]
+                if prev_sibling == NO_INDEX:
+                    first_children[parent_index] = node_index
+                else:
+                    next_siblings[prev_sibling] = node_index
+                last_children[parent_index] = node_index
+            # Reversed, so that the first child gets popped (and numbered)
+            # first
+            to_add.extend((c, node_index)
+                          for c in reversed(get_children(node)))
+        return col_ast
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    # Serialization
+    def to_bytes(self) -> bytes:
+        """Serializes this AST into a single buffer. Use from_bytes to turn it
+        back into a ColumnarAST."""
+        # Lengths in code points, so that the decoded data can be sliced
+        str_lengths = array(_INDEX_TYPECODE, map(len, self.strings))
+        str_data = ''.join(self.strings).encode('utf-8')
+        src_file_data = self.src_table.src_file.encode('utf-8')
+        buf_parts = [struct.pack(_HEADER_FORMAT, len(self), len(self.strings),
+                                 len(str_data)), bytes(self.kinds)]
+        for num_array in (self.parents, self.first_children,
+                          self.next_siblings, self.str_indices,
+                          self.positions, str_lengths):
+            if _BIG_ENDIAN:
+                num_array = array(num_array.typecode, num_array)
+                num_array.byteswap()
+            buf_parts.append(num_array.tobytes())
+        buf_parts.append(str_data)
+        buf_parts.append(src_file_data)
+        return b''.join(buf_parts)
+
+    @classmethod
+    def from_bytes(cls, buf: bytes) -> 'ColumnarAST':
+        """Deserializes a ColumnarAST that was serialized via to_bytes."""
+        num_nodes, num_strings, str_data_len = struct.unpack_from(
+            _HEADER_FORMAT, buf)
+        buf_pos = _HEADER_SIZE
+        def _read_array(typecode: str, num_items: int) -> array:
+            nonlocal buf_pos
+            ret_array = array(typecode)
+            buf_end = buf_pos + num_items * ret_array.itemsize
+            ret_array.frombytes(buf[buf_pos:buf_end])
+            if _BIG_ENDIAN:
+                ret_array.byteswap()
+            buf_pos = buf_end
+            return ret_array
+        kinds = bytearray(buf[buf_pos:buf_pos + num_nodes])
+        buf_pos += num_nodes
+        parents = _read_array(_INDEX_TYPECODE, num_nodes)
+        first_children = _read_array(_INDEX_TYPECODE, num_nodes)
+        next_siblings = _read_array(_INDEX_TYPECODE, num_nodes)
+        str_indices = _read_array(_INDEX_TYPECODE, num_nodes)
+        positions = _read_array(_POS_TYPECODE, num_nodes)
+        str_lengths = _read_array(_INDEX_TYPECODE, num_strings)
+        str_data = buf[buf_pos:buf_pos + str_data_len].decode('utf-8')
+        buf_pos += str_data_len
+        col_ast = cls(SourceTable(buf[buf_pos:].decode('utf-8')))
+        col_ast.kinds = kinds
+        col_ast.parents = parents
+        col_ast.first_children = first_children
+        col_ast.next_siblings = next_siblings
+        col_ast.str_indices = str_indices
+        col_ast.positions = positions
+        str_start = 0
+        for str_len in str_lengths:
+            col_ast.strings.append(str_data[str_start:str_start + str_len])
+            str_start += str_len
+        return col_ast
+
+    def __reduce__(self):
+        # Pickle the AST as one buffer instead of a bunch of arrays
+        return ColumnarAST.from_bytes, (self.to_bytes(),)
+
+    # Scanning
+    def children_of(self, node_index: int) -> list[int]:
+        """Returns the indices of all children of the specified node, in
+        order."""
+        next_siblings = self.next_siblings
+        ret_children = []
+        child_index = self.first_children[node_index]
+        while child_index != NO_INDEX:
+            ret_children.append(child_index)
+            child_index = next_siblings[child_index]
+        return ret_children
+
+    def indices_of_kind(self, node_kind: NodeKind) -> list[int]:
+        """Returns the indices of all nodes of the specified kind, in
+        pre-order."""
+        kinds = self.kinds
+        find_kind = kinds.find
+        ret_indices = []
+        kind_index = find_kind(node_kind)
+        while kind_index != -1:
+            ret_indices.append(kind_index)
+            kind_index = find_kind(node_kind, kind_index + 1)
+        return ret_indices
+
+    def string_of(self, node_index: int) -> str | None:
+        """Returns the string stored for the specified node (its text value,
+        alias key, command name or keyword name) or None if its kind does not
+        have one."""
+        str_index = self.str_indices[node_index]
+        return self.strings[str_index] if str_index != NO_INDEX else None
+
+    # Views and conversion
+    def view(self, node_index: int = 0) -> 'AColumnarView':
+        """Returns a view of the node with the specified index, by default
+        the root node."""
+        return _VIEW_TYPES[self.kinds[node_index]](self, node_index)
+
+    def to_node(self, node_index: int = 0) -> AASTNode:
+        """Converts the node with the specified index (by default the root
+        node) and all its descendants back into regular AST nodes."""
+        return _NODE_BUILDERS[self.kinds[node_index]](self, node_index)
+
+def _node_kwargs(col_ast: ColumnarAST, node_index: int) -> dict:
+    """Returns the keyword arguments that every AST node constructor
+    needs."""
+    return {'src_table': col_ast.src_table,
+            'src_packed': col_ast.positions[node_index]}
+
+def _build_children(col_ast: ColumnarAST, node_index: int) -> list[AASTNode]:
+    """Converts all children of the specified node back into AST nodes."""
+    return [col_ast.to_node(c) for c in col_ast.children_of(node_index)]
+
+def _build_zoia_file(col_ast: ColumnarAST, node_index: int) -> ZoiaFileNode:
+    header, *lines = _build_children(col_ast, node_index)
+    return ZoiaFileNode(header, lines, **_node_kwargs(col_ast, node_index))
+
+def _build_command(node_cls: type):
+    def _build(col_ast: ColumnarAST, node_index: int) -> CommandNode:
+        return node_cls(_build_children(col_ast, node_index),
+                        col_ast.string_of(node_index),
+                        **_node_kwargs(col_ast, node_index))
+    return _build
+
+def _build_line(col_ast: ColumnarAST, node_index: int) -> LineNode:
+    child_index = col_ast.first_children[node_index]
+    line_elements = (col_ast.to_node(child_index)
+                     if child_index != NO_INDEX else None)
+    return LineNode(line_elements, **_node_kwargs(col_ast, node_index))
+
+def _build_line_elements(col_ast: ColumnarAST,
+                         node_index: int) -> LineElementsNode:
+    return LineElementsNode(_build_children(col_ast, node_index),
+                            **_node_kwargs(col_ast, node_index))
+
+def _build_single_child(node_cls: type):
+    def _build(col_ast: ColumnarAST, node_index: int) -> AASTNode:
+        return node_cls(col_ast.to_node(col_ast.first_children[node_index]),
+                        **_node_kwargs(col_ast, node_index))
+    return _build
+
+def _build_string(node_cls: type):
+    def _build(col_ast: ColumnarAST, node_index: int) -> AASTNode:
+        return node_cls(col_ast.string_of(node_index),
+                        **_node_kwargs(col_ast, node_index))
+    return _build
+
+def _build_kwd_argument(col_ast: ColumnarAST,
+                        node_index: int) -> KwdArgumentNode:
+    # Reverse order due to dataclass inheritance
+    return KwdArgumentNode(col_ast.to_node(col_ast.first_children[node_index]),
+                           col_ast.string_of(node_index),
+                           **_node_kwargs(col_ast, node_index))
+
+# Indexed by NodeKind
+_NODE_BUILDERS = (
+    _build_zoia_file,
+    _build_command(HeaderNode),
+    _build_line,
+    _build_line_elements,
+    _build_single_child(Em1LineElementNode),
+    _build_single_child(Em2LineElementNode),
+    _build_single_child(Em3LineElementNode),
+    _build_string(TextFragmentNode),
+    _build_string(AliasNode),
+    _build_command(CommandNode),
+    _build_kwd_argument,
+    _build_single_child(StdArgumentNode),
+)
+
+# Views =======================================================================
+class AColumnarView:
+    """Base class for views of single nodes in a ColumnarAST. Subclasses
+    provide the same attributes as the matching AST node class and reuse its
+    accept and write_canonical implementations where possible.
+    __match_args__ lists those attributes, just like it does for the
+    dataclasses in ast_nodes."""
+    __slots__ = ('col_ast', 'node_index')
+
+    def __init__(self, col_ast: ColumnarAST, node_index: int) -> None:
+        self.col_ast = col_ast
+        self.node_index = node_index
+
+    @property
+    def src_table(self) -> SourceTable:
+        """The source table of the file this node is in."""
+        return self.col_ast.src_table
+
+    @property
+    def src_packed(self) -> int:
+        """The packed source position of this node."""
+        return self.col_ast.positions[self.node_index]
+
+    src_pos = AASTNode.src_pos
+    canonical = AASTNode.canonical
+
+    def _child_view(self) -> 'AColumnarView':
+        """Returns a view of the first (or only) child of this node."""
+        col_ast = self.col_ast
+        return col_ast.view(col_ast.first_children[self.node_index])
+
+    def _child_views(self) -> list['AColumnarView']:
+        """Returns views of all children of this node."""
+        col_ast = self.col_ast
+        return [col_ast.view(c) for c in col_ast.children_of(self.node_index)]
+
+    def _string(self) -> str:
+        """Returns the string stored for this node."""
+        return self.col_ast.string_of(self.node_index)
+
+    def accept(self, visitor):
+        """See AASTNode.accept."""
+        raise AbstractError()
+
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        """See AASTNode.write_canonical."""
+        raise AbstractError()
+
+    def __repr__(self) -> str:
+        return (f'{type(self).__name__}('
+                f'{NodeKind(self.col_ast.kinds[self.node_index]).name}, '
+                f'index={self.node_index})')
+
+class ZoiaFileView(AColumnarView):
+    """View of a ZoiaFileNode."""
+    __slots__ = ()
+    __match_args__ = ('header', 'lines')
+    accept = ZoiaFileNode.accept
+    write_canonical = ZoiaFileNode.write_canonical
+
+    @property
+    def header(self) -> 'HeaderView':
+        """See ZoiaFileNode.header."""
+        return self._child_view()
+
+    @property
+    def lines(self) -> list['LineView']:
+        """See ZoiaFileNode.lines."""
+        return self._child_views()[1:]
+
+class CommandView(AColumnarView):
+    """View of a CommandNode."""
+    __slots__ = ()
+    __match_args__ = ('arguments', 'cmd_name')
+    accept = CommandNode.accept
+    write_canonical = CommandNode.write_canonical
+
+    @property
+    def arguments(self) -> list['AColumnarView']:
+        """See CommandNode.arguments."""
+        return self._child_views()
+
+    @property
+    def cmd_name(self) -> str:
+        """See CommandNode.cmd_name."""
+        return self._string()
+
+class HeaderView(CommandView):
+    """View of a HeaderNode."""
+    __slots__ = ()
+    accept = HeaderNode.accept
+
+class LineView(AColumnarView):
+    """View of a LineNode."""
+    __slots__ = ()
+    __match_args__ = ('elements',)
+    accept = LineNode.accept
+    write_canonical = LineNode.write_canonical
+
+    @property
+    def elements(self) -> 'LineElementsView | None':
+        """See LineNode.elements."""
+        if self.col_ast.first_children[self.node_index] == NO_INDEX:
+            return None
+        return self._child_view()
+
+class LineElementsView(AColumnarView):
+    """View of a LineElementsNode."""
+    __slots__ = ()
+    __match_args__ = ('elements',)
+    accept = LineElementsNode.accept
+    write_canonical = LineElementsNode.write_canonical
+
+    @property
+    def elements(self) -> list['AColumnarView']:
+        """See LineElementsNode.elements."""
+        return self._child_views()
+
+class AEmLineElementView(AColumnarView):
+    """View of an AEmLineElementNode."""
+    __slots__ = ()
+    __match_args__ = ('elements',)
+    # The number of asterisks around the elements
+    _em_level: int
+
+    @property
+    def elements(self) -> LineElementsView:
+        """See AEmLineElementNode.elements."""
+        return self._child_view()
+
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        em_marker = '*' * self._em_level
+        write_out(em_marker)
+        self.elements.write_canonical(write_out)
+        write_out(em_marker)
+
+class Em1LineElementView(AEmLineElementView):
+    """View of an Em1LineElementNode."""
+    __slots__ = ()
+    _em_level = 1
+    accept = Em1LineElementNode.accept
+
+class Em2LineElementView(AEmLineElementView):
+    """View of an Em2LineElementNode."""
+    __slots__ = ()
+    _em_level = 2
+    accept = Em2LineElementNode.accept
+
+class Em3LineElementView(AEmLineElementView):
+    """View of an Em3LineElementNode."""
+    __slots__ = ()
+    _em_level = 3
+    accept = Em3LineElementNode.accept
+
+class TextFragmentView(AColumnarView):
+    """View of a TextFragmentNode."""
+    __slots__ = ()
+    __match_args__ = ('text_val',)
+    accept = TextFragmentNode.accept
+    write_canonical = TextFragmentNode.write_canonical
+
+    @property
+    def text_val(self) -> str:
+        """See TextFragmentNode.text_val."""
+        return self._string()
+
+class AliasView(AColumnarView):
+    """View of an AliasNode."""
+    __slots__ = ()
+    __match_args__ = ('alias_key',)
+    accept = AliasNode.accept
+    write_canonical = AliasNode.write_canonical
+
+    @property
+    def alias_key(self) -> str:
+        """See AliasNode.alias_key."""
+        return self._string()
+
+class AArgumentView(AColumnarView):
+    """View of an AArgumentNode."""
+    __slots__ = ()
+
+    @property
+    def arg_value(self) -> LineElementsView:
+        """See AArgumentNode.arg_value."""
+        return self._child_view()
+
+class KwdArgumentView(AArgumentView):
+    """View of a KwdArgumentNode."""
+    __slots__ = ()
+    __match_args__ = ('arg_value', 'kwd_name')
+    accept = KwdArgumentNode.accept
+
+    @property
+    def kwd_name(self) -> str:
+        """See KwdArgumentNode.kwd_name."""
+        return self._string()
+
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        write_out(f'{self.kwd_name} = ')
+        self.arg_value.write_canonical(write_out)
+
+class StdArgumentView(AArgumentView):
+    """View of a StdArgumentNode."""
+    __slots__ = ()
+    __match_args__ = ('arg_value',)
+    accept = StdArgumentNode.accept
+
+    def write_canonical(self, write_out: CanonicalWriter) -> None:
+        self.arg_value.write_canonical(write_out)
+
+# Indexed by NodeKind
+_VIEW_TYPES = (
+    ZoiaFileView,
+    HeaderView,
+    LineView,
+    LineElementsView,
+    Em1LineElementView,
+    Em2LineElementView,
+    Em3LineElementView,
+    TextFragmentView,
+    AliasView,
+    CommandView,
+    KwdArgumentView,
+    StdArgumentView,
+)
@@ -22,12 +22,25 @@
 """This package implements the various commands that Zoia supports.
 
 All imports should come directly from here - *never* import from the actual
-files that define the classes. That way they can be moved around easily."""
+files that define the classes. That way they can be moved around easily.
+
+Command modules are only imported once a command they define is actually
+used. To find the right module without importing all of them, this package
+ships a manifest in _manifest.json, mapping each command name to its module,
+a summary of its signature and its state extension (if any). The manifest is
+generated at build time by scripts/gen_manifest.py, so it has to be
+regenerated whenever a command is added, removed or changed. If it is
+missing or broken, it is built in memory instead (by importing every command
+module), which is slower but still works. The same happens once if it turns
+out to be stale, i.e. if it lacks a command or points to the wrong module for
+one."""
 from dataclasses import dataclass
 import importlib
+import json
 import pkgutil
-import sys
+from pathlib import Path
 
+import log
 from exception import ValidationError
 
 # Disable some pylint warnings for this file only:
@@ -37,54 +50,138 @@ from exception import ValidationError
 #    spooky.
 # pylint: disable=global-statement,invalid-name
 
+# Bump this whenever the structure of the manifest's entries changes
+_MANIFEST_FORMAT = 1
+_PACKAGE_PATH = Path(__file__).resolve().parent
+_MANIFEST_PATH = _PACKAGE_PATH / '_manifest.json'
+
 def get_command_type(node):
     """Returns the command class matching the command describes by the
     specified CommandNode. Raises a ValidationError if it could not be found
     (indicating an unknown command)."""
     try:
         return _cmd_map[node.cmd_name]
-    except TypeError: # _cmd_map is None
-        _init_commands()
-        return get_command_type(node)
-    except KeyError as e: # node.cmd_name not in _cmd_map
-        raise ValidationError(
-            node.src_pos,
-            f"Unknown command '\\{node.cmd_name}'") from e
+    except KeyError:
+        pass # Not imported yet, look it up in the manifest
+    cmd_type = _command_from_manifest(node.cmd_name)
+    if cmd_type is None and _rebuild_manifest():
+        cmd_type = _command_from_manifest(node.cmd_name)
+    if cmd_type is None:
+        raise ValidationError(node.src_pos,
+                              f"Unknown command '\\{node.cmd_name}'")
+    return cmd_type
 
 def new_state_container():
     """Returns a new instance of the state container class."""
     try:
         return _state_class()
     except TypeError:
-        _init_commands()
+        _init_state_class()
         return _state_class()
 
-_cmd_map: dict | None = None
+# Maps the names of all commands imported so far to their classes
+_cmd_map: dict = {}
+_manifest: dict | None = None
+# Whether _manifest has already been rebuilt because it turned out to be stale
+_manifest_rebuilt = False
 _state_class: type | None = None
 
-def _init_commands():
-    global _cmd_map, _state_class
-    _cmd_map = {}
-    state_exts = []
-    commands_name = __name__
-    commands_path = sys.modules[commands_name].__path__
-    # First collect all modules in this package that define a command
-    for _imp, mod_name, _is_pkg in pkgutil.iter_modules(commands_path):
+def _import_command(mod_name: str):
+    """Imports the command module with the specified name and returns the
+    command class it defines, finalizing it if that hasn't happened yet."""
+    module = importlib.import_module(f'{__name__}.{mod_name}')
+    cmd_type = getattr(module, 'CMD_TYPE')
+    if cmd_type.cmd_name not in _cmd_map:
+        # All signatures the command could need are created at import time,
+        # so it can be finalized right away
+        cmd_type.finalize_command()
+        _cmd_map[cmd_type.cmd_name] = cmd_type
+    return cmd_type
+
+def _get_manifest() -> dict[str, dict]:
+    """Returns the entries of the command manifest, loading or regenerating
+    it if this is the first call."""
+    global _manifest
+    if _manifest is None:
+        _manifest = _load_manifest(_MANIFEST_PATH)
+    return _manifest
+
+def _command_from_manifest(cmd_name: str):
+    """Imports the command with the specified name via the module that the
+    manifest lists for it and returns its class. Returns None if the manifest
+    has no entry for it or if that entry is stale, i.e. its module does not
+    exist (anymore) or defines another command."""
+    try:
+        cmd_entry = _get_manifest()[cmd_name]
+    except KeyError:
+        return None
+    try:
+        cmd_type = _import_command(cmd_entry['module'])
+    except ImportError:
+        return None
+    return cmd_type if cmd_type.cmd_name == cmd_name else None
+
+def _rebuild_manifest() -> bool:
+    """Replaces the manifest with one built in memory, since the loaded one
+    turned out to be stale. Only does so once, returns False if that has
+    already happened."""
+    global _manifest, _manifest_rebuilt
+    if _manifest_rebuilt:
+        return False
+    log.debug(f'Command manifest at {log.color_file(_MANIFEST_PATH)} is '
+              f'stale, run scripts/gen_manifest.py to regenerate it')
+    _manifest = _build_manifest()
+    _manifest_rebuilt = True
+    return True
+
+def _build_manifest() -> dict[str, dict]:
+    """Imports every module in this package that defines a command and
+    returns the resulting manifest entries, keyed by command name."""
+    manifest_entries = {}
+    for _imp, mod_name, _is_pkg in pkgutil.iter_modules([str(_PACKAGE_PATH)]):
         # Internal module, does not define a command
         if mod_name.startswith('_'):
             continue
-        module = importlib.import_module(f'{commands_name}.{mod_name}')
-        cmd_type = getattr(module, 'CMD_TYPE')
-        _cmd_map[cmd_type.cmd_name] = cmd_type
-        # If the command defines a state extension, we need to include it in
-        # the base classes for the state class later
+        cmd_type = _import_command(mod_name)
         cmd_ext = cmd_type.state_ext
-        if cmd_ext:
-            state_exts.append(cmd_ext)
-    # All modules have been imported and all signatures created, so we can now
-    # finalize the commands we've collected and create the state class
-    for cmd_type in _cmd_map.values():
-        cmd_type.finalize_command()
+        manifest_entries[cmd_type.cmd_name] = {
+            'module': mod_name,
+            'signature': cmd_type.compact(),
+            'state_ext': cmd_ext.__name__ if cmd_ext else None,
+        }
+    return manifest_entries
+
+def _load_manifest(manifest_path: Path) -> dict[str, dict]:
+    """Loads the manifest entries from the specified file. If the file does
+    not exist, is broken or was written in another format, the manifest is
+    built in memory instead."""
+    try:
+        with manifest_path.open('r', encoding='utf-8') as ins:
+            manifest_json = json.load(ins)
+        if manifest_json['format'] == _MANIFEST_FORMAT:
+            return manifest_json['commands']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass # Missing or broken, build it instead
+    log.debug(f'Command manifest at {log.color_file(manifest_path)} is '
+              f'missing or outdated, run scripts/gen_manifest.py to '
+              f'regenerate it')
+    return _build_manifest()
+
+def write_manifest(manifest_path: Path = _MANIFEST_PATH) -> None:
+    """Builds the command manifest and writes it to the specified file. Used
+    by scripts/gen_manifest.py at build time."""
+    with manifest_path.open('w', encoding='utf-8') as out:
+        json.dump({'format': _MANIFEST_FORMAT,
+                   'commands': _build_manifest()}, out, indent=2,
+                  sort_keys=True)
+        out.write('\n')
+
+def _init_state_class():
+    global _state_class
+    # Only the commands that define a state extension need to be imported
+    state_exts = [_import_command(cmd_entry['module']).state_ext
+                  for cmd_entry in _get_manifest().values()
+                  if cmd_entry['state_ext']]
     @dataclass(slots=True)
     class _StateClass(*state_exts):
         pass
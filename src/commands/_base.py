@@ -23,9 +23,8 @@
 from dataclasses import dataclass
 from typing import Any
 
-from ast_nodes import CommandNode
+from ast_nodes import AArgumentNode, CommandNode
 from exception import AbstractError
-from src_pos import SourcePos
 from validation import Signature
 
 @dataclass(slots=True)
@@ -37,23 +36,31 @@ class _ACommand:
     cmd_name: str
     signature: Signature
     cmd_args: dict[str, Any]
-    cmd_args_pos: dict[str, SourcePos]
+    cmd_arg_nodes: dict[str, AArgumentNode | None]
     cmd_varargs: list[Any]
-    cmd_varargs_pos: list[SourcePos]
-    __slots__ = ('cmd_args', 'cmd_args_pos', 'cmd_varargs', 'cmd_varargs_pos')
+    cmd_vararg_nodes: list[AArgumentNode]
+    __slots__ = ('cmd_args', 'cmd_arg_nodes', 'cmd_varargs',
+                 'cmd_vararg_nodes')
 
-    def __init__(self, node: CommandNode) -> None:
-        c_a, c_ap, c_v, c_vp = self.signature.validate_args(node)
+    def __init__(self, node: CommandNode, validated_args: tuple[
+            dict[str, Any], dict[str, AArgumentNode | None], list[Any],
+            list[AArgumentNode]] | None = None) -> None:
+        # If the arguments have already been validated, validated_args holds
+        # what Signature.validate_args would return for the node
+        if validated_args is None:
+            validated_args = self.signature.validate_args(node)
+        c_a, c_an, c_v, c_vn = validated_args
         self.cmd_args = c_a
-        self.cmd_args_pos = c_ap
+        self.cmd_arg_nodes = c_an
         self.cmd_varargs = c_v
-        self.cmd_varargs_pos = c_vp
+        self.cmd_vararg_nodes = c_vn
 
     @classmethod
     def finalize_command(cls) -> None:
         """Called once all command modules have been imported and all command
-        signatures have been created. Finalizes this command class."""
-        cls.signature.init_default_values()
+        signatures have been created. Finalizes this command class. Default
+        values are not parsed here, but only once they are first used."""
+        cls.signature.compile_binder()
 
     @classmethod
     def compact(cls) -> str:
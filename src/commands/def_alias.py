@@ -50,7 +50,7 @@ class DefAliasCmd(_ACommand):
         alias_key = self.cmd_args['key']
         seen_alias_keys = state.seen_alias_keys
         if alias_key in seen_alias_keys:
-            raise EvalError(self.cmd_args_pos['key'],
+            raise EvalError(self.cmd_arg_nodes['key'].src_pos,
                             f"Duplicate alias key '{alias_key}'")
         seen_alias_keys.add(alias_key)
         state.alias_dict[alias_key] = self.cmd_args['val']
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses a recursive-descent parser that builds a Zoia AST
+directly from tokens, skipping the ANTLR parse tree and ParseConverter
+entirely. It produces exactly the same AST (including all source positions)
+as the ANTLR path, but only for valid input - whenever it runs into anything
+unexpected, it gives up and returns None. The caller then runs the ANTLR path
+instead, which takes care of producing a proper syntax error.
+
+Any changes to the parser rules in grammar/zoia.g4 must be mirrored here. The
+direct parser tests compare it to the ANTLR path on every Zoia file in the
+repository."""
+from array import array
+
+from _vendor.antlr4 import Token
+
+from ast_nodes import AliasNode, CommandNode, HeaderNode, KwdArgumentNode, \
+    LineNode, StdArgumentNode, TextFragmentNode, ZoiaFileNode, \
+    LineElementsNode, AArgumentNode, Em1LineElementNode, Em2LineElementNode, \
+    Em3LineElementNode, ALineElementNode, NodeIndex, LeafPool
+from grammar import zoiaLexer
+from parsing import lex_zoia_tokens
+from src_pos import SourceTable, pack_pos
+
+# Local copies of the token types, these get looked up a lot
+_ALIAS = zoiaLexer.Alias
+_ASTERISK = zoiaLexer.Asterisk
+_BACKSLASH = zoiaLexer.Backslash
+_BAR = zoiaLexer.Bar
+_BRACKETS_CLOSE = zoiaLexer.BracketsClose
+_BRACKETS_OPEN = zoiaLexer.BracketsOpen
+_EOF = Token.EOF
+_EQUALS = zoiaLexer.Equals
+_HEADER = zoiaLexer.Header
+_NEWLINE = zoiaLexer.Newline
+_SEMICOLON = zoiaLexer.Semicolon
+_SPACES = zoiaLexer.Spaces
+_WORD = zoiaLexer.Word
+_WHITESPACE = {_NEWLINE, _SPACES}
+
+# Maps the number of asterisks that open an emphasis to the node class for it
+_EM_CLASSES = {
+    1: Em1LineElementNode,
+    2: Em2LineElementNode,
+    3: Em3LineElementNode,
+}
+
+class _NotDirectlyParseable(Exception):
+    """Raised when the direct parser runs into a syntax error. Never escapes
+    this module."""
+
+# Currently, PyCharm seems to have a problem with kw_only fields in
+# dataclasses. It reports all the src_table and src_packed arguments as
+# 'Unexpected argument' warnings. Until that's fixed:
+# noinspection PyArgumentList
+class _DirectParser:
+    """Parses a list of tokens as produced by lex_zoia_tokens. Each method
+    corresponds to a parser rule in the grammar and starts parsing at the
+    current token."""
+    __slots__ = ('_src_table', '_tokens', '_tok_index', '_last_packed',
+                 '_node_index', '_leaf_pool')
+
+    def __init__(self, src_table: SourceTable,
+                 zoia_tokens: list[tuple[int, str, int, int]],
+                 leaf_pool: LeafPool | None) -> None:
+        self._src_table = src_table
+        self._tokens = zoia_tokens
+        self._leaf_pool = leaf_pool
+        self._tok_index = 0
+        # The index of the last token _pack_pos was called for, along with
+        # its packed position
+        self._last_packed = (-1, 0)
+        # Records all commands and aliases as they are parsed, see zoia_file
+        self._node_index = NodeIndex()
+
+    def _pack_pos(self, tok_index: int) -> int:
+        """Creates a packed source position from the token at the specified
+        index, just like ParseConverter does for the first token of a
+        rule. Nested rules often start at the same token and are completed
+        one after another, so this reuses the last result to let their nodes
+        share one packed position."""
+        last_index, last_packed = self._last_packed
+        if tok_index == last_index:
+            return last_packed
+        _tok_type, _tok_text, tok_line, tok_column = self._tokens[tok_index]
+        packed = pack_pos(tok_line, tok_column)
+        self._last_packed = tok_index, packed
+        return packed
+
+    def _expect(self, tok_type: int) -> None:
+        """Skips over the current token, which must have the specified
+        type."""
+        if self._tokens[self._tok_index][0] != tok_type:
+            raise _NotDirectlyParseable()
+        self._tok_index += 1
+
+    def _skip_whitespace(self) -> None:
+        """Skips over any number of newlines and spaces."""
+        tokens = self._tokens
+        while tokens[self._tok_index][0] in _WHITESPACE:
+            self._tok_index += 1
+
+    # Sorted by the order in which they are defined in the grammar
+    def zoia_file(self) -> ZoiaFileNode:
+        """zoiaFile: header line* EOF;"""
+        header = self.header()
+        file_node = ZoiaFileNode(header, self.lines_only(),
+                                 src_table=self._src_table,
+                                 src_packed=self._pack_pos(0))
+        self._node_index.sort()
+        file_node.set_node_index(self._node_index)
+        return file_node
+
+    def lines_only(self) -> list[LineNode]:
+        """Not a rule in the grammar. Parses the line* EOF part of zoiaFile,
+        i.e. a sequence of complete lines without a header."""
+        lines = []
+        tokens = self._tokens
+        while tokens[self._tok_index][0] != _EOF:
+            lines.append(self.line())
+        return lines
+
+    def header(self) -> HeaderNode:
+        """header: Header arguments Newline;"""
+        start_index = self._tok_index
+        self._expect(_HEADER)
+        header_args = self.arguments()
+        self._expect(_NEWLINE)
+        return HeaderNode(header_args, src_table=self._src_table,
+                          src_packed=self._pack_pos(start_index))
+
+    def line(self) -> LineNode:
+        """line: lineElements? Newline;"""
+        start_index = self._tok_index
+        if self._tokens[start_index][0] == _NEWLINE:
+            self._tok_index += 1
+            return LineNode(None, src_table=self._src_table,
+                            src_packed=self._pack_pos(start_index))
+        line_elements = self.line_elements(allow_em=True, spaces_first=True)
+        self._expect(_NEWLINE)
+        return LineNode(line_elements, src_table=self._src_table,
+                        src_packed=self._pack_pos(start_index))
+
+    def line_elements(self, *, allow_em: bool,
+                      spaces_first: bool) -> LineElementsNode:
+        """Handles all three line elements rules:
+            lineElements: allow_em=True, spaces_first=True
+            lineElementsInner: allow_em=False, spaces_first=False
+            lineElementsArg: allow_em=True, spaces_first=False
+        Stops at the first token that can't continue the line elements, just
+        like ANTLR's greedy loops do."""
+        tokens = self._tokens
+        leaf_pool = self._leaf_pool
+        start_index = self._tok_index
+        elements: list[ALineElementNode] = []
+        # With a leaf pool, the text fragments are shared, so their positions
+        # have to be stored in the LineElementsNode
+        element_packed = None if leaf_pool is None else array('q')
+        while True:
+            tok_index = self._tok_index
+            tok_type, tok_text, _tok_line, _tok_column = tokens[tok_index]
+            if tok_type == _WORD or (tok_type == _SPACES and
+                                     (elements or spaces_first)):
+                self._tok_index += 1
+                if leaf_pool is None:
+                    new_element = TextFragmentNode(
+                        tok_text, src_table=self._src_table,
+                        src_packed=self._pack_pos(tok_index))
+                else:
+                    new_element = leaf_pool.text_fragment(tok_text)
+            elif tok_type == _ALIAS:
+                new_element = self.alias()
+            elif tok_type == _BACKSLASH:
+                new_element = self.command()
+            elif tok_type == _ASTERISK and allow_em:
+                new_element = self.em_line_element()
+            else:
+                break
+            elements.append(new_element)
+            if element_packed is not None:
+                element_packed.append(self._pack_pos(tok_index))
+        if not elements:
+            raise _NotDirectlyParseable()
+        return LineElementsNode(elements, src_table=self._src_table,
+                                src_packed=self._pack_pos(start_index),
+                                element_packed=element_packed)
+
+    def em_line_element(self) -> ALineElementNode:
+        """Handles all three emphasis rules:
+            em3LineElement: Asterisk Asterisk Asterisk lineElementsInner
+                            Asterisk Asterisk Asterisk;
+            em2LineElement: Asterisk Asterisk lineElementsInner Asterisk
+                            Asterisk;
+            em1LineElement: Asterisk lineElementsInner Asterisk;
+        lineElementsInner can't start with or contain an asterisk, so the
+        number of leading asterisks decides the rule."""
+        tokens = self._tokens
+        start_index = self._tok_index
+        while tokens[self._tok_index][0] == _ASTERISK:
+            self._tok_index += 1
+        num_asterisks = self._tok_index - start_index
+        try:
+            em_class = _EM_CLASSES[num_asterisks]
+        except KeyError:
+            raise _NotDirectlyParseable() from None
+        inner_elements = self.line_elements(allow_em=False,
+                                            spaces_first=False)
+        for _i in range(num_asterisks):
+            self._expect(_ASTERISK)
+        return em_class(inner_elements, src_table=self._src_table,
+                        src_packed=self._pack_pos(start_index))
+
+    def alias(self) -> AliasNode:
+        """alias: Alias Bar?;"""
+        start_index = self._tok_index
+        self._tok_index += 1
+        if self._tokens[self._tok_index][0] == _BAR:
+            self._tok_index += 1
+        # Strip off the leading @ symbol for the alias text
+        alias_key = self._tokens[start_index][1][1:]
+        if self._leaf_pool is not None:
+            alias_key = self._leaf_pool.intern_str(alias_key)
+        alias_node = AliasNode(alias_key, src_table=self._src_table,
+                               src_packed=self._pack_pos(start_index))
+        self._node_index.add_alias(alias_node)
+        return alias_node
+
+    def command(self) -> CommandNode:
+        """command: Backslash (Word | Backslash) arguments? Bar?;"""
+        tokens = self._tokens
+        start_index = self._tok_index
+        name_type, cmd_name, _name_line, _name_column = tokens[start_index + 1]
+        if name_type not in (_WORD, _BACKSLASH):
+            raise _NotDirectlyParseable()
+        self._tok_index += 2
+        if tokens[self._tok_index][0] == _BRACKETS_OPEN:
+            cmd_args = self.arguments()
+        else:
+            cmd_args = []
+        if tokens[self._tok_index][0] == _BAR:
+            self._tok_index += 1
+        if self._leaf_pool is not None:
+            cmd_name = self._leaf_pool.intern_str(cmd_name)
+        cmd_node = CommandNode(cmd_args, cmd_name,
+                               src_table=self._src_table,
+                               src_packed=self._pack_pos(start_index))
+        self._node_index.add_command(cmd_node)
+        return cmd_node
+
+    def arguments(self) -> list[AArgumentNode]:
+        """arguments: BracketsOpen whitespace? argument
+                      (Semicolon whitespace? argument)*? Semicolon?
+                      whitespace? BracketsClose;"""
+        tokens = self._tokens
+        self._expect(_BRACKETS_OPEN)
+        self._skip_whitespace()
+        cmd_args = [self.argument()]
+        while True:
+            tok_type = tokens[self._tok_index][0]
+            if tok_type == _SEMICOLON:
+                # Either another argument or the optional trailing semicolon
+                self._tok_index += 1
+                self._skip_whitespace()
+                if tokens[self._tok_index][0] == _BRACKETS_CLOSE:
+                    break
+                cmd_args.append(self.argument())
+            else:
+                self._skip_whitespace()
+                break
+        self._expect(_BRACKETS_CLOSE)
+        return cmd_args
+
+    def argument(self) -> AArgumentNode:
+        """argument: kwdArgument | stdArgument;
+        kwdArgument: Word Spaces? Equals Spaces? lineElementsArg;
+        stdArgument: lineElementsArg;
+        lineElementsArg can't contain an Equals, so seeing one after the
+        first word (and optional spaces) means this is a kwdArgument."""
+        tokens = self._tokens
+        start_index = self._tok_index
+        if tokens[start_index][0] == _WORD:
+            equals_index = start_index + 1
+            if tokens[equals_index][0] == _SPACES:
+                equals_index += 1
+            if tokens[equals_index][0] == _EQUALS:
+                self._tok_index = equals_index + 1
+                if tokens[self._tok_index][0] == _SPACES:
+                    self._tok_index += 1
+                arg_value = self.line_elements(allow_em=True,
+                                               spaces_first=False)
+                kwd_name = tokens[start_index][1]
+                if self._leaf_pool is not None:
+                    kwd_name = self._leaf_pool.intern_str(kwd_name)
+                # Reverse order due to dataclass inheritance
+                return KwdArgumentNode(arg_value, kwd_name,
+                                       src_table=self._src_table,
+                                       src_packed=self._pack_pos(start_index))
+        return StdArgumentNode(
+            self.line_elements(allow_em=True, spaces_first=False),
+            src_table=self._src_table,
+            src_packed=self._pack_pos(start_index))
+
+def _parse_directly(zoia_src: str, src_table: SourceTable, parse_rule,
+                    leaf_pool: LeafPool | None, first_line: int = 1):
+    """Shared code of parse_zoia_file, parse_zoia_arg and
+    parse_zoia_lines."""
+    zoia_tokens = lex_zoia_tokens(zoia_src, first_line)
+    if zoia_tokens is None:
+        return None
+    try:
+        return parse_rule(_DirectParser(src_table, zoia_tokens, leaf_pool))
+    except _NotDirectlyParseable:
+        return None
+
+def parse_zoia_file(zoia_src: str, src_name: str,
+                    leaf_pool: LeafPool | None = None) -> ZoiaFileNode | None:
+    """Parses the specified source code of a Zoia file directly into an AST.
+    Returns None if that is not possible due to a syntax error. src_name
+    specifies the name of the source to use in source positions. If a
+    leaf_pool is specified, the AST's leaves are shared via it (see
+    LeafPool)."""
+    return _parse_directly(zoia_src, SourceTable(src_name),
+                           _DirectParser.zoia_file, leaf_pool)
+
+def parse_zoia_arg(zoia_line: str, src_name: str,
+                   leaf_pool: LeafPool | None = None) \
+        -> LineElementsNode | None:
+    """Parses the specified source code of a Zoia command argument value
+    directly into an AST. Returns None if that is not possible due to a
+    syntax error. src_name specifies the name of the source to use in source
+    positions. See parse_zoia_file for leaf_pool.
+
+    Like ANTLR, this silently ignores any tokens after the argument value,
+    since the lineElementsArg rule does not end with EOF."""
+    return _parse_directly(zoia_line, SourceTable(src_name),
+                           lambda p: p.line_elements(allow_em=True,
+                                                     spaces_first=False),
+                           leaf_pool)
+
+def parse_zoia_lines(zoia_src: str, src_table: SourceTable, first_line: int,
+                     leaf_pool: LeafPool | None = None) \
+        -> list[LineNode] | None:
+    """Parses the specified part of a Zoia file's source code directly into
+    a list of LineNodes. The part has to start at the beginning of a line
+    (the specified one) and may only contain complete lines, each ending with
+    a newline. Returns None if that is not possible due to a syntax error.
+    src_table has to be the source table of the file the part belongs to, so
+    that the new LineNodes share it with the rest of the file's AST. See
+    parse_zoia_file for leaf_pool."""
+    return _parse_directly(zoia_src, src_table, _DirectParser.lines_only,
+                           leaf_pool, first_line)
@@ -56,6 +56,22 @@ class SrcPosError(Exception):
         self.src_pos = pos
         self.orig_msg = orig_msg
 
+    def __reduce__(self):
+        # Subclasses have a different __init__ signature than the args we pass
+        # to Exception, so the default pickling behavior can't recreate them.
+        # Needed to send these errors across process boundaries
+        return _rebuild_src_pos_error, (self.__class__, self.args,
+                                        self.src_pos, self.orig_msg)
+
+def _rebuild_src_pos_error(error_type: type, error_args: tuple,
+                           pos: SourcePos, orig_msg: str) -> SrcPosError:
+    """Recreates a pickled SrcPosError. See SrcPosError.__reduce__."""
+    ret_error = error_type.__new__(error_type)
+    Exception.__init__(ret_error, *error_args)
+    ret_error.src_pos = pos
+    ret_error.orig_msg = orig_msg
+    return ret_error
+
 class EvalError(SrcPosError):
     """An error that occurred during evaluation."""
     __slots__ = ()
@@ -20,6 +20,12 @@ from .zoiaLexer import zoiaLexer
 #: You may override this to False to force use of Python fallback implementation.
 USE_CPP_IMPLEMENTATION = True
 
+#: Defines whether the Python fallback implementation uses the hand-written
+#: ZoiaFastLexer instead of the generated zoiaLexer. Both produce the same
+#: tokens, but ZoiaFastLexer is much faster.
+#: You may override this to False to force use of the generated lexer.
+USE_FAST_LEXER = True
+
 
 class SA_ErrorListener:
     """
@@ -140,21 +146,18 @@ class _FallbackErrorTranslator(ErrorListener):
 def _py_parse(stream:InputStream, entry_rule_name:str, sa_err_listener:SA_ErrorListener=None) -> ParseTree:
     if sa_err_listener is not None:
         err_listener = _FallbackErrorTranslator(sa_err_listener, stream)
-
-    # Lex
-    lexer = zoiaLexer(stream)
-    if sa_err_listener is not None:
-        lexer.removeErrorListeners()
-        lexer.addErrorListener(err_listener)
-    token_stream = CommonTokenStream(lexer)
-
-    # Parse
-    parser = zoiaParser(token_stream)
-    if sa_err_listener is not None:
-        parser.removeErrorListeners()
-        parser.addErrorListener(err_listener)
-
-    entry_rule_func = getattr(parser, entry_rule_name, None)
-    if not isinstance(entry_rule_func, types.MethodType):
-        raise ValueError("Invalid entry_rule_name '%s'" % entry_rule_name)
-    return entry_rule_func()
\ No newline at end of file
+    else:
+        err_listener = None
+
+    # Lex and parse, using pooled recognizers. The parsing package imports
+    # from this package, so it can't be imported at module level
+    import parsing
+    lexer_type = parsing.ZoiaFastLexer if USE_FAST_LEXER else zoiaLexer
+    parser = parsing.acquire_parser(lexer_type, stream, err_listener)
+    try:
+        entry_rule_func = getattr(parser, entry_rule_name, None)
+        if not isinstance(entry_rule_func, types.MethodType):
+            raise ValueError("Invalid entry_rule_name '%s'" % entry_rule_name)
+        return entry_rule_func()
+    finally:
+        parsing.release_parser(lexer_type, parser, err_listener)
\ No newline at end of file
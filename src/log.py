@@ -184,6 +184,8 @@ class _Level(Enum):
 
 _num_warnings = 0
 _num_errors = 0
+# Maps cache names to a list containing the number of hits and misses
+_cache_stats: dict[str, list[int]] = {}
 
 # FIXME Use the severity argument
 # pylint: disable=unused-argument
@@ -232,9 +234,20 @@ def source_pos_error(e: SrcPosError, verb: str):
             f'$fWl${p.src_line}$fT$, column $fWl${p.src_char + 1}$fT$: '
             f'$fRl${e.orig_msg}$fT$')
 
+def cache_access(cache_name: str, /, *, hit: bool) -> None:
+    """Records a single lookup in the compiler cache with the specified name.
+    hit specifies whether the lookup was successful. The number of hits and
+    misses per cache is printed by log_stats, see also reset_stats."""
+    cache_counts = _cache_stats.setdefault(cache_name, [0, 0])
+    cache_counts[0 if hit else 1] += 1
+
 def log_stats() -> None:
     """Prints out error/warning statistics based on the internal error/warning
-    counters. See error and warning as well as reset_stats."""
+    counters, as well as hit/miss statistics for any compiler caches that were
+    used. See error, warning and cache_access as well as reset_stats."""
+    for cache_name, (cache_hits, cache_misses) in _cache_stats.items():
+        info(f'{cache_name}: $fWl${cache_hits}$fT$ hit(s), '
+             f'$fWl${cache_misses}$fT$ miss(es)')
     if _num_warnings == _num_errors == 0:
         info('$fGl$No warnings or errors occurred$R$')
     else:
@@ -242,8 +255,9 @@ def log_stats() -> None:
         error(f'{_num_errors} total error(s)', count_error=False)
 
 def reset_stats() -> None:
-    """Resets the error and warning counters. See log_stats as well as error
-    and warning."""
+    """Resets the error and warning counters as well as the cache statistics.
+    See log_stats as well as error, warning and cache_access."""
     global _num_errors, _num_warnings
     _num_errors = 0
     _num_warnings = 0
+    _cache_stats.clear()
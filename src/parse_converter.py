@@ -25,17 +25,19 @@ ANTLR parse tree."""
 #  - Avoid APIs dependent on getToken (e.g. Word()) - really expensive. Use
 #    children[x] directly instead
 #  - Avoid getText() outside errors - use symbol.text instead
+from array import array
+
 from ast_nodes import AliasNode, CommandNode, HeaderNode, KwdArgumentNode, \
     LineNode, StdArgumentNode, TextFragmentNode, ZoiaFileNode, \
     LineElementsNode, AArgumentNode, Em1LineElementNode, Em2LineElementNode, \
-    Em3LineElementNode
+    Em3LineElementNode, NodeIndex, LeafPool
 from exception import ParseConversionError
 from grammar import zoiaParser, zoiaVisitor
-from src_pos import SourcePos
+from src_pos import SourcePos, SourceTable, pack_pos
 
 # Currently, PyCharm seems to have a problem with kw_only fields in
-# dataclasses. It reports all the src_pos arguments as 'Unexpected argument'
-# warnings. Until that's fixed:
+# dataclasses. It reports all the src_table and src_packed arguments as
+# 'Unexpected argument' warnings. Until that's fixed:
 # noinspection PyArgumentList
 
 # Ignore the non-PEP8 names, inherited from the generated code
@@ -43,8 +45,14 @@ class ParseConverter(zoiaVisitor):
     """Converts an ANTLR parse tree into a Zoia AST."""
     __slots__ = ()
 
-    def __init__(self, parsed_file: str) -> None:
-        self.parsed_file = parsed_file
+    def __init__(self, parsed_file: str,
+                 leaf_pool: LeafPool | None = None) -> None:
+        self.src_table = SourceTable(parsed_file)
+        # If set, leaves are shared via this pool, see LeafPool
+        self.leaf_pool = leaf_pool
+        # Records all commands and aliases as they are converted, see
+        # finish_file_node
+        self.node_index = NodeIndex()
         # Avoids a bunch of 'if isinstance' checks in visitLineElements,
         # visitLineElementsInner and visitLineElementsArg
         shared_lookup = {
@@ -66,23 +74,45 @@ class ParseConverter(zoiaVisitor):
 
     def make_pos(self, ctx) -> SourcePos:
         """Creates a source position from the specified context object."""
+        return self.src_table.source_pos(self.pack_pos(ctx))
+
+    @staticmethod
+    def pack_pos(ctx) -> int:
+        """Creates a packed source position (see src_pos.pack_pos) from the
+        specified context object."""
         ctx_start = ctx.start
-        return SourcePos(src_file=self.parsed_file, src_line=ctx_start.line,
-                         src_char=ctx_start.column)
+        return pack_pos(ctx_start.line, ctx_start.column)
+
+    def _intern_name(self, name_val: str) -> str:
+        """Interns the specified name via the leaf pool, if there is one."""
+        if self.leaf_pool is None:
+            return name_val
+        return self.leaf_pool.intern_str(name_val)
 
     # Sorted by the order in which they are defined in the grammar
     def visitZoiaFile(self, ctx: zoiaParser.ZoiaFileContext) -> ZoiaFileNode:
         header = self.visitHeader(ctx.header())
         lines = [self.visitLine(l) for l in ctx.line()]
-        return ZoiaFileNode(header, lines, src_pos=self.make_pos(ctx))
+        return self.finish_file_node(ZoiaFileNode(
+            header, lines, src_table=self.src_table,
+            src_packed=self.pack_pos(ctx)))
+
+    def finish_file_node(self, file_node: ZoiaFileNode) -> ZoiaFileNode:
+        """Hands the index of all converted commands and aliases to the
+        specified ZoiaFileNode, which must be the one that was converted."""
+        self.node_index.sort()
+        file_node.set_node_index(self.node_index)
+        return file_node
 
     def visitHeader(self, ctx: zoiaParser.HeaderContext) -> HeaderNode:
         return HeaderNode(self.visitArguments(ctx.arguments()),
-                          src_pos=self.make_pos(ctx))
+                          src_table=self.src_table,
+                          src_packed=self.pack_pos(ctx))
 
     def visitLine(self, ctx: zoiaParser.LineContext) -> LineNode:
         return LineNode(self.visitLineElements(ctx.lineElements()),
-                        src_pos=self.make_pos(ctx))
+                        src_table=self.src_table,
+                        src_packed=self.pack_pos(ctx))
 
     def visitLineElements(self, ctx: zoiaParser.LineElementsContext) \
             -> LineElementsNode | None:
@@ -114,33 +144,45 @@ class ParseConverter(zoiaVisitor):
                                            f"Unknown or invalid line element "
                                            f"'{le_child.getText()}'") from e
             elements.append(visit_method(le_child))
-        return LineElementsNode(elements, src_pos=self.make_pos(ctx))
+        element_packed = None
+        if self.leaf_pool is not None:
+            # The text fragments are shared, so store their positions here
+            element_packed = array('q', map(self.pack_pos, ctx.children))
+        return LineElementsNode(elements, src_table=self.src_table,
+                                src_packed=self.pack_pos(ctx),
+                                element_packed=element_packed)
 
     def visitEm1LineElement(self, ctx: zoiaParser.Em1LineElementContext) \
             -> Em1LineElementNode:
         return Em1LineElementNode(
             self.visitLineElementsInner(ctx.lineElementsInner()),
-            src_pos=self.make_pos(ctx))
+            src_table=self.src_table,
+            src_packed=self.pack_pos(ctx))
 
     def visitEm2LineElement(self, ctx: zoiaParser.Em2LineElementContext) \
             -> Em2LineElementNode:
         return Em2LineElementNode(
             self.visitLineElementsInner(ctx.lineElementsInner()),
-            src_pos=self.make_pos(ctx))
+            src_table=self.src_table,
+            src_packed=self.pack_pos(ctx))
 
     def visitEm3LineElement(self, ctx: zoiaParser.Em3LineElementContext) \
             -> Em3LineElementNode:
         return Em3LineElementNode(
             self.visitLineElementsInner(ctx.lineElementsInner()),
-            src_pos=self.make_pos(ctx))
+            src_table=self.src_table,
+            src_packed=self.pack_pos(ctx))
 
     def visitTextFragment(self, ctx: zoiaParser.TextFragmentContext |
                                      zoiaParser.TextFragmentWordContext) \
             -> TextFragmentNode:
         try:
             # First child is either Word or Spaces - same behavior for both
-            return TextFragmentNode(ctx.children[0].symbol.text,
-                                    src_pos=self.make_pos(ctx))
+            text_val = ctx.children[0].symbol.text
+            if self.leaf_pool is not None:
+                return self.leaf_pool.text_fragment(text_val)
+            return TextFragmentNode(text_val, src_table=self.src_table,
+                                    src_packed=self.pack_pos(ctx))
         except (AttributeError, KeyError, IndexError, TypeError) as e:
             raise ParseConversionError(
                 self.make_pos(ctx), f"Unknown or invalid text fragment "
@@ -149,14 +191,20 @@ class ParseConverter(zoiaVisitor):
     def visitAlias(self, ctx: zoiaParser.AliasContext) -> AliasNode:
         # First child is Alias, the second one is Bar - strip off the leading
         # @ symbol for the alias text
-        return AliasNode(ctx.children[0].symbol.text[1:],
-                         src_pos=self.make_pos(ctx))
+        alias_key = self._intern_name(ctx.children[0].symbol.text[1:])
+        alias_node = AliasNode(alias_key, src_table=self.src_table,
+                               src_packed=self.pack_pos(ctx))
+        self.node_index.add_alias(alias_node)
+        return alias_node
 
     def visitCommand(self, ctx: zoiaParser.CommandContext) -> CommandNode:
         # First child is Backslash, the second one is Word
-        return CommandNode(self.visitArguments(ctx.arguments()),
-                           ctx.children[1].symbol.text,
-                           src_pos=self.make_pos(ctx))
+        cmd_node = CommandNode(self.visitArguments(ctx.arguments()),
+                               self._intern_name(ctx.children[1].symbol.text),
+                               src_table=self.src_table,
+                               src_packed=self.pack_pos(ctx))
+        self.node_index.add_command(cmd_node)
+        return cmd_node
 
     def visitArguments(self, ctx: zoiaParser.ArgumentsContext) \
             -> list[AArgumentNode]:
@@ -179,13 +227,15 @@ class ParseConverter(zoiaVisitor):
     def visitKwdArgument(self, ctx: zoiaParser.KwdArgumentContext) \
             -> KwdArgumentNode:
         # First child is Word
-        kwd_name = ctx.children[0].symbol.text
+        kwd_name = self._intern_name(ctx.children[0].symbol.text)
         arg_value = self.visitLineElementsArg(ctx.lineElementsArg())
         # Reverse order due to dataclass inheritance
-        return KwdArgumentNode(arg_value, kwd_name, src_pos=self.make_pos(ctx))
+        return KwdArgumentNode(arg_value, kwd_name, src_table=self.src_table,
+                               src_packed=self.pack_pos(ctx))
 
     def visitStdArgument(self, ctx: zoiaParser.StdArgumentContext) \
             -> StdArgumentNode:
         return StdArgumentNode(
             self.visitLineElementsArg(ctx.lineElementsArg()),
-            src_pos=self.make_pos(ctx))
+            src_table=self.src_table,
+            src_packed=self.pack_pos(ctx))
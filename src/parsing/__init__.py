@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This package contains the hand-written parts of the parse path that build
+on the classes ANTLR generates into the grammar package:
+
+ - fast_lexer.py: a faster replacement for the generated lexer.
+ - dfa_cache.py: persists the DFAs of the generated lexer and parser.
+ - recognizer_pool.py: lets the parse path reuse lexers and parsers.
+ - streaming_parse.py: parses files line by line with bounded memory.
+
+Unlike the grammar package, it is linted and counted for coverage like the
+rest of the code.
+
+All imports should come directly from here - *never* import from the actual
+files that define the classes. That way they can be moved around easily."""
+from parsing.dfa_cache import *
+from parsing.fast_lexer import *
+from parsing.recognizer_pool import *
+from parsing.streaming_parse import *
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements saving the DFAs that ANTLR builds up while lexing and parsing
+(and the parser's shared prediction context cache) to a file and loading them
+again in a later run. Without this, every process has to rediscover the same
+DFA states through ATN simulation, which is slow in Python.
+
+The DFAs reference the lexer's and parser's ATNs all over the place. Those
+references are stored as state numbers and resolved against the current ATNs
+when loading, so a cache file is tied to the exact grammar it was created
+with. It is versioned against the serialized ATNs to catch that."""
+import hashlib
+import io
+import os
+import pickle
+from pathlib import Path
+
+from _vendor.antlr4 import PredictionContextCache
+from _vendor.antlr4.PredictionContext import PredictionContext
+from _vendor.antlr4.atn.ATNConfigSet import ATNConfigSet
+from _vendor.antlr4.atn.ATNSimulator import ATNSimulator
+from _vendor.antlr4.atn.ATNState import ATNState
+from _vendor.antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from _vendor.antlr4.atn.LexerAction import LexerMoreAction, \
+    LexerPopModeAction, LexerSkipAction
+from _vendor.antlr4.atn.LexerActionExecutor import LexerActionExecutor
+from _vendor.antlr4.atn.SemanticContext import SemanticContext
+from _vendor.antlr4.dfa.DFA import DFA
+
+from grammar.zoiaLexer import serializedATN as _lexer_serialized_atn, \
+    zoiaLexer
+from grammar.zoiaParser import serializedATN as _parser_serialized_atn, \
+    zoiaParser
+from utils import CacheUnpickler
+
+__all__ = ['dfa_cache_version', 'dfa_state_count', 'load_dfa_cache',
+           'save_dfa_cache']
+
+# Objects that the runtime compares by identity, so they must not be copied
+_SINGLETONS = {
+    'ERROR': ATNSimulator.ERROR,
+    'LEXER_ERROR': LexerATNSimulator.ERROR,
+    'EMPTY': PredictionContext.EMPTY,
+    'NONE': SemanticContext.NONE,
+    'SKIP': LexerSkipAction.INSTANCE,
+    'MORE': LexerMoreAction.INSTANCE,
+    'POP_MODE': LexerPopModeAction.INSTANCE,
+}
+_SINGLETON_IDS = {id(v): k for k, v in _SINGLETONS.items()}
+_ATNS = {
+    'lexer': zoiaLexer.atn,
+    'parser': zoiaParser.atn,
+}
+
+def dfa_cache_version() -> str:
+    """Returns the version that cache files have to match to be loaded, based
+    on the serialized ATNs of the lexer and parser."""
+    version_hash = hashlib.sha256()
+    for serialized_atn in (_lexer_serialized_atn, _parser_serialized_atn):
+        version_hash.update(repr(serialized_atn()).encode('ascii'))
+    return version_hash.hexdigest()
+
+def dfa_state_count() -> int:
+    """Returns the total number of DFA states that the lexer and parser have
+    discovered so far. Useful for checking if saving them is worth it."""
+    return sum(len(d.states) for d in (*zoiaLexer.decisionsToDFA,
+                                       *zoiaParser.decisionsToDFA))
+
+# Reconstructors used by _DFAPickler - these must stay at module level so
+# that pickle can find them
+def _rebuild_dfa(atn_start_state, decision, dfa_states, start_state,
+                 precedence_dfa):
+    """Recreates a DFA. Its states are pickled as a list, since their hashes
+    can only be calculated once they are complete."""
+    new_dfa = DFA(atn_start_state, decision)
+    new_dfa.states.update((s, s) for s in dfa_states)
+    new_dfa.s0 = start_state
+    new_dfa.precedenceDfa = precedence_dfa
+    return new_dfa
+
+def _rebuild_config_set(set_attrs: dict):
+    """Recreates an ATNConfigSet, dropping its cached hash (see
+    _DFAPickler.reducer_override)."""
+    new_set = ATNConfigSet.__new__(ATNConfigSet)
+    for attr_name, attr_val in set_attrs.items():
+        setattr(new_set, attr_name, attr_val)
+    new_set.cachedHashCode = -1
+    return new_set
+
+class _DFAPickler(pickle.Pickler):
+    """Pickles DFAs without pickling the ATNs and runtime singletons that they
+    reference."""
+    def persistent_id(self, obj):
+        """Stores ATN states as references to their ATN and runtime
+        singletons by name."""
+        if isinstance(obj, ATNState):
+            return 'lexer' if obj.atn is zoiaLexer.atn else 'parser', \
+                obj.stateNumber
+        return _SINGLETON_IDS.get(id(obj))
+
+    def reducer_override(self, obj):
+        """Pickles the objects whose default pickling is either broken or
+        would carry over hashes that are only valid in this process."""
+        if isinstance(obj, DFA):
+            return _rebuild_dfa, (obj.atnStartState, obj.decision,
+                                  list(obj.states), obj.s0, obj.precedenceDfa)
+        if isinstance(obj, LexerActionExecutor):
+            # Its hash is based on strings, which are hashed differently by
+            # every Python process, so it has to be recalculated
+            return LexerActionExecutor, (obj.lexerActions,)
+        if isinstance(obj, ATNConfigSet):
+            # Same goes for config sets with a cached hash that includes the
+            # hash of a LexerActionExecutor
+            return _rebuild_config_set, ({a: getattr(obj, a)
+                                          for a in ATNConfigSet.__slots__},)
+        return NotImplemented
+
+class _DFAUnpickler(CacheUnpickler):
+    """Counterpart to _DFAPickler, resolves the stored references against the
+    current ATNs and runtime singletons. Only the ANTLR runtime's classes and
+    our reconstructors may be loaded (see utils.CacheUnpickler)."""
+    _allowed_packages = ('_vendor.antlr4',)
+    _allowed_globals = frozenset({(__name__, '_rebuild_config_set'),
+                                  (__name__, '_rebuild_dfa')})
+    __slots__ = ()
+
+    def persistent_load(self, pid):
+        """Resolves the references stored by _DFAPickler.persistent_id."""
+        if isinstance(pid, tuple):
+            atn_name, state_number = pid
+            return _ATNS[atn_name].states[state_number]
+        return _SINGLETONS[pid]
+
+def save_dfa_cache(cache_path: Path) -> None:
+    """Saves the current DFAs of the lexer and parser to the specified file.
+    The file is written atomically, so a concurrent load_dfa_cache never sees
+    a partial file. Raises OSError if the file can't be written."""
+    cache_buffer = io.BytesIO()
+    _DFAPickler(cache_buffer, protocol=pickle.HIGHEST_PROTOCOL).dump((
+        dfa_cache_version(), zoiaLexer.decisionsToDFA,
+        zoiaParser.decisionsToDFA, zoiaParser.sharedContextCache.cache))
+    tmp_path = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(cache_buffer.getvalue())
+        os.replace(tmp_path, cache_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+def load_dfa_cache(cache_path: Path) -> bool:
+    """Replaces the DFAs of the lexer and parser with the ones saved in the
+    specified file by save_dfa_cache. Meant to be called at startup, before
+    anything gets parsed. Returns False if the file does not exist, is broken
+    or was created for a different version of the grammar, in which case
+    nothing is changed."""
+    try:
+        with cache_path.open('rb') as ins:
+            cache_contents = _DFAUnpickler(ins).load()
+        cache_version, lexer_dfas, parser_dfas, context_cache = cache_contents
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+            ImportError, IndexError, KeyError, TypeError, ValueError):
+        return False
+    if (cache_version != dfa_cache_version() or
+            len(lexer_dfas) != len(zoiaLexer.decisionsToDFA) or
+            len(parser_dfas) != len(zoiaParser.decisionsToDFA)):
+        return False
+    # Replace the contents, existing simulators hold on to these objects
+    zoiaLexer.decisionsToDFA[:] = lexer_dfas
+    zoiaParser.decisionsToDFA[:] = parser_dfas
+    shared_cache: PredictionContextCache = zoiaParser.sharedContextCache
+    shared_cache.cache.clear()
+    shared_cache.cache.update(context_cache)
+    return True
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements a hand-written, regex-based replacement for the lexer that ANTLR
+generates from grammar/zoia.g4. It produces exactly the same tokens (types,
+text, indices, lines and columns) and the same recognition errors as
+zoiaLexer, but is considerably faster when running without the C++
+accelerator, since it does not have to simulate the lexer ATN in Python.
+
+Any changes to the lexer rules in grammar/zoia.g4 must be mirrored here. The
+lexer tests compare both lexers on every Zoia file in the repository."""
+import re
+import sys
+from typing import TextIO
+
+from _vendor.antlr4 import InputStream, Token
+from _vendor.antlr4.atn.Transition import NotSetTransition, SetTransition
+from _vendor.antlr4.error.Errors import LexerNoViableAltException
+
+from grammar.zoiaLexer import zoiaLexer
+
+__all__ = ['ZoiaFastLexer', 'lex_zoia_tokens']
+
+def _rule_char_class(rule_name: str) -> str:
+    """Returns a regex character class matching the same characters as the
+    (only) set in the specified lexer rule. We take these from the lexer's ATN
+    because Python's re module does not support \\p{...} and Python's Unicode
+    database may be a different version than the one ANTLR used."""
+    rule_index = zoiaLexer.ruleNames.index(rule_name)
+    to_check = [zoiaLexer.atn.ruleToStartState[rule_index]]
+    checked = set()
+    while to_check:
+        atn_state = to_check.pop()
+        if atn_state.stateNumber in checked:
+            continue
+        checked.add(atn_state.stateNumber)
+        for trans in atn_state.transitions:
+            if isinstance(trans, SetTransition): # Includes NotSetTransition
+                class_ranges = ''.join(
+                    f'\\U{r.start:08x}-\\U{r.stop - 1:08x}'
+                    for r in trans.label.intervals)
+                negation = '^' if isinstance(trans, NotSetTransition) else ''
+                return f'[{negation}{class_ranges}]'
+            if trans.target.ruleIndex == rule_index:
+                to_check.append(trans.target)
+    raise RuntimeError(f"Lexer rule '{rule_name}' does not contain a set")
+
+# Every token type gets one group, in order. The order matters where two
+# alternatives start with the same character - ANTLR picks the longest match,
+# so '\header' has to come before '\' and '\r\n' before '\r'. All other rules
+# start with distinct characters.
+_TOKEN_GROUPS = (
+    (zoiaLexer.COMMENT, '#[^\r\n]*'),
+    (zoiaLexer.Asterisk, r'\*'),
+    (zoiaLexer.Header, r'\\header'),
+    (zoiaLexer.Backslash, r'\\'),
+    (zoiaLexer.Bar, r'\|'),
+    (zoiaLexer.BracketsClose, r'\]'),
+    (zoiaLexer.BracketsOpen, r'\['),
+    (zoiaLexer.Equals, '='),
+    (zoiaLexer.Newline, '\r\n|\r|\n'),
+    (zoiaLexer.Semicolon, ';'),
+    (zoiaLexer.Spaces, f'{_rule_char_class("Spaces")}+'),
+    (zoiaLexer.Alias, f'@{_rule_char_class("Alias")}+'),
+    (zoiaLexer.Word, f'{_rule_char_class("Word")}+'),
+)
+_token_regex = re.compile('|'.join(
+    f'({group_regex})' for _ty, group_regex in _TOKEN_GROUPS))
+_match_token = _token_regex.match
+_find_tokens = _token_regex.finditer
+# Maps match.lastindex to the token type of the group that matched
+_GROUP_TYPES = (None, *(group_ty for group_ty, _regex in _TOKEN_GROUPS))
+
+def lex_zoia_tokens(src_text: str, first_line: int = 1) \
+        -> list[tuple[int, str, int, int]] | None:
+    """Lexes the specified source all at once, without creating any ANTLR
+    objects. Returns a list of (type, text, line, column) tuples, without the
+    skipped comments and ending with an EOF token - the same values that
+    zoiaLexer's tokens would have. Returns None if the source contains a token
+    recognition error. Use ZoiaFastLexer to report that error instead.
+
+    first_line can be used to lex a part of a larger source that starts at
+    the beginning of the specified line."""
+    lexed_tokens = []
+    add_token = lexed_tokens.append
+    tok_line = first_line
+    line_start = 0
+    src_pos = 0
+    for tok_match in _find_tokens(src_text):
+        tok_start = tok_match.start()
+        if tok_start != src_pos:
+            return None # finditer skipped over an unmatchable character
+        src_pos = tok_match.end()
+        tok_type = _GROUP_TYPES[tok_match.lastindex]
+        if tok_type == zoiaLexer.COMMENT:
+            continue
+        add_token((tok_type, tok_match.group(), tok_line,
+                   tok_start - line_start))
+        # ANTLR only starts a new line at '\n', see ZoiaFastLexer.nextToken
+        if tok_type == zoiaLexer.Newline and src_text[src_pos - 1] == '\n':
+            tok_line += 1
+            line_start = src_pos
+    if src_pos != len(src_text):
+        return None
+    add_token((Token.EOF, '<EOF>', tok_line, src_pos - line_start))
+    return lexed_tokens
+
+class ZoiaFastLexer(zoiaLexer):
+    """Drop-in replacement for zoiaLexer. Only nextToken is reimplemented, so
+    error listeners, token factories etc. work just like they do for the
+    generated lexer."""
+    __slots__ = ('_src_text', '_src_pos')
+
+    def __init__(self, input_stream: InputStream = None,
+                 output: TextIO = sys.stdout) -> None:
+        super().__init__(input_stream, output)
+        self._src_text: str = input_stream.strdata if input_stream else ''
+        self._src_pos = 0
+
+    def reset(self):
+        super().reset()
+        self._src_pos = 0
+
+    @zoiaLexer.inputStream.setter
+    def inputStream(self, input_stream: InputStream | None):
+        zoiaLexer.inputStream.fset(self, input_stream)
+        self._src_text = input_stream.strdata if input_stream else ''
+
+    def nextToken(self):
+        src_text = self._src_text
+        src_pos = self._src_pos
+        lexer_sim = self._interp
+        while True:
+            tok_line = lexer_sim.line
+            tok_column = lexer_sim.column
+            if src_pos >= len(src_text):
+                self._src_pos = src_pos
+                self._input.seek(src_pos)
+                self._hitEOF = True
+                self.emitEOF()
+                return self._token
+            tok_match = _match_token(src_text, src_pos)
+            if tok_match is None:
+                src_pos = self._report_error(src_pos, tok_line, tok_column)
+                continue
+            tok_end = tok_match.end()
+            tok_type = _GROUP_TYPES[tok_match.lastindex]
+            # Only newlines can contain a '\n', and only at their end
+            if tok_type == zoiaLexer.Newline and src_text[tok_end - 1] == '\n':
+                lexer_sim.line += 1
+                lexer_sim.column = 0
+            else:
+                lexer_sim.column += tok_end - src_pos
+            if tok_type == zoiaLexer.COMMENT:
+                src_pos = tok_end
+                continue # COMMENT is skipped
+            self._token = tok = self._factory.create(
+                self._tokenFactorySourcePair, tok_type, None,
+                Token.DEFAULT_CHANNEL, src_pos, tok_end - 1, tok_line,
+                tok_column)
+            self._src_pos = tok_end
+            return tok
+
+    def _advance_pos(self, start_pos: int, end_pos: int):
+        """Updates the line and column the same way ANTLR does when consuming
+        the characters between the two specified positions. Note that ANTLR
+        only starts a new line at '\n', not at '\r'."""
+        lexer_sim = self._interp
+        src_text = self._src_text
+        num_newlines = src_text.count('\n', start_pos, end_pos)
+        if num_newlines:
+            lexer_sim.line += num_newlines
+            lexer_sim.column = end_pos - src_text.rindex(
+                '\n', start_pos, end_pos) - 1
+        else:
+            lexer_sim.column += end_pos - start_pos
+
+    def _report_error(self, src_pos: int, tok_line: int,
+                      tok_column: int) -> int:
+        """Reports a token recognition error at the specified position to the
+        error listeners and recovers from it. Returns the position at which to
+        continue lexing."""
+        # The only character that can't start a token is an '@' without an
+        # alias name after it. ANTLR only notices that at the next character,
+        # so it includes that one in the error message too
+        fail_pos = src_pos + 1 if self._src_text[src_pos] == '@' else src_pos
+        fail_pos = min(fail_pos, len(self._src_text))
+        self._advance_pos(src_pos, fail_pos)
+        self._tokenStartCharIndex = src_pos
+        self._tokenStartLine = tok_line
+        self._tokenStartColumn = tok_column
+        self._input.seek(fail_pos)
+        error = LexerNoViableAltException(self, self._input, src_pos, None)
+        self.notifyListeners(error)
+        # Same recovery as ANTLR - skip the character we failed on
+        if fail_pos < len(self._src_text):
+            self._advance_pos(fail_pos, fail_pos + 1)
+            fail_pos += 1
+        return fail_pos
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements a thread-local pool of lexers, token streams and parsers for the
+Python fallback of sa_zoia.parse. Creating them from scratch for every call
+means setting up new ATN simulators (and a fresh prediction context cache for
+each lexer), which dominates the cost of parsing small inputs like command
+arguments. Instead, recognizers are reset and pointed at the new input.
+
+Each thread has its own free list per lexer class, so recognizers are never
+shared between threads. Nested parses (e.g. from an error listener) simply get
+a second set of recognizers."""
+import threading
+
+from _vendor.antlr4 import CommonTokenStream, InputStream, \
+    PredictionContextCache
+from _vendor.antlr4.error.ErrorListener import ConsoleErrorListener, \
+    ErrorListener
+
+from grammar.zoiaParser import zoiaParser
+
+__all__ = ['acquire_parser', 'release_parser']
+
+# The maximum number of idle parsers kept per thread and lexer class. More are
+# only needed for nested parses, which are rare
+_MAX_IDLE = 4
+# The prediction context cache shared by all pooled lexers. The generated
+# lexer creates a new one for every instance, which throws away any contexts
+# it has cached
+_LEXER_CONTEXT_CACHE = PredictionContextCache()
+_pool_state = threading.local()
+
+def _idle_parsers(lexer_type: type) -> list[zoiaParser]:
+    """Returns this thread's list of idle parsers for the specified lexer
+    class."""
+    try:
+        all_idle = _pool_state.idle_parsers
+    except AttributeError:
+        all_idle = _pool_state.idle_parsers = {}
+    try:
+        return all_idle[lexer_type]
+    except KeyError:
+        return all_idle.setdefault(lexer_type, [])
+
+def acquire_parser(lexer_type: type, stream: InputStream,
+                   error_listener: ErrorListener | None = None) -> zoiaParser:
+    """Returns a zoiaParser reading tokens from a lexer of the specified type,
+    which in turn reads the specified input stream. Reuses an idle parser
+    from this thread's pool if possible. If an error listener is specified,
+    it replaces the default listeners of both the lexer and the parser. Hand
+    the parser to release_parser once you are done with it."""
+    type_idle = _idle_parsers(lexer_type)
+    if type_idle:
+        parser = type_idle.pop()
+        token_stream = parser.getTokenStream()
+        lexer = token_stream.tokenSource
+        lexer.inputStream = stream
+        token_stream.setTokenSource(lexer)
+        parser.setTokenStream(token_stream)
+    else:
+        lexer = lexer_type(stream)
+        # The generated lexer offers no other way to swap out its cache
+        # pylint: disable=protected-access
+        lexer._interp.sharedContextCache = _LEXER_CONTEXT_CACHE
+        parser = zoiaParser(CommonTokenStream(lexer))
+    if error_listener is not None:
+        lexer.removeErrorListeners()
+        lexer.addErrorListener(error_listener)
+        parser.removeErrorListeners()
+        parser.addErrorListener(error_listener)
+    return parser
+
+def release_parser(lexer_type: type, parser: zoiaParser,
+                   error_listener: ErrorListener | None = None) -> None:
+    """Returns a parser obtained from acquire_parser to this thread's pool.
+    The lexer type and error listener must be the ones it was acquired with.
+    The parser must not be used afterwards, but parse trees created by it
+    remain valid."""
+    token_stream = parser.getTokenStream()
+    lexer = token_stream.tokenSource
+    # Drop the error listener (and whatever it references) and the lexed
+    # tokens. The input stream itself is only let go once the lexer is reused
+    if error_listener is not None:
+        for recognizer in (lexer, parser):
+            recognizer.removeErrorListeners()
+            recognizer.addErrorListener(ConsoleErrorListener.INSTANCE)
+    token_stream.setTokenSource(lexer)
+    type_idle = _idle_parsers(lexer_type)
+    if len(type_idle) < _MAX_IDLE:
+        type_idle.append(parser)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements a streaming mode for the Python fallback of sa_zoia.parse.
+Normally, CommonTokenStream buffers every token of the file and the parse
+tree keeps all of them alive until the whole file has been converted, so peak
+memory grows with the size of the file. In streaming mode, every line is
+handed to a callback as soon as the parser has completed it and then detached
+from the parse tree, while WindowedTokenStream discards all tokens behind it.
+Peak memory then only grows with the length of the longest line."""
+from typing import Callable
+
+from _vendor.antlr4 import InputStream, Token
+from _vendor.antlr4.BufferedTokenStream import TokenStream
+from _vendor.antlr4.error.Errors import IllegalStateException
+from _vendor.antlr4.tree.Tree import ParseTreeListener
+
+from grammar import sa_zoia
+from grammar.zoiaLexer import zoiaLexer
+from grammar.zoiaParser import zoiaParser
+from parsing.fast_lexer import ZoiaFastLexer
+
+__all__ = ['WindowedTokenStream', 'parse_zoia_file_streaming']
+
+class WindowedTokenStream(TokenStream):
+    """Token stream that only buffers the tokens the parser may still need.
+    Tokens are fetched from the token source on demand, just like in
+    CommonTokenStream, but discard_consumed drops all tokens before the
+    current one. Token indices stay absolute, so the parser and its error
+    strategy do not notice the difference as long as they never seek back
+    behind the window - which they don't, since they only ever rewind to the
+    start of a prediction. Tokens that are not on the default channel are
+    dropped right away, since the parser would skip them anyway."""
+    # The parser and its error strategy expect ANTLR's camelCase names
+    # pylint: disable=invalid-name
+    __slots__ = ('tokenSource', 'index', '_fetched_eof', '_window',
+                 '_window_start')
+
+    def __init__(self, token_source: zoiaLexer) -> None:
+        self.tokenSource = token_source
+        # The absolute index of the current token, i.e. of LT(1)
+        self.index = -1
+        self._fetched_eof = False
+        # The buffered tokens and the absolute index of the first one
+        self._window: list[Token] = []
+        self._window_start = 0
+
+    def _lazy_init(self) -> None:
+        """Fetches the first token if that hasn't happened yet."""
+        if self.index == -1:
+            self._sync(0)
+            self.index = 0
+
+    def _sync(self, i: int) -> bool:
+        """Makes sure the token at absolute index i has been fetched. Returns
+        False if EOF comes before that."""
+        window = self._window
+        num_missing = i - self._window_start - len(window) + 1
+        while num_missing > 0 and not self._fetched_eof:
+            tok = self.tokenSource.nextToken()
+            if tok.channel != Token.DEFAULT_CHANNEL:
+                continue
+            tok.tokenIndex = self._window_start + len(window)
+            window.append(tok)
+            self._fetched_eof = tok.type == Token.EOF
+            num_missing -= 1
+        return num_missing <= 0
+
+    def _window_token(self, i: int) -> Token:
+        """Returns the token at absolute index i, which must have been
+        fetched."""
+        if i < self._window_start:
+            raise IllegalStateException(
+                f'token {i} has already been discarded')
+        return self._window[i - self._window_start]
+
+    def discard_consumed(self) -> None:
+        """Drops all tokens before the current one. The last consumed token
+        is kept as well, since the parser uses it to finish the current
+        rule."""
+        num_discarded = self.index - 1 - self._window_start
+        if num_discarded > 0:
+            del self._window[:num_discarded]
+            self._window_start += num_discarded
+
+    def mark(self) -> int:
+        """Does nothing, see release."""
+        return 0
+
+    def release(self, marker: int) -> None:
+        """Does nothing, tokens are released by discard_consumed instead."""
+
+    def seek(self, index: int) -> None:
+        """Moves to the token at the specified absolute index, which must not
+        have been discarded."""
+        self._lazy_init()
+        if index < self._window_start:
+            raise IllegalStateException(
+                f'cannot seek to discarded token {index}')
+        self.index = index
+
+    def get(self, index: int) -> Token:
+        """Returns the token at the specified absolute index, which must have
+        been fetched and not discarded."""
+        self._lazy_init()
+        return self._window_token(index)
+
+    def consume(self) -> None:
+        """Moves to the next token."""
+        if self.LA(1) == Token.EOF:
+            raise IllegalStateException('cannot consume EOF')
+        if self._sync(self.index + 1):
+            self.index += 1
+
+    def LA(self, i: int) -> int:
+        """Returns the type of the token i tokens ahead (see LT)."""
+        return self.LT(i).type
+
+    def LB(self, k: int) -> Token | None:
+        """Returns the token k tokens behind the current one, or None if
+        there is no such token."""
+        if k == 0 or self.index - k < 0:
+            return None
+        return self._window_token(self.index - k)
+
+    def LT(self, k: int) -> Token | None:
+        """Returns the token k tokens ahead, where LT(1) is the current token.
+        Negative values of k look behind instead (see LB)."""
+        self._lazy_init()
+        if k == 0:
+            return None
+        if k < 0:
+            return self.LB(-k)
+        i = self.index + k - 1
+        if not self._sync(i):
+            return self._window[-1] # EOF must be the last token
+        return self._window_token(i)
+
+    def getText(self, start: int | Token = None, stop: int | Token = None):
+        """Returns the text of the buffered tokens from start to stop
+        (inclusive). Unlike BufferedTokenStream.getText, this never fetches
+        the rest of the file and skips tokens that have been discarded."""
+        self._lazy_init()
+        if isinstance(start, Token):
+            start = start.tokenIndex
+        if isinstance(stop, Token):
+            stop = stop.tokenIndex
+        window_start = self._window_start
+        window = self._window
+        start = window_start if start is None else max(start, window_start)
+        window_stop = window_start + len(window) - 1
+        stop = window_stop if stop is None else min(stop, window_stop)
+        return ''.join(t.text for t in window[start - window_start:
+                                              stop - window_start + 1]
+                       if t.type != Token.EOF)
+
+    def getSourceName(self) -> str:
+        """Returns the name of the source the tokens come from."""
+        return self.tokenSource.getSourceName()
+
+class _LineStreamer(ParseTreeListener):
+    """Parse listener that hands completed lines to a callback and detaches
+    them from the parse tree. Also discards the tokens of the header and of
+    all completed lines."""
+    __slots__ = ('_parser', '_token_stream', '_on_line')
+
+    def __init__(self, parser: zoiaParser, token_stream: WindowedTokenStream,
+                 on_line: Callable[[zoiaParser.LineContext], None]) -> None:
+        self._parser = parser
+        self._token_stream = token_stream
+        self._on_line = on_line
+
+    def exitEveryRule(self, ctx): # pylint: disable=invalid-name
+        # Once there has been a syntax error, the tree can't be converted
+        # anyway. Note that this may be running during unwinding after an
+        # error listener raised an exception
+        ctx_type = type(ctx)
+        if (ctx_type is not zoiaParser.LineContext and
+                ctx_type is not zoiaParser.HeaderContext or
+                self._parser.getNumberOfSyntaxErrors()):
+            return
+        if ctx_type is zoiaParser.LineContext:
+            self._on_line(ctx)
+            parent_children = ctx.parentCtx.children
+            if parent_children and parent_children[-1] is ctx:
+                del parent_children[-1]
+        self._token_stream.discard_consumed()
+
+def parse_zoia_file_streaming(
+        stream: InputStream,
+        on_line: Callable[[zoiaParser.LineContext], None],
+        sa_err_listener: sa_zoia.SA_ErrorListener = None,
+) -> zoiaParser.ZoiaFileContext:
+    """Parses the specified stream as a whole Zoia file, using the Python
+    fallback of sa_zoia.parse in streaming mode. Each line is handed to
+    on_line as soon as it has been parsed, in order. The returned context
+    does not contain any lines. Once a syntax error has been reported, lines
+    are no longer handed to on_line, since the tree is invalid anyway."""
+    lexer = (ZoiaFastLexer if sa_zoia.USE_FAST_LEXER else zoiaLexer)(stream)
+    token_stream = WindowedTokenStream(lexer)
+    parser = zoiaParser(token_stream)
+    if sa_err_listener is not None:
+        # Translate errors exactly like the regular Python fallback does
+        # pylint: disable=protected-access
+        err_listener = sa_zoia._FallbackErrorTranslator(sa_err_listener,
+                                                        stream)
+        for recognizer in (lexer, parser):
+            recognizer.removeErrorListeners()
+            recognizer.addErrorListener(err_listener)
+    parser.addParseListener(_LineStreamer(parser, token_stream, on_line))
+    return parser.zoiaFile()
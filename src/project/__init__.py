@@ -31,3 +31,4 @@ from project.project import *
 from project.series import *
 from project.work import *
 from project.zoia_file import *
+from project.zoia_loader import *
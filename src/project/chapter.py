@@ -28,6 +28,7 @@ from pathlib import Path
 import log
 from project.dir_base import _ADirBase
 from project.zoia_file import ZoiaFile
+from project.zoia_loader import ZoiaLoader
 from utils import ps_error
 
 # Valid chapter folder names consist of the word 'ch' followed by one or more
@@ -55,9 +56,16 @@ class Chapter(_ADirBase):
         # pylint: disable=super-with-arguments
         return super(Chapter, self).get_zoia_file(zoia_name)
 
+    @classmethod
+    def find_zoia_files(cls, chapter_folder: Path) -> list[Path]:
+        """Returns the paths of all Zoia files that parse_chapter will load
+        for the chapter folder at the specified path, in the order in which
+        it will load them."""
+        return cls._zoia_paths(list(chapter_folder.iterdir()))
+
     @classmethod
     def parse_chapter(cls, chapter_folder: Path, project_folder: Path, /, *,
-                      raise_errors: bool):
+                      raise_errors: bool, zoia_loader: ZoiaLoader):
         """Parses a chapter folder at the specified path."""
         chapter_rel = chapter_folder.relative_to(project_folder)
         log.info(log.arrow(3, f'Found chapter at '
@@ -67,7 +75,7 @@ class Chapter(_ADirBase):
             return None
         anc_files = cls._parse_zoia_files(
             cf_contents, project_folder, raise_errors=raise_errors,
-            arrow_level=4,
+            arrow_level=4, zoia_loader=zoia_loader,
             warning_msg=f'Failed to parse '
                         f'{log.color_dir(chapter_folder.name)} due to errors '
                         f'when parsing one or more Zoia files')
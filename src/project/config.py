@@ -30,7 +30,7 @@ from typing import Type, Any
 import tomli
 
 import log
-from exception import AbstractError
+from exception import AbstractError, ProjectStructureError
 from utils import ps_error, valid_src_path, valid_zoia_path
 
 # Internal API begins here
@@ -133,6 +133,34 @@ def _zoia_path_option(default: str, /):
         __slots__ = ()
     return _ZoiaPathOption
 
+@dataclass(slots=True)
+class _ABoolOption(_AOption):
+    """Base class for boolean options. Must be either true or false.
+
+    Do not use this directly. Instead, use the _bool_option API and pass a
+    default value."""
+    option_value: bool
+
+    @classmethod
+    def _do_parse_option(cls, option_value: Any, option_name: str,
+                         project_folder: Path, /, *, raise_errors: bool):
+        if not isinstance(option_value, bool):
+            return ps_error(f"Failed to parse option '{option_name}': "
+                            f"'{option_value}' is not a boolean (must be "
+                            f"true or false)", Path('zoia.toml'),
+                            raise_errors)
+        return cls(option_name, option_value)
+
+def _bool_option(default: bool, /):
+    """Internal method for defining a boolean option. Pass it a default value
+    to get an appropriate class for the annotation back."""
+    class _BoolOption(_ABoolOption):
+        """Internal class that holds an appropriate default value for a
+        boolean option."""
+        option_default: bool = default
+        __slots__ = ()
+    return _BoolOption
+
 @dataclass(slots=True)
 class _ASection:
     """Base class for defining sections. Derive from this class, make yourself
@@ -182,6 +210,13 @@ class SectionDict(_ASection):
     """Represents the 'dictionary' section."""
     src_path: _zoia_path_option('dictionary.zoia')
 
+@dataclass(slots=True)
+class SectionParsing(_ASection):
+    """Represents the 'parsing' section."""
+    parallel: _bool_option(False)
+    lazy: _bool_option(False)
+    direct_parser: _bool_option(False)
+
 @dataclass(slots=True)
 class ZoiaToml:
     """Provides an API for parsing and accessing the contents of the zoia.toml
@@ -189,6 +224,7 @@ class ZoiaToml:
     on this class, defined using annotations."""
     aliases: SectionAliases
     dictionary: SectionDict
+    parsing: SectionParsing
 
     @classmethod
     def parse_zoia_toml(cls, toml_path: Path, project_folder: Path, /, *,
@@ -238,3 +274,25 @@ class ZoiaToml:
             log.warning(f'Unknown section $fWl${unk_section}$R$ found in '
                         f'{log.color_file(toml_rel)}, may be a typo')
         return cls(**init_params)
+
+    @classmethod
+    def peek_option(cls, toml_path: Path, section_name: str, option_name: str,
+                    project_folder: Path, /) -> Any:
+        """Reads the value of a single option from the zoia.toml file at the
+        specified path, without logging anything. Meant for options that are
+        needed before the project has been parsed. If the file, section or
+        option is missing or invalid, the option's default value is returned
+        instead - the later call to parse_zoia_toml reports any problems."""
+        section_type = inspect.get_annotations(cls)[section_name]
+        option_type: Type[_AOption] = inspect.get_annotations(
+            section_type)[option_name]
+        try:
+            with toml_path.open('rb') as ins:
+                option_value = tomli.load(ins).get(section_name, {}).get(
+                    option_name)
+            return option_type.parse_option(
+                option_value, option_name, project_folder,
+                raise_errors=True).option_value
+        except (OSError, tomli.TOMLDecodeError, AttributeError,
+                ProjectStructureError):
+            return option_type.option_default
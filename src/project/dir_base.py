@@ -26,6 +26,7 @@ from pathlib import Path
 
 import log
 from project.zoia_file import ZoiaFile
+from project.zoia_loader import ZoiaLoader
 from utils import ps_error
 
 # https://learn.microsoft.com/en-us/windows/win32/fileio/naming-a-file
@@ -49,17 +50,25 @@ class _ADirBase:
         ZoiaFile does not exist in this folder."""
         return self._id_zoia[zoia_name]
 
+    @staticmethod
+    def _zoia_paths(dir_contents: list[Path]) -> list[Path]:
+        """Returns the paths of the Zoia files among the specified folder
+        contents."""
+        return [f for f in dir_contents if f.suffix == '.zoia']
+
     @staticmethod
     def _parse_zoia_files(dir_contents: list[Path], project_folder: Path, /, *,
                           raise_errors: bool, arrow_level: int,
+                          zoia_loader: ZoiaLoader,
                           warning_msg: str) -> list[ZoiaFile] | None:
         """Parses .zoia files from the specified folder contents. The remaining
         arguments are passed to parse_zoia_file, except for warning_msg, which
         is used for raising a warning if one or more files fails to parse."""
         ret_files = [ZoiaFile.parse_zoia_file(f, project_folder,
                                               raise_errors=raise_errors,
-                                              arrow_level=arrow_level)
-                     for f in dir_contents if f.suffix == '.zoia']
+                                              arrow_level=arrow_level,
+                                              zoia_loader=zoia_loader)
+                     for f in _ADirBase._zoia_paths(dir_contents)]
         if not all(ret_files):
             # This is just a cascading effect of a real error
             log.warning(warning_msg)
@@ -21,22 +21,38 @@
 # =============================================================================
 """Implements the main Project class that oversees all operations on a project
 written in Zoia."""
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 import log
 from project.config import ZoiaToml
 from project.series import Series
 from project.zoia_file import ZoiaFile
-from utils import ps_error, valid_zoia_path
+from project.zoia_loader import ZoiaLoader
+from utils import AClosable, ps_error, valid_zoia_path
 
 @dataclass(slots=True)
-class Project:
+class Project(AClosable):
     """The Project class oversees all operations on a project written in
-    Zoia. To obtain a Project instance, use the parse_project classmethod."""
+    Zoia. To obtain a Project instance, use the parse_project classmethod.
+    Use the project as a context manager (or call close) once you are done
+    with it, so that whatever lazily loaded files added to the caches gets
+    saved (see ZoiaLoader)."""
     project_path: Path
     series: Series
     config: ZoiaToml
+    # The loader that was used to parse this project, lazily parsed files
+    # still load their ASTs through it
+    _zoia_loader: ZoiaLoader | None = field(default=None, repr=False,
+                                            compare=False)
+
+    def close(self) -> None:
+        """Closes the loader that was used to parse this project (see
+        ZoiaLoader.close). The project can still be used afterwards, but
+        caches will not be saved anymore."""
+        if self._zoia_loader is not None:
+            self._zoia_loader.close()
+            self._zoia_loader = None
 
     def find_zoia_file(self, file_path: Path) -> ZoiaFile | None:
         """Finds a ZoiaFile by its path. The path may be relative to the src
@@ -144,8 +160,19 @@ class Project:
 
     @classmethod
     def parse_project(cls, project_folder: Path, /, *,
-                      raise_errors: bool = False):
-        """Parses a project at the specified path."""
+                      raise_errors: bool = False, use_cache: bool = False,
+                      parallel: bool | None = None, lazy: bool | None = None,
+                      direct_parser: bool | None = None):
+        """Parses a project at the specified path. If use_cache is True, the
+        ASTs of the project's Zoia files are cached on disk (see ZoiaLoader).
+        If parallel is True, Zoia files are parsed in a pool of worker
+        processes. If lazy is True, the project structure is still checked
+        right away, but Zoia files are only parsed once their AST is first
+        accessed (see ZoiaFile.file_ast), which also means that parallel has
+        no effect. If direct_parser is True, the hand-written direct parser
+        is tried before ANTLR (see zoia_processor.process_zoia_file). If
+        parallel, lazy or direct_parser is None, the option of the same name
+        from the 'parsing' section of the config is used instead."""
         # Resolve the path first so all later operations can use full paths and
         # ensure it exists while we're at it
         try:
@@ -161,14 +188,34 @@ class Project:
             return None
         series_rel = 'src'
         series_folder = (project_folder / series_rel).resolve(strict=True)
-        parsed_series = Series.parse_series(series_folder, project_folder,
-                                     raise_errors=raise_errors)
+        zoia_toml_rel = 'zoia.toml'
+        if parallel is None:
+            # The config gets parsed after the series, so peek ahead here
+            parallel = ZoiaToml.peek_option(
+                project_folder / zoia_toml_rel, 'parsing', 'parallel',
+                project_folder)
+        if lazy is None:
+            lazy = ZoiaToml.peek_option(project_folder / zoia_toml_rel,
+                                        'parsing', 'lazy', project_folder)
+        if direct_parser is None:
+            direct_parser = ZoiaToml.peek_option(
+                project_folder / zoia_toml_rel, 'parsing', 'direct_parser',
+                project_folder)
+        # A lazy loader is closed here as well, but the project closes it
+        # again once it is done, which saves what lazy loads added to the
+        # caches in the meantime
+        with ZoiaLoader(project_folder, use_cache=use_cache, lazy=lazy,
+                        use_direct_parser=direct_parser) as zoia_loader:
+            if parallel:
+                zoia_loader.prefetch(Series.find_zoia_files(series_folder))
+            parsed_series = Series.parse_series(series_folder, project_folder,
+                                                raise_errors=raise_errors,
+                                                zoia_loader=zoia_loader)
         if parsed_series is None:
             log.warning(f'Failed to parse project due to errors when parsing '
                         f'{log.color_dir(series_rel)}')
             return None
         # Parse the config file 'zoia.toml', if it exists
-        zoia_toml_rel = 'zoia.toml'
         parsed_config = ZoiaToml.parse_zoia_toml(
             project_folder / zoia_toml_rel, project_folder,
             raise_errors=raise_errors)
@@ -176,4 +223,5 @@ class Project:
             log.warning(f'Failed to parse project due to errors when parsing '
                         f'{log.color_file(zoia_toml_rel)}')
             return None
-        return cls(project_folder, parsed_series, parsed_config)
+        return cls(project_folder, parsed_series, parsed_config,
+                   zoia_loader if lazy else None)
@@ -27,6 +27,7 @@ from pathlib import Path
 import log
 from project.dir_base import _ADirBase
 from project.work import Work, match_work
+from project.zoia_loader import ZoiaLoader
 from utils import is_contiguous, ps_error
 
 @dataclass(slots=True)
@@ -52,9 +53,26 @@ class Series(_ADirBase):
             return None # Invalid work name syntax
         return self._id_works[int(work_ma.group(1))]
 
+    @staticmethod
+    def _work_folders(sf_contents: list[Path]) -> list[Path]:
+        """Returns the paths of the work folders among the specified series
+        folder contents."""
+        return [w for w in sf_contents if match_work(w.name)]
+
+    @classmethod
+    def find_zoia_files(cls, series_folder: Path) -> list[Path]:
+        """Returns the paths of all Zoia files that parse_series will load for
+        the series folder at the specified path, in the order in which it will
+        load them."""
+        sf_contents = list(series_folder.iterdir())
+        zoia_paths = cls._zoia_paths(sf_contents)
+        for w in cls._work_folders(sf_contents):
+            zoia_paths.extend(Work.find_zoia_files(w))
+        return zoia_paths
+
     @classmethod
     def parse_series(cls, series_folder: Path, project_folder: Path, /, *,
-                     raise_errors: bool):
+                     raise_errors: bool, zoia_loader: ZoiaLoader):
         """Parses a series ('src' folder) at the specified path."""
         series_rel = series_folder.relative_to(project_folder)
         log.info(log.arrow(1, f'Found series at {log.color_dir(series_rel)}'))
@@ -63,14 +81,15 @@ class Series(_ADirBase):
             return None
         anc_files = cls._parse_zoia_files(
             sf_contents, project_folder, raise_errors=raise_errors,
-            arrow_level=2,
+            arrow_level=2, zoia_loader=zoia_loader,
             warning_msg=f'Failed to parse '
                         f'{log.color_dir(series_folder.name)} due to errors '
                         f'when parsing one or more Zoia files')
         if anc_files is None:
             return None # Warning already logged in parse_zoia_files
-        works = [Work.parse_work(w, project_folder, raise_errors=raise_errors)
-                 for w in sf_contents if match_work(w.name)]
+        works = [Work.parse_work(w, project_folder, raise_errors=raise_errors,
+                                 zoia_loader=zoia_loader)
+                 for w in cls._work_folders(sf_contents)]
         if not all(works):
             # This is just a cascading effect of a real error
             log.warning(f'Failed to parse {log.color_dir(series_folder.name)} '
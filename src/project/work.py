@@ -29,6 +29,7 @@ from pathlib import Path
 import log
 from project.chapter import Chapter, match_chapter
 from project.dir_base import _ADirBase
+from project.zoia_loader import ZoiaLoader
 from utils import is_contiguous, ps_error
 
 # Valid work folder names consist of the word 'work' followed by one or more
@@ -65,9 +66,26 @@ class Work(_ADirBase):
             return None # Invalid chapter name syntax
         return self._id_chapters[int(chapter_ma.group(1))]
 
+    @staticmethod
+    def _chapter_folders(wf_contents: list[Path]) -> list[Path]:
+        """Returns the paths of the chapter folders among the specified work
+        folder contents."""
+        return [c for c in wf_contents if match_chapter(c.name)]
+
+    @classmethod
+    def find_zoia_files(cls, work_folder: Path) -> list[Path]:
+        """Returns the paths of all Zoia files that parse_work will load for
+        the work folder at the specified path, in the order in which it will
+        load them."""
+        wf_contents = list(work_folder.iterdir())
+        zoia_paths = cls._zoia_paths(wf_contents)
+        for c in cls._chapter_folders(wf_contents):
+            zoia_paths.extend(Chapter.find_zoia_files(c))
+        return zoia_paths
+
     @classmethod
     def parse_work(cls, work_folder: Path, project_folder: Path, /, *,
-                   raise_errors: bool):
+                   raise_errors: bool, zoia_loader: ZoiaLoader):
         """Parses a work folder at the specified path."""
         work_rel = work_folder.relative_to(project_folder)
         log.info(log.arrow(2, f'Found work at {log.color_dir(work_rel)}'))
@@ -76,14 +94,15 @@ class Work(_ADirBase):
             return None
         anc_files = cls._parse_zoia_files(
             wf_contents, project_folder, raise_errors=raise_errors,
-            arrow_level=3,
+            arrow_level=3, zoia_loader=zoia_loader,
             warning_msg=f'Failed to parse {log.color_dir(work_folder.name)} '
                         f'due to errors when parsing one or more Zoia files')
         if anc_files is None:
             return None # Warning already logged in parse_zoia_files
         chapters = [Chapter.parse_chapter(c, project_folder,
-                                          raise_errors=raise_errors)
-                    for c in work_folder.iterdir() if match_chapter(c.name)]
+                                          raise_errors=raise_errors,
+                                          zoia_loader=zoia_loader)
+                    for c in cls._chapter_folders(wf_contents)]
         if not all(chapters):
             # This is just a cascading effect of a real error
             log.warning(f'Failed to parse {log.color_dir(work_folder.name)} '
@@ -23,20 +23,54 @@
 from dataclasses import dataclass, field
 from functools import total_ordering
 from pathlib import Path
+from threading import Lock
+from typing import Callable
 
 import log
 from ast_nodes import ZoiaFileNode
 from exception import ParseConversionError, ParsingError, ValidationError, \
     InternalError
-from zoia_processor import process_zoia_file
+from project.zoia_loader import ZoiaLoader
 
 @dataclass(slots=True)
 @total_ordering
 class ZoiaFile:
     """A Zoia file is a file with the .zoia extension, following the layout
-    specified by the Zoia grammar."""
+    specified by the Zoia grammar. If its loader is lazy (see ZoiaLoader), its
+    AST is only loaded when file_ast is first accessed."""
     file_path: Path
-    file_ast: ZoiaFileNode = field(repr=False)
+    _file_ast: ZoiaFileNode | None = field(repr=False)
+    # Loads the AST on first access if it has not been loaded yet
+    _zoia_loader: ZoiaLoader | None = field(default=None, repr=False,
+                                            compare=False)
+    _ast_lock: Lock = field(default_factory=Lock, init=False, repr=False,
+                            compare=False)
+
+    @property
+    def file_ast(self) -> ZoiaFileNode:
+        """The AST of this file. If it has not been loaded yet, it is loaded
+        right now, which raises the same errors as ZoiaLoader.load_zoia_file
+        if the file is broken. Safe to access from multiple threads."""
+        if (file_ast := self._file_ast) is None:
+            with self._ast_lock:
+                # Another thread may have loaded it while we were waiting
+                if (file_ast := self._file_ast) is None:
+                    file_ast = self._load_ast(self._zoia_loader,
+                                              self.file_path)
+                    self._file_ast = file_ast
+                    self._zoia_loader = None
+        return file_ast
+
+    def load_file_ast(self, *, raise_errors: bool) -> ZoiaFileNode | None:
+        """Returns the AST of this file, like file_ast. If loading it fails
+        because the file is broken, the error is only raised if raise_errors
+        is True. Otherwise, it is logged and None is returned. Use this
+        instead of file_ast when the AST may not have been loaded yet."""
+        return self._report_errors(lambda: self.file_ast, raise_errors)
+
+    def is_ast_loaded(self) -> bool:
+        """Checks if the AST of this file has already been loaded."""
+        return self._file_ast is not None
 
     def is_main_file(self) -> bool:
         """Checks if this is a main.zoia file."""
@@ -49,25 +83,50 @@ class ZoiaFile:
 
     @classmethod
     def parse_zoia_file(cls, file_path: Path, project_folder: Path, /, *,
-                        raise_errors: bool, arrow_level: int):
-        """Parses a Zoia file at the specified path."""
+                        raise_errors: bool, arrow_level: int,
+                        zoia_loader: ZoiaLoader):
+        """Parses a Zoia file at the specified path, using the specified
+        loader to obtain its AST. If the loader is lazy, the AST is not loaded
+        until it is first needed, see file_ast."""
         file_rel = file_path.relative_to(project_folder)
+        if zoia_loader.lazy:
+            log.info(log.arrow(arrow_level, f'Found Zoia file at '
+                                            f'{log.color_file(file_rel)}'))
+            return cls(file_path, None, zoia_loader)
         log.info(log.arrow(arrow_level, f'Parsing Zoia file at '
                                         f'{log.color_file(file_rel)}'))
+        processed_file = cls._report_errors(
+            lambda: cls._load_ast(zoia_loader, file_path), raise_errors)
+        if processed_file is None:
+            return None
+        return cls(file_path, processed_file)
+
+    @staticmethod
+    def _report_errors(load_ast: Callable[[], ZoiaFileNode],
+                       raise_errors: bool) -> ZoiaFileNode | None:
+        """Calls the specified function to load an AST. Parsing and
+        validation errors are raised if raise_errors is True, otherwise they
+        are logged and None is returned."""
         try:
-            processed_file = process_zoia_file(file_path, project_folder)
+            return load_ast()
         except ParsingError as e:
             if raise_errors:
                 raise
             log.source_pos_error(e, 'parse')
             return None
-        except ParseConversionError as e:
-            # Reraise as an internal error, this should not happen and probably
-            # points to an ANTLR API having changed
-            raise InternalError(str(e)) from e
         except ValidationError as e:
             if raise_errors:
                 raise
             log.source_pos_error(e, 'validate')
             return None
-        return cls(file_path, processed_file)
+
+    @staticmethod
+    def _load_ast(zoia_loader: ZoiaLoader, file_path: Path) -> ZoiaFileNode:
+        """Loads the AST of the Zoia file at the specified path via the
+        specified loader."""
+        try:
+            return zoia_loader.load_zoia_file(file_path)
+        except ParseConversionError as e:
+            # Reraise as an internal error, this should not happen and probably
+            # points to an ANTLR API having changed
+            raise InternalError(str(e)) from e
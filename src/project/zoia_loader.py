@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""Implements the loader that turns the .zoia files of a project into ASTs,
+optionally backed by a persistent on-disk cache and a process pool."""
+import hashlib
+import os
+import pickle
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import log
+from ast_nodes import ZoiaFileNode
+from parsing import dfa_state_count, load_dfa_cache, save_dfa_cache
+from utils import AClosable, CacheUnpickler, compiler_stamp
+from validation import load_default_cache, parsed_default_count, \
+    save_default_cache
+from zoia_processor import process_zoia_file
+
+# The name of the folder (inside the project folder) that holds all compiler
+# caches
+CACHE_FOLDER_NAME = '.zoia_cache'
+# The name used for the AST cache in log output
+_AST_CACHE_NAME = 'AST cache'
+# The name of the folder (inside the cache folder) that holds the AST cache
+_AST_CACHE_FOLDER = 'ast'
+# The name of the file (inside the cache folder) that holds the ANTLR DFAs
+_DFA_CACHE_FILE = 'antlr_dfa.pickle'
+# The name of the file (inside the cache folder) that holds the parsed default
+# values of command signatures
+_DEFAULT_CACHE_FILE = 'signature_defaults.pickle'
+
+@dataclass(slots=True)
+class _ProcessCaches:
+    """The caches that stay in memory for the rest of the process once they
+    have been loaded, i.e. the ANTLR DFAs and the parsed signature default
+    values. Both are saved again if they have grown since then."""
+    dfa_cache_path: Path
+    default_cache_path: Path
+    dfa_states_loaded: int = 0
+    defaults_loaded: int = 0
+
+    def load(self) -> None:
+        """Loads both caches into this process. Also used to initialize the
+        worker processes of ZoiaLoader.prefetch."""
+        load_dfa_cache(self.dfa_cache_path)
+        load_default_cache(self.default_cache_path)
+        self.dfa_states_loaded = dfa_state_count()
+        self.defaults_loaded = parsed_default_count()
+
+    def save(self) -> None:
+        """Saves the caches that have grown since they were loaded or last
+        saved."""
+        if dfa_state_count() > self.dfa_states_loaded:
+            try:
+                save_dfa_cache(self.dfa_cache_path)
+            except OSError as e:
+                log.debug(f'Failed to write ANTLR DFA cache: {e}')
+            self.dfa_states_loaded = dfa_state_count()
+        if parsed_default_count() > self.defaults_loaded:
+            try:
+                save_default_cache(self.default_cache_path)
+            except OSError as e:
+                log.debug(f'Failed to write signature default cache: {e}')
+            self.defaults_loaded = parsed_default_count()
+
+class ZoiaLoader(AClosable):
+    """Loads the ASTs of a project's Zoia files. If the cache is enabled,
+    validated ASTs are pickled into the .zoia_cache/ast folder inside the
+    project folder, keyed by the file's contents, its project-relative path
+    and the compiler stamp (see utils.compiler_stamp). Unchanged files can then
+    skip lexing, parsing, conversion and validation entirely.
+
+    Files can also be handed to prefetch, which starts processing them in a
+    pool of worker processes. load_zoia_file then simply waits for the
+    matching result, so callers still walk the project in their usual order
+    and see the same logging and errors as they would when parsing serially.
+    Use the loader as a context manager to make sure the pool gets shut
+    down.
+
+    A lazy loader makes ZoiaFile.parse_zoia_file skip loading the AST, so
+    that files are only loaded once something actually needs their AST (see
+    ZoiaFile.file_ast). Lazy loaders ignore prefetch, since that would load
+    every file anyway. They can still be used after they have been closed,
+    and closing them again saves whatever the files loaded since then added
+    to the caches (see Project.close).
+
+    If the cache is enabled, the DFAs that ANTLR builds while parsing are also
+    saved to .zoia_cache/antlr_dfa.pickle when the loader is closed and
+    loaded again by the next loader, so that ANTLR does not have to warm up
+    from scratch in every run (see parsing.dfa_cache). The same goes for the
+    default values of command signatures, which are saved to
+    .zoia_cache/signature_defaults.pickle (see validation.default).
+
+    Since the cache lives inside the project folder, a project can come with
+    cache files that were not written by this compiler. They are only ever
+    read through utils.CacheUnpickler, which refuses to load anything but the
+    compiler's own classes.
+
+    Zoia files are parsed by ANTLR unless use_direct_parser is True, in which
+    case the hand-written direct parser is tried first (see
+    zoia_processor.process_zoia_file)."""
+    __slots__ = ('_project_folder', '_ast_cache_folder', '_executor',
+                 '_pending', '_process_caches', '_use_direct_parser', 'lazy')
+
+    def __init__(self, project_folder: Path, /, *, use_cache: bool = False,
+                 lazy: bool = False, use_direct_parser: bool = False) -> None:
+        self._project_folder = project_folder
+        self.lazy = lazy
+        self._use_direct_parser = use_direct_parser
+        self._ast_cache_folder = (
+            project_folder / CACHE_FOLDER_NAME / _AST_CACHE_FOLDER
+            if use_cache else None)
+        self._executor: ProcessPoolExecutor | None = None
+        # Maps paths of prefetched files to their cache key (if the cache is
+        # enabled) and the future that will produce their AST
+        self._pending: dict[Path, tuple[str | None, Future]] = {}
+        self._process_caches = None
+        if use_cache:
+            cache_folder = project_folder / CACHE_FOLDER_NAME
+            self._process_caches = _ProcessCaches(
+                cache_folder / _DFA_CACHE_FILE,
+                cache_folder / _DEFAULT_CACHE_FILE)
+            self._process_caches.load()
+
+    def close(self) -> None:
+        """Shuts down the worker processes started by prefetch (if any) and
+        discards all prefetched ASTs that were never loaded. Also saves the
+        ANTLR DFAs and signature default values if the cache is enabled and
+        they have grown. May be called more than once."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        self._pending.clear()
+        if self._process_caches is not None:
+            self._process_caches.save()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        """Creates the pool of worker processes used by prefetch. Workers
+        load the ANTLR DFA and signature default caches as well, if they are
+        enabled."""
+        if self._process_caches is None:
+            return ProcessPoolExecutor()
+        return ProcessPoolExecutor(initializer=_ProcessCaches.load,
+                                   initargs=(self._process_caches,))
+
+    @staticmethod
+    def _cache_key(project_folder: Path, zoia_path: Path,
+                   zoia_bytes: bytes) -> str:
+        """Calculates the cache key for the Zoia file at the specified path
+        with the specified contents, inside the specified project folder. The
+        relative path is included since it ends up in the source positions
+        stored in the AST."""
+        key_hash = hashlib.sha256(compiler_stamp().encode('ascii'))
+        key_hash.update(zoia_path.relative_to(
+            project_folder).as_posix().encode('utf-8'))
+        key_hash.update(b'\0')
+        key_hash.update(zoia_bytes)
+        return key_hash.hexdigest()
+
+    def _cache_entry(self, cache_key: str) -> Path:
+        """Returns the path to the cache entry for the specified key."""
+        return self._ast_cache_folder / f'{cache_key}.pickle'
+
+    def _load_cached(self, cache_key: str) -> ZoiaFileNode | None:
+        """Loads the AST stored under the specified key from the cache.
+        Returns None if there is no such AST or it could not be loaded."""
+        entry_path = self._cache_entry(cache_key)
+        try:
+            with entry_path.open('rb') as ins:
+                return CacheUnpickler(ins).load()
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError, IndexError, TypeError) as e:
+            # Broken or written by an incompatible version, get rid of it
+            log.debug(f'Discarding broken AST cache entry '
+                      f'{log.color_file(entry_path.name)}: {e}')
+            entry_path.unlink(missing_ok=True)
+            return None
+
+    def _store_cached(self, cache_key: str, zoia_ast: ZoiaFileNode) -> None:
+        """Stores the specified AST under the specified key in the cache. The
+        entry is written to a temporary file first and then moved into place,
+        so that concurrent or interrupted builds never see partial entries."""
+        entry_path = self._cache_entry(cache_key)
+        tmp_path = entry_path.with_name(f'{entry_path.name}.{os.getpid()}.tmp')
+        try:
+            self._ast_cache_folder.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open('wb') as out:
+                pickle.dump(zoia_ast, out, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            # The cache is purely an optimization, so don't fail the build
+            log.debug(f'Failed to write AST cache entry '
+                      f'{log.color_file(entry_path.name)}: {e}')
+            tmp_path.unlink(missing_ok=True)
+
+    def prefetch(self, zoia_paths: list[Path]) -> None:
+        """Starts processing the Zoia files at the specified paths in worker
+        processes. Files that are already in the cache are skipped, since
+        loading them is cheaper than sending their ASTs between processes.
+        Does nothing if this loader is lazy."""
+        if self.lazy:
+            return
+        for zoia_path in zoia_paths:
+            if zoia_path in self._pending:
+                continue
+            cache_key = None
+            if self._ast_cache_folder is not None:
+                cache_key = self._cache_key(self._project_folder, zoia_path,
+                                            zoia_path.read_bytes())
+                if self._cache_entry(cache_key).is_file():
+                    continue
+            if self._executor is None:
+                self._executor = self._new_executor()
+            self._pending[zoia_path] = cache_key, self._executor.submit(
+                process_zoia_file, zoia_path, self._project_folder,
+                use_direct_parser=self._use_direct_parser)
+
+    def load_zoia_file(self, zoia_path: Path) -> ZoiaFileNode:
+        """Returns the validated AST for the Zoia file at the specified path,
+        taking it from the cache or from a prefetch if possible. Raises the
+        same errors as zoia_processor.process_zoia_file."""
+        try:
+            cache_key, ast_future = self._pending.pop(zoia_path)
+        except KeyError:
+            pass # Not prefetched, process it right here
+        else:
+            if cache_key is not None:
+                log.cache_access(_AST_CACHE_NAME, hit=False)
+            # Reraises any error that occurred in the worker process
+            zoia_ast = ast_future.result()
+            if cache_key is not None:
+                self._store_cached(cache_key, zoia_ast)
+            return zoia_ast
+        if self._ast_cache_folder is None:
+            return self._process_zoia_file(zoia_path)
+        cache_key = self._cache_key(self._project_folder, zoia_path,
+                                    zoia_path.read_bytes())
+        zoia_ast = self._load_cached(cache_key)
+        log.cache_access(_AST_CACHE_NAME, hit=zoia_ast is not None)
+        if zoia_ast is None:
+            zoia_ast = self._process_zoia_file(zoia_path)
+            self._store_cached(cache_key, zoia_ast)
+        return zoia_ast
+
+    def _process_zoia_file(self, zoia_path: Path) -> ZoiaFileNode:
+        """Processes the Zoia file at the specified path right here."""
+        return process_zoia_file(zoia_path, self._project_folder,
+                                 use_direct_parser=self._use_direct_parser)
+
+    @classmethod
+    def prune_cache(cls, project_folder: Path, /) -> int:
+        """Removes all entries from the AST cache of the project at the
+        specified path that do not belong to the current version of a Zoia
+        file in the project's src folder (e.g. because the file was changed or
+        deleted or because the compiler was updated). Returns the number of
+        removed entries. Only touches the AST cache, so no loader (which
+        would load the other caches) is needed for this."""
+        ast_cache_folder = (project_folder / CACHE_FOLDER_NAME /
+                            _AST_CACHE_FOLDER)
+        if not ast_cache_folder.is_dir():
+            return 0
+        live_keys = {cls._cache_key(project_folder, z, z.read_bytes())
+                     for z in (project_folder / 'src').rglob('*.zoia')
+                     if z.is_file()}
+        num_pruned = 0
+        for entry_path in ast_cache_folder.iterdir():
+            # Also catches leftover temporary files from interrupted builds
+            if (entry_path.suffix != '.pickle' or
+                    entry_path.stem not in live_keys):
+                entry_path.unlink(missing_ok=True)
+                num_pruned += 1
+        return num_pruned
@@ -19,9 +19,15 @@
 #   along with this program.  If not, see <https://www.gnu.org/licenses/>.
 #
 # =============================================================================
-"""This module houses SourcePos, a class for storing source code positions."""
+"""This module houses SourcePos, a class for storing source code positions,
+and the compact representation of them that AST nodes use."""
 from dataclasses import dataclass
 
+# The number of low bits of a packed position that hold the character offset.
+# The line number is stored in all the bits above them
+_CHAR_BITS = 24
+_CHAR_MASK = (1 << _CHAR_BITS) - 1
+
 @dataclass(slots=True)
 class SourcePos:
     """Stores a position in source code somewhere, consisting of the source
@@ -33,3 +39,36 @@ class SourcePos:
     def __repr__(self) -> str:
         return (f"File '{self.src_file}', on line "
                 f"{self.src_line} at offset {self.src_char + 1}")
+
+# The packed position of nodes that are shared between multiple places in an
+# AST (see ast_nodes.LeafPool). Their real positions are stored by their
+# parents instead
+SHARED_PACKED = -1
+
+def pack_pos(src_line: int, src_char: int) -> int:
+    """Packs the specified line number and character offset into a single
+    integer. Use SourceTable.source_pos to turn it back into a SourcePos.
+    Adding pack_pos(n, 0) to a packed position moves it down by n lines (or up,
+    if n is negative). The character offset must fit into the low _CHAR_BITS
+    bits, otherwise it would spill over into the line number."""
+    assert 0 <= src_char <= _CHAR_MASK, (
+        f'Character offset {src_char} does not fit into a packed position')
+    return src_line << _CHAR_BITS | src_char
+
+def packed_line(packed_pos: int) -> int:
+    """Returns the line number stored in the specified packed position."""
+    return packed_pos >> _CHAR_BITS
+
+@dataclass(slots=True)
+class SourceTable:
+    """Holds the information that all positions in one source file share. AST
+    nodes only store a reference to the table of their file plus a packed
+    position (see pack_pos), so that a full SourcePos only has to be created
+    when a node's position is actually needed, e.g. to report an error."""
+    src_file: str
+
+    def source_pos(self, packed_pos: int) -> SourcePos:
+        """Creates a SourcePos for the specified packed position in this
+        table's source file."""
+        return SourcePos(self.src_file, packed_pos >> _CHAR_BITS,
+                         packed_pos & _CHAR_MASK)
@@ -20,6 +20,8 @@
 #
 # =============================================================================
 """This module houses code shared by multiple test files."""
+import os
+from collections.abc import Iterator
 from pathlib import Path
 
 import pytest
@@ -59,6 +61,38 @@ class ATestParser:
         return process_zoia_string(test_src, f"<{self.__class__.__name__}>",
                                    skip_validation=skip_validation)
 
+def get_repo_zoia_paths() -> list[Path]:
+    """Returns the paths to all Zoia files in the repository (test fixtures,
+    examples, etc.), sorted."""
+    repo_root = Path(__file__).resolve().parents[2]
+    return sorted(repo_root.glob('*/**/*.zoia'))
+
+def parse_repo_zoia_file(zoia_path: Path) -> ZoiaFileNode:
+    """Parses the Zoia file at the specified path (see get_repo_zoia_paths)
+    without validating it, since not all of them are valid."""
+    return process_zoia_string(zoia_path.read_bytes().decode('utf-8'),
+                               zoia_path.name, skip_validation=True)
+
+def iter_repo_zoia_asts() -> Iterator[tuple[Path, ZoiaFileNode]]:
+    """Yields the path to and the AST of every Zoia file in the repository,
+    see parse_repo_zoia_file."""
+    zoia_paths = get_repo_zoia_paths()
+    assert zoia_paths
+    for zoia_path in zoia_paths:
+        yield zoia_path, parse_repo_zoia_file(zoia_path)
+
+class PlantedPickle:
+    """Stands in for a malicious pickle planted in a cache file. Unpickling it
+    creates a folder at the specified path, so tests can check that it never
+    ran."""
+    __slots__ = ('_marker_path',)
+
+    def __init__(self, marker_path: Path):
+        self._marker_path = marker_path
+
+    def __reduce__(self):
+        return os.mkdir, (str(self._marker_path),)
+
 def _get_proj_path(test_name: str, py_file_path: str) -> Path:
     """Retrieves the full path to the project folder for the test with the
     specified folder name."""
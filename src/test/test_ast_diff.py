@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests for structurally diffing Zoia ASTs."""
+from test.base import mks
+
+from ast_diff import LineChange, diff_lines, diff_zoia_files
+from zoia_processor import process_zoia_string, reparse_zoia_edit
+
+_TEST_SRC = mks('foo bar', '\\cmd[a;', '  b = \\c[d]]', '', '*x* @y',
+                '\\z[q]|w')
+
+def _parse(zoia_src: str):
+    """Parses the specified source, skipping validation."""
+    return process_zoia_string(zoia_src, '<test>', skip_validation=True)
+
+class _ATestDiff:
+    """Base class for tests that diff two versions of a file and check the
+    changed lines and commands."""
+    _old_src = _TEST_SRC
+    _new_src: str
+    _exp_header_changed = False
+    # (old_start, old_end, new_start, new_end) for every changed range
+    _exp_line_changes: list[tuple[int, int, int, int]]
+    # Canonical representations of the added and removed commands
+    _exp_added: list[str] = []
+    _exp_removed: list[str] = []
+
+    def test_diff(self) -> None:
+        """Diffs the two versions and checks the result."""
+        ast_diff = diff_zoia_files(_parse(self._old_src),
+                                   _parse(self._new_src))
+        assert ast_diff.header_changed == self._exp_header_changed
+        assert ast_diff.line_changes == [LineChange(*c) for c in
+                                         self._exp_line_changes]
+        assert [c.canonical() for c in ast_diff.added_commands] == \
+               self._exp_added
+        assert [c.canonical() for c in ast_diff.removed_commands] == \
+               self._exp_removed
+        assert bool(ast_diff) == bool(self._exp_header_changed or
+                                      self._exp_line_changes)
+
+class TestDiffUnchanged(_ATestDiff):
+    """Formatting and comments are not part of the AST, so this is not a
+    change."""
+    _new_src = _TEST_SRC.replace('foo bar', 'foo bar# comment').replace(
+        '\\z[q]|w', '\\z[q;]w')
+    _exp_line_changes = []
+
+class TestDiffText(_ATestDiff):
+    """Changing text only changes that line, without any commands."""
+    _new_src = _TEST_SRC.replace('foo bar', 'foo baz')
+    _exp_line_changes = [(1, 2, 1, 2)]
+
+class TestDiffInsert(_ATestDiff):
+    """Inserted lines move all following lines down, which must not count
+    as a change."""
+    _new_src = _TEST_SRC.replace('foo bar\n', '\\new\n\nfoo bar\n')
+    _exp_line_changes = [(1, 1, 1, 3)]
+    _exp_added = ['\\new|']
+
+class TestDiffDelete(_ATestDiff):
+    """Deleted lines move all following lines up."""
+    _new_src = _TEST_SRC.replace('\\cmd[a;\n  b = \\c[d]]\n', '')
+    _exp_line_changes = [(2, 3, 2, 2)]
+    _exp_removed = ['\\cmd[\n    a;\n    b = \\c[d];\n]', '\\c[d]']
+
+class TestDiffNested(_ATestDiff):
+    """Changing a nested command changes all commands around it as well."""
+    _new_src = _TEST_SRC.replace('\\c[d]', '\\c[e]')
+    _exp_line_changes = [(2, 3, 2, 3)]
+    _exp_added = ['\\cmd[\n    a;\n    b = \\c[e];\n]', '\\c[e]']
+    _exp_removed = ['\\cmd[\n    a;\n    b = \\c[d];\n]', '\\c[d]']
+
+class TestDiffSeparate(_ATestDiff):
+    """Two edits far apart are reported separately, with the unchanged lines
+    between them left out. Moving a command within its line still counts as
+    a change of the line, but not of the command."""
+    _new_src = _TEST_SRC.replace('foo bar', 'foo').replace('\\z[q]|w',
+                                                           'w\\z[q]')
+    _exp_line_changes = [(1, 2, 1, 2), (5, 6, 5, 6)]
+
+class TestDiffHeader(_ATestDiff):
+    """Changes to the header are reported, including commands in it."""
+    _new_src = _TEST_SRC.replace('\\header[fragment]',
+                                 '\\header[fragment \\h]')
+    _exp_header_changed = True
+    _exp_line_changes = []
+    _exp_added = ['\\h|']
+
+class TestDiffReparse:
+    """Diffing against an AST that was updated by reparse_zoia_edit has to
+    work on a copy of its old lines, since it is updated in place."""
+    def test_diff_reparse(self) -> None:
+        """Applies an edit that adds a line and changes a command."""
+        zoia_ast = _parse(_TEST_SRC)
+        old_lines = list(zoia_ast.lines)
+        edit_start = _TEST_SRC.index('\\z[q]')
+        reparse_zoia_edit(zoia_ast, _TEST_SRC, edit_start, edit_start + 5,
+                          '\n\\z[r]', skip_validation=True)
+        ast_diff = diff_lines(old_lines, zoia_ast.lines)
+        assert ast_diff.line_changes == [LineChange(5, 6, 5, 7)]
+        assert [c.canonical() for c in ast_diff.added_commands] == \
+               ['\\z[r]']
+        assert [c.canonical() for c in ast_diff.removed_commands] == \
+               ['\\z[q]']
+        # Everything before the edit is still the same objects
+        assert all(o is n for o, n in zip(old_lines[:5], zoia_ast.lines))
@@ -20,7 +20,8 @@
 #
 # =============================================================================
 """This module houses tests related to ast_mapper."""
-from test.base import mks
+from test.base import ATestParser, iter_repo_zoia_asts, mks, \
+    parse_repo_zoia_file
 from test.test_canonical import ATestCanonicalRepr, TestHeaderCR, \
     TestCommentCR, TestTextFragmentCR, TestAliasCR, TestAliasBarCR, \
     TestCommandNoArgCR, TestCommandWithArgCR, TestKeywordArgsCR, \
@@ -28,9 +29,16 @@ from test.test_canonical import ATestCanonicalRepr, TestHeaderCR, \
     TestUnicodeCR, TestEm1CR, TestEm2CR, TestEm3CR, TestEm1ComplexCR, \
     TestEm2ComplexCR, TestEm3ComplexCR, TestMarkupCombinedCR, \
     TestCommandNestedMACR
+from test.test_ast_visitor import make_nested_commands
 
+import pytest
+
+from ast_diff import LineChange, diff_zoia_files
 from ast_mapper import AASTMapper
-from ast_nodes import AliasNode, TextFragmentNode
+from ast_nodes import AliasNode, CommandNode, LeafPool, TextFragmentNode
+from ast_visitor import WALK_POST_ORDER, WALK_PRE_ORDER, WALK_RECURSIVE
+from build_shared import AliasesEvaluator
+from zoia_processor import process_zoia_string
 
 class _TestMapper(AASTMapper):
     """Test mapper implementation that simply replaces AliasNodes with
@@ -38,13 +46,30 @@ class _TestMapper(AASTMapper):
     def visit_alias(self, node: AliasNode):
         # See parse_converter.py for the reasoning
         # noinspection PyArgumentList
-        return TextFragmentNode(node.alias_key, src_pos=node.src_pos)
+        return TextFragmentNode(node.alias_key, src_table=node.src_table,
+                                src_packed=node.src_packed)
+
+class _PreOrderTestMapper(_TestMapper):
+    """Version of _TestMapper that walks the AST iteratively, parents
+    first."""
+    walk_order = WALK_PRE_ORDER
+
+class _PostOrderTestMapper(_TestMapper):
+    """Version of _TestMapper that walks the AST iteratively, children
+    first."""
+    walk_order = WALK_POST_ORDER
+
+class _CopyOnWriteTestMapper(_TestMapper):
+    """Version of _TestMapper that leaves the mapped AST untouched."""
+    copy_on_write = True
 
 class _ATestASTMapper(ATestCanonicalRepr):
     """Base class for AASTMapper tests."""
+    _mapper_type: type[_TestMapper] = _TestMapper
+
     def _get_canonical(self, test_src: str) -> str:
         tree = self._parse_src(test_src)
-        mapper = _TestMapper()
+        mapper = self._mapper_type()
         tree_tf = mapper.visit(tree)
         return tree_tf.canonical()
 
@@ -115,6 +140,197 @@ class TestMapEm3ComplexCR(_ATestASTMapper, TestEm3ComplexCR):
     """@aliases -> aliases"""
     _test_rep = mks('***Em3 with aliases and \\commands|***')
 
+class TestPreOrderMapAliasBarCR(TestMapAliasBarCR):
+    """Version of TestMapAliasBarCR that walks the AST iteratively, parents
+    first."""
+    _mapper_type = _PreOrderTestMapper
+
+class TestPostOrderMapAliasBarCR(TestMapAliasBarCR):
+    """Version of TestMapAliasBarCR that walks the AST iteratively, children
+    first."""
+    _mapper_type = _PostOrderTestMapper
+
+class TestPreOrderMapCommandNestedMACR(TestMapCommandNestedMACR):
+    """Version of TestMapCommandNestedMACR that walks the AST iteratively,
+    parents first."""
+    _mapper_type = _PreOrderTestMapper
+
+class TestPostOrderMapCommandNestedMACR(TestMapCommandNestedMACR):
+    """Version of TestMapCommandNestedMACR that walks the AST iteratively,
+    children first."""
+    _mapper_type = _PostOrderTestMapper
+
+class TestCopyOnWriteMapAliasBarCR(TestMapAliasBarCR):
+    """Version of TestMapAliasBarCR that copies changed nodes."""
+    _mapper_type = _CopyOnWriteTestMapper
+
+class TestCopyOnWriteMapCommandNestedMACR(TestMapCommandNestedMACR):
+    """Version of TestMapCommandNestedMACR that copies changed nodes."""
+    _mapper_type = _CopyOnWriteTestMapper
+
+class TestCopyOnWriteMapEm3ComplexCR(TestMapEm3ComplexCR):
+    """Version of TestMapEm3ComplexCR that copies changed nodes."""
+    _mapper_type = _CopyOnWriteTestMapper
+
+class _FooFlattener(AASTMapper):
+    r"""Test mapper implementation that replaces \foo commands with
+    TextFragmentNodes holding their name."""
+    def visit_command(self, node: CommandNode):
+        if node.cmd_name != 'foo':
+            return super().visit_command(node)
+        # noinspection PyArgumentList
+        return TextFragmentNode(node.cmd_name, src_table=node.src_table,
+                                src_packed=node.src_packed)
+
+class TestMapNodeIndex(ATestParser):
+    """Mapping a file in place discards its node index, so that it matches
+    the mapped AST."""
+    def test_map_node_index(self) -> None:
+        """Flattens a command with every walk order."""
+        for walk_order in (WALK_RECURSIVE, WALK_PRE_ORDER, WALK_POST_ORDER):
+            test_ast = self._parse_src(mks('\\foo[a] and \\bar[b]'))
+            assert [c.cmd_name for c in
+                    test_ast.node_index.all_commands()] == ['foo', 'bar']
+            flattener = _FooFlattener()
+            flattener.walk_order = walk_order
+            mapped_ast = flattener.visit(test_ast)
+            assert [c.cmd_name for c in
+                    mapped_ast.node_index.all_commands()] == ['bar']
+
+class TestMapSubtreeHash(ATestParser):
+    """Mapping nodes in place discards their cached subtree hashes, so that
+    diffing sees the changes."""
+    def test_map_subtree_hash(self) -> None:
+        """Flattens a command with every walk order, then diffs."""
+        test_src = mks('\\foo[a] and \\bar[b]', 'Unchanged')
+        for walk_order in (WALK_RECURSIVE, WALK_PRE_ORDER, WALK_POST_ORDER):
+            test_ast = self._parse_src(test_src)
+            # Fill in the cached hashes first
+            assert not diff_zoia_files(test_ast, self._parse_src(test_src))
+            flattener = _FooFlattener()
+            flattener.walk_order = walk_order
+            mapped_ast = flattener.visit(test_ast)
+            ast_diff = diff_zoia_files(self._parse_src(test_src), mapped_ast)
+            assert ast_diff.line_changes == [LineChange(1, 2, 1, 2)]
+            assert [c.canonical() for c in ast_diff.removed_commands] == \
+                   ['\\foo[a]']
+
+class TestCopyOnWriteSharing(ATestParser):
+    """Copy-on-write mappers leave the original AST untouched and share all
+    unchanged nodes with it."""
+    def test_copy_on_write_sharing(self) -> None:
+        """Maps a file with a single alias in its second line."""
+        test_ast = self._parse_src(mks('Plain line\nAn @alias here\n'
+                                      '\\c[with arg]'))
+        orig_repr = test_ast.canonical()
+        orig_lines = list(test_ast.lines)
+        orig_elements = test_ast.lines[2].elements
+        mapped_ast = _CopyOnWriteTestMapper().visit(test_ast)
+        assert test_ast.canonical() == orig_repr
+        assert test_ast.lines == orig_lines
+        assert test_ast.lines[2].elements is orig_elements
+        assert mapped_ast is not test_ast
+        assert mapped_ast.header is test_ast.header
+        assert mapped_ast.lines[1] is test_ast.lines[1]
+        assert mapped_ast.lines[2] is not test_ast.lines[2]
+        assert mapped_ast.lines[3] is test_ast.lines[3]
+        assert mapped_ast.canonical() == _TestMapper().visit(
+            test_ast).canonical()
+
+    def test_copy_on_write_unchanged(self) -> None:
+        """Mapping an AST without any aliases returns the AST itself."""
+        test_ast = self._parse_src(mks('No aliases\n\\c[in *here*]'))
+        assert _CopyOnWriteTestMapper().visit(test_ast) is test_ast
+
+    def test_copy_on_write_evaluate(self) -> None:
+        """Copied commands keep their processed command, so the mapped AST
+        can still be evaluated, but not their cached subtree hash."""
+        test_ast = self._parse_src('\\header[aliases]\n\n'
+                                   '\\def_alias[k; @foo]\n',
+                                   skip_validation=False)
+        orig_cmd = test_ast.lines[1].elements.elements[0]
+        orig_hash = orig_cmd.subtree_hash()
+        mapped_ast = _CopyOnWriteTestMapper().visit(test_ast)
+        mapped_cmd = mapped_ast.lines[1].elements.elements[0]
+        assert mapped_cmd is not orig_cmd
+        assert mapped_cmd.proc_cmd is orig_cmd.proc_cmd
+        assert mapped_cmd.subtree_hash() != orig_hash
+        mapped_cmds = mapped_ast.node_index.all_commands()
+        assert len(mapped_cmds) == 1 and mapped_cmds[0] is mapped_cmd
+        alias_dict = AliasesEvaluator().visit(mapped_ast)
+        assert list(alias_dict) == ['k']
+
+    def test_copy_on_write_iterative(self) -> None:
+        """Copy-on-write mappers can't walk the AST iteratively."""
+        class _IterativeCopyOnWrite(_CopyOnWriteTestMapper):
+            walk_order = WALK_PRE_ORDER
+        with pytest.raises(ValueError):
+            _IterativeCopyOnWrite().visit(self._parse_src(mks('@a')))
+
+    def test_copy_on_write_leaf_pool(self) -> None:
+        """Shared nodes from a leaf pool are never changed."""
+        test_src = mks('@a and @b', '@a and @b')
+        test_ast = process_zoia_string(test_src, '<leaf_pool>',
+                                       skip_validation=True,
+                                       leaf_pool=LeafPool())
+        shared_and = test_ast.lines[1].elements.elements[1]
+        orig_repr = test_ast.canonical()
+        mapped_ast = _CopyOnWriteTestMapper().visit(test_ast)
+        assert shared_and is test_ast.lines[2].elements.elements[1]
+        assert mapped_ast.lines[1].elements.elements[1] is shared_and
+        assert mapped_ast.lines[2].elements.elements[1] is shared_and
+        assert test_ast.canonical() == orig_repr
+        assert mapped_ast.canonical() == mks('a and b', 'a and b')
+
+class TestCopyOnWriteMapCorpus:
+    """Compares copy-on-write mapping to mapping in place on every Zoia file
+    in the repository."""
+    def test_copy_on_write_map_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        for zoia_path, zoia_ast in iter_repo_zoia_asts():
+            orig_repr = zoia_ast.canonical()
+            cow_repr = _CopyOnWriteTestMapper().visit(zoia_ast).canonical()
+            assert zoia_ast.canonical() == orig_repr, zoia_path
+            assert cow_repr == _TestMapper().visit(
+                zoia_ast).canonical(), zoia_path
+
+class TestIterativeMapCorpus:
+    """Compares the iterative walks to the recursive one on every Zoia file
+    in the repository."""
+    def test_iterative_map_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        for zoia_path, zoia_ast in iter_repo_zoia_asts():
+            mapped_reprs = [_TestMapper().visit(zoia_ast).canonical()]
+            for mapper_type in (_PreOrderTestMapper, _PostOrderTestMapper):
+                # Mapping changes the AST, so parse it again every time
+                mapped_reprs.append(mapper_type().visit(
+                    parse_repo_zoia_file(zoia_path)).canonical())
+            assert mapped_reprs[0] == mapped_reprs[1], zoia_path
+            assert mapped_reprs[0] == mapped_reprs[2], zoia_path
+
+class _CommandRenamer(_TestMapper):
+    """Test mapper implementation that renames every command by mapping its
+    name, walking the AST iteratively."""
+    walk_order = WALK_PRE_ORDER
+
+    def _map_leaf(self, leaf_val):
+        if isinstance(leaf_val, str) and leaf_val.startswith('c'):
+            return f'renamed_{leaf_val}'
+        return leaf_val
+
+class TestMapDeepNesting:
+    """Deeply nested command arguments can be mapped iteratively."""
+    def test_map_deep_nesting(self) -> None:
+        """Runs the actual test: renaming the nested commands and checking
+        their names."""
+        nested_depth = 5000
+        mapped_node = _CommandRenamer().visit(make_nested_commands(
+            nested_depth))
+        for i in range(nested_depth):
+            assert mapped_node.cmd_name == f'renamed_c{i}'
+            mapped_node = mapped_node.arguments[0].arg_value.elements[0]
+        assert mapped_node.text_val == 'text'
+
 # Delete these, otherwise pytest will see them in scope and run them again
 del ATestCanonicalRepr, TestHeaderCR, TestCommentCR, TestTextFragmentCR, \
     TestAliasCR, TestAliasBarCR, TestCommandNoArgCR, TestCommandWithArgCR, \
@@ -20,10 +20,17 @@
 #
 # =============================================================================
 """This module houses tests related to ast_visitor."""
-from test.base import ATestParser
+import dataclasses
 
-from ast_nodes import AASTNode
-from ast_visitor import AASTVisitor
+from test.base import ATestParser, iter_repo_zoia_asts
+
+import pytest
+
+from ast_nodes import AASTNode, CommandNode, LineElementsNode, \
+    StdArgumentNode, TextFragmentNode
+from ast_visitor import AASTVisitor, ACommandVisitor, WALK_POST_ORDER, \
+    WALK_PRE_ORDER
+from src_pos import SourceTable
 
 class _VisitorTest(AASTVisitor):
     """Test visitor implementation that simply logs the class names of every
@@ -38,14 +45,20 @@ class _VisitorTest(AASTVisitor):
 _DEFAULT_HEADER_NODES = ['ZoiaFileNode', 'HeaderNode', 'StdArgumentNode',
                          'LineElementsNode', 'TextFragmentNode', 'LineNode']
 
+class _PreOrderVisitorTest(_VisitorTest):
+    """Version of _VisitorTest that walks the AST iteratively. Since it logs
+    nodes before their children, the log has to be the same."""
+    walk_order = WALK_PRE_ORDER
+
 class _ATestASTVisitor(ATestParser):
     """Base class for AASTVisitor tests."""
     _expected_log: list[str]
+    _visitor_type: type[_VisitorTest] = _VisitorTest
 
     def test_ast_visitor(self):
         """Runs the actual test: parsing the source, visiting the AST and
         comparing the visit log."""
-        visitor = _VisitorTest()
+        visitor = self._visitor_type()
         visitor.visit(self._parse_src())
         final_log = visitor.visit_log
         if self._added_header:
@@ -100,3 +113,129 @@ class TestMarkup(_ATestASTVisitor):
                      # ***em3***, TextFragmentNode is 'em3'
                      'Em3LineElementNode', 'LineElementsNode',
                      'TextFragmentNode']
+
+class TestPreOrderEmpty(TestEmpty):
+    """Version of TestEmpty that walks the AST iteratively."""
+    _visitor_type = _PreOrderVisitorTest
+
+class TestPreOrderAlias(TestAlias):
+    """Version of TestAlias that walks the AST iteratively."""
+    _visitor_type = _PreOrderVisitorTest
+
+class TestPreOrderCommand(TestCommand):
+    """Version of TestCommand that walks the AST iteratively."""
+    _visitor_type = _PreOrderVisitorTest
+
+class TestPreOrderMarkup(TestMarkup):
+    """Version of TestMarkup that walks the AST iteratively."""
+    _visitor_type = _PreOrderVisitorTest
+
+class _ReflectiveVisitorTest(_VisitorTest):
+    """Version of _VisitorTest that finds child nodes by checking every field
+    of every node at runtime, without looking at the type annotations. Used
+    as a reference for the compiled version. Note that __slots__ can't be
+    used for this, since it only holds the slots that a class adds on top of
+    its parents' (and may be empty, e.g. for HeaderNode on 3.11+)."""
+    def _visit_default(self, node: AASTNode):
+        self.visit_log.append(node.__class__.__name__)
+        for node_field in dataclasses.fields(node):
+            self._try_visit_val(getattr(node, node_field.name))
+
+class TestCompiledFieldsCorpus:
+    """Compares the compiled default visit to the reflective one on every
+    Zoia file in the repository."""
+    def test_compiled_fields_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        for zoia_path, zoia_ast in iter_repo_zoia_asts():
+            compiled_visitor = _VisitorTest()
+            compiled_visitor.visit(zoia_ast)
+            reflective_visitor = _ReflectiveVisitorTest()
+            reflective_visitor.visit(zoia_ast)
+            assert (compiled_visitor.visit_log ==
+                    reflective_visitor.visit_log), zoia_path
+
+class _PostOrderVisitorTest(AASTVisitor):
+    """Test visitor implementation that logs the class names of every node
+    it visits after visiting its children."""
+    def __init__(self) -> None:
+        self.visit_log = []
+
+    def _visit_default(self, node: AASTNode):
+        ret_val = super()._visit_default(node)
+        self.visit_log.append(node.__class__.__name__)
+        return ret_val
+
+class _IterPostOrderVisitorTest(_PostOrderVisitorTest):
+    """Version of _PostOrderVisitorTest that walks the AST iteratively."""
+    walk_order = WALK_POST_ORDER
+
+class _CommandVisitorTest(ACommandVisitor):
+    """Test command visitor implementation that logs the names of all
+    commands it visits."""
+    def __init__(self) -> None:
+        self.visit_log = []
+
+    def visit_command(self, node: CommandNode):
+        self.visit_log.append(node.cmd_name)
+        super().visit_command(node)
+
+class _PreOrderCommandVisitorTest(_CommandVisitorTest):
+    """Version of _CommandVisitorTest that walks the AST iteratively."""
+    walk_order = WALK_PRE_ORDER
+
+class _PostOrderCommandVisitorTest(_CommandVisitorTest):
+    """Version of _CommandVisitorTest that walks the AST iteratively and
+    visits commands after their arguments."""
+    walk_order = WALK_POST_ORDER
+
+class TestIterativeWalkCorpus:
+    """Compares the iterative walks to the recursive ones on every Zoia file
+    in the repository."""
+    def test_iterative_walk_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        for zoia_path, zoia_ast in iter_repo_zoia_asts():
+            for recursive_type, iterative_type in (
+                    (_VisitorTest, _PreOrderVisitorTest),
+                    (_PostOrderVisitorTest, _IterPostOrderVisitorTest),
+                    (_CommandVisitorTest, _PreOrderCommandVisitorTest)):
+                recursive_visitor = recursive_type()
+                recursive_visitor.visit(zoia_ast)
+                iterative_visitor = iterative_type()
+                iterative_visitor.visit(zoia_ast)
+                assert (recursive_visitor.visit_log ==
+                        iterative_visitor.visit_log), zoia_path
+
+# Deep enough to exceed the default recursion limit several times over
+_NESTING_DEPTH = 5000
+
+def make_nested_commands(nesting_depth: int) -> CommandNode:
+    """Creates the AST for \\c0[\\c1[...[text]...]], nested to the
+    specified depth. Parsing something like that would exceed the recursion
+    limit already."""
+    src_table = SourceTable('<nested>')
+    nested_node = TextFragmentNode('text', src_table=src_table, src_packed=0)
+    for i in reversed(range(nesting_depth)):
+        # See parse_converter.py for the reasoning
+        # noinspection PyArgumentList
+        nested_node = CommandNode([StdArgumentNode(LineElementsNode(
+            [nested_node], src_table=src_table, src_packed=0),
+            src_table=src_table, src_packed=0)], f'c{i}',
+            src_table=src_table, src_packed=0)
+    return nested_node
+
+class TestDeepNesting:
+    """Deeply nested command arguments can be walked iteratively, but not
+    recursively."""
+    def test_deep_nesting(self) -> None:
+        """Runs the actual test: walking the nested commands in every
+        possible way and checking the visited commands."""
+        nested_cmd = make_nested_commands(_NESTING_DEPTH)
+        cmd_names = [f'c{i}' for i in range(_NESTING_DEPTH)]
+        with pytest.raises(RecursionError):
+            _CommandVisitorTest().visit(nested_cmd)
+        pre_visitor = _PreOrderCommandVisitorTest()
+        pre_visitor.visit(nested_cmd)
+        assert pre_visitor.visit_log == cmd_names
+        post_visitor = _PostOrderCommandVisitorTest()
+        post_visitor.visit(nested_cmd)
+        assert post_visitor.visit_log == cmd_names[::-1]
@@ -20,6 +20,7 @@
 #
 # =============================================================================
 """This module houses tests related to canonical representations."""
+from io import StringIO
 from test.base import ATestParser, mks
 
 class ATestCanonicalRepr(ATestParser):
@@ -39,6 +40,14 @@ class ATestCanonicalRepr(ATestParser):
         representation itself again."""
         assert self._get_canonical(self._test_rep) == self._test_rep
 
+    def test_write_canonical_file(self) -> None:
+        """Writing the canonical representation to a file should produce the
+        same result as building it in memory."""
+        out_file = StringIO()
+        test_ast = self._parse_src(self._test_src)
+        test_ast.write_canonical_file(out_file)
+        assert out_file.getvalue() == test_ast.canonical()
+
 class TestHeaderCR(ATestCanonicalRepr):
     """Headers should be formatted like commands (see TestCommandWithArgCR)."""
     _test_src = mks()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests related to columnar ASTs."""
+import pickle
+from test.base import iter_repo_zoia_asts
+from test.test_canonical import ATestCanonicalRepr, TestHeaderCR, \
+    TestCommentCR, TestTextFragmentCR, TestAliasCR, TestAliasBarCR, \
+    TestCommandNoArgCR, TestCommandWithArgCR, TestKeywordArgsCR, \
+    TestCommandWhitespaceCR, TestCommandMarkupCR, TestCommandNestedSACR, \
+    TestCommandNestedMACR, TestUnicodeCR, TestEm1CR, TestEm2CR, TestEm3CR, \
+    TestEm1ComplexCR, TestEm2ComplexCR, TestEm3ComplexCR, TestMarkupCombinedCR
+
+from ast_visitor import AASTVisitor
+from columnar_ast import ColumnarAST, NodeKind
+from zoia_processor import process_zoia_string
+
+class _TextCollector(AASTVisitor):
+    """Collects the text of every text fragment and the name of every command
+    in the visited AST."""
+    __slots__ = ('collected',)
+
+    def __init__(self) -> None:
+        self.collected = []
+
+    def visit_text_fragment(self, node):
+        self.collected.append(node.text_val)
+
+    def visit_command(self, node):
+        self.collected.append(node.cmd_name)
+        return super().visit_command(node)
+
+class _ATestColumnarCR(ATestCanonicalRepr):
+    """Base class for canonical repr tests that go through the views of a
+    ColumnarAST."""
+    def _get_canonical(self, test_src: str) -> str:
+        return ColumnarAST.from_node(self._parse_src(test_src)).view(
+            ).canonical()
+
+class TestColumnarHeaderCR(_ATestColumnarCR, TestHeaderCR):
+    """Version of TestHeaderCR that uses a columnar AST."""
+
+class TestColumnarCommentCR(_ATestColumnarCR, TestCommentCR):
+    """Version of TestCommentCR that uses a columnar AST."""
+
+class TestColumnarTextFragmentCR(_ATestColumnarCR, TestTextFragmentCR):
+    """Version of TestTextFragmentCR that uses a columnar AST."""
+
+class TestColumnarAliasCR(_ATestColumnarCR, TestAliasCR):
+    """Version of TestAliasCR that uses a columnar AST."""
+
+class TestColumnarAliasBarCR(_ATestColumnarCR, TestAliasBarCR):
+    """Version of TestAliasBarCR that uses a columnar AST."""
+
+class TestColumnarCommandNoArgCR(_ATestColumnarCR, TestCommandNoArgCR):
+    """Version of TestCommandNoArgCR that uses a columnar AST."""
+
+class TestColumnarCommandWithArgCR(_ATestColumnarCR, TestCommandWithArgCR):
+    """Version of TestCommandWithArgCR that uses a columnar AST."""
+
+class TestColumnarKeywordArgsCR(_ATestColumnarCR, TestKeywordArgsCR):
+    """Version of TestKeywordArgsCR that uses a columnar AST."""
+
+class TestColumnarCommandWhitespaceCR(_ATestColumnarCR,
+                           TestCommandWhitespaceCR):
+    """Version of TestCommandWhitespaceCR that uses a columnar AST."""
+
+class TestColumnarCommandMarkupCR(_ATestColumnarCR, TestCommandMarkupCR):
+    """Version of TestCommandMarkupCR that uses a columnar AST."""
+
+class TestColumnarCommandNestedSACR(_ATestColumnarCR, TestCommandNestedSACR):
+    """Version of TestCommandNestedSACR that uses a columnar AST."""
+
+class TestColumnarCommandNestedMACR(_ATestColumnarCR, TestCommandNestedMACR):
+    """Version of TestCommandNestedMACR that uses a columnar AST."""
+
+class TestColumnarUnicodeCR(_ATestColumnarCR, TestUnicodeCR):
+    """Version of TestUnicodeCR that uses a columnar AST."""
+
+class TestColumnarEm1CR(_ATestColumnarCR, TestEm1CR):
+    """Version of TestEm1CR that uses a columnar AST."""
+
+class TestColumnarEm2CR(_ATestColumnarCR, TestEm2CR):
+    """Version of TestEm2CR that uses a columnar AST."""
+
+class TestColumnarEm3CR(_ATestColumnarCR, TestEm3CR):
+    """Version of TestEm3CR that uses a columnar AST."""
+
+class TestColumnarEm1ComplexCR(_ATestColumnarCR, TestEm1ComplexCR):
+    """Version of TestEm1ComplexCR that uses a columnar AST."""
+
+class TestColumnarEm2ComplexCR(_ATestColumnarCR, TestEm2ComplexCR):
+    """Version of TestEm2ComplexCR that uses a columnar AST."""
+
+class TestColumnarEm3ComplexCR(_ATestColumnarCR, TestEm3ComplexCR):
+    """Version of TestEm3ComplexCR that uses a columnar AST."""
+
+class TestColumnarMarkupCombinedCR(_ATestColumnarCR, TestMarkupCombinedCR):
+    """Version of TestMarkupCombinedCR that uses a columnar AST."""
+
+class TestColumnarCorpus:
+    """Converts every Zoia file in the repository into a ColumnarAST and
+    back."""
+    def test_columnar_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        for zoia_path, zoia_ast in iter_repo_zoia_asts():
+            col_ast = ColumnarAST.from_node(zoia_ast)
+            assert col_ast.to_node() == zoia_ast, zoia_path
+            restored_ast = ColumnarAST.from_bytes(col_ast.to_bytes())
+            assert restored_ast.to_node() == zoia_ast, zoia_path
+            unpickled_ast = pickle.loads(pickle.dumps(col_ast))
+            assert unpickled_ast.to_node() == zoia_ast, zoia_path
+            # Visitors have to see the same nodes in the same order
+            tree_collector = _TextCollector()
+            tree_collector.visit(zoia_ast)
+            view_collector = _TextCollector()
+            view_collector.visit(col_ast.view())
+            assert view_collector.collected == tree_collector.collected, \
+                zoia_path
+
+def test_columnar_scan() -> None:
+    """The arrays of a ColumnarAST should describe the tree in pre-order."""
+    zoia_ast = process_zoia_string('\\header[a]\nfoo\\b[c]\n', '<test>',
+                                   skip_validation=True)
+    col_ast = ColumnarAST.from_node(zoia_ast)
+    assert [NodeKind(k) for k in col_ast.kinds] == [
+        NodeKind.ZOIA_FILE, NodeKind.HEADER, NodeKind.STD_ARGUMENT,
+        NodeKind.LINE_ELEMENTS, NodeKind.TEXT_FRAGMENT, NodeKind.LINE,
+        NodeKind.LINE_ELEMENTS, NodeKind.TEXT_FRAGMENT, NodeKind.COMMAND,
+        NodeKind.STD_ARGUMENT, NodeKind.LINE_ELEMENTS,
+        NodeKind.TEXT_FRAGMENT]
+    assert col_ast.children_of(0) == [1, 5]
+    assert col_ast.parents[8] == 6
+    text_indices = col_ast.indices_of_kind(NodeKind.TEXT_FRAGMENT)
+    assert text_indices == [4, 7, 11]
+    assert [col_ast.string_of(i) for i in text_indices] == ['a', 'foo', 'c']
+    assert col_ast.view(8).src_pos == zoia_ast.lines[0].elements.elements[
+        1].src_pos
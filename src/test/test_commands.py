@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests for the lazy loading of commands via the command
+manifest."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+import commands
+from ast_nodes import CommandNode
+from exception import ValidationError
+from src_pos import SourceTable
+
+# pylint: disable=protected-access
+
+class TestCommandManifest:
+    """Loads the command manifest from a temporary file in various states."""
+    def test_manifest_missing(self) -> None:
+        """A missing manifest should be built in memory, without writing
+        it."""
+        with TemporaryDirectory() as tmp_dir:
+            manifest_path = Path(tmp_dir) / '_manifest.json'
+            manifest_entries = commands._load_manifest(manifest_path)
+            assert manifest_entries == commands._build_manifest()
+            assert manifest_entries['def_alias'] == {
+                'module': 'def_alias',
+                'signature': commands._import_command(
+                    'def_alias').compact(),
+                'state_ext': '_StateExtDA',
+            }
+            assert manifest_entries['header']['state_ext'] is None
+            assert not manifest_path.exists()
+
+    def test_manifest_broken(self) -> None:
+        """A manifest in another format, or a broken one, should be built in
+        memory as well, without touching the file."""
+        with TemporaryDirectory() as tmp_dir:
+            manifest_path = Path(tmp_dir) / '_manifest.json'
+            for manifest_contents in (json.dumps({'format': 0,
+                                                  'commands': {}}),
+                                      'garbage'):
+                manifest_path.write_text(manifest_contents, 'utf-8')
+                assert commands._load_manifest(manifest_path) == \
+                       commands._build_manifest()
+                assert manifest_path.read_text('utf-8') == manifest_contents
+
+    def test_manifest_current(self) -> None:
+        """A manifest in the current format should be used as-is."""
+        fake_entries = {'foo': {'module': 'foo', 'signature': '\\foo|',
+                                'state_ext': None}}
+        with TemporaryDirectory() as tmp_dir:
+            manifest_path = Path(tmp_dir) / '_manifest.json'
+            manifest_path.write_text(json.dumps({
+                'format': commands._MANIFEST_FORMAT,
+                'commands': fake_entries}), 'utf-8')
+            assert commands._load_manifest(manifest_path) == fake_entries
+
+    def test_manifest_up_to_date(self) -> None:
+        """The shipped manifest should match the command modules. If this
+        fails, run scripts/gen_manifest.py."""
+        with TemporaryDirectory() as tmp_dir:
+            manifest_path = Path(tmp_dir) / '_manifest.json'
+            commands.write_manifest(manifest_path)
+            assert manifest_path.read_bytes() == \
+                   commands._MANIFEST_PATH.read_bytes()
+
+def _get_with_manifest(cmd_name: str, stale_entries: dict[str, dict]):
+    """Looks up the command with the specified name as if it had not been
+    imported yet and the shipped manifest consisted of stale_entries.
+    Restores the real manifest afterwards."""
+    cmd_node = CommandNode([], cmd_name, src_table=SourceTable('<test>'),
+                           src_packed=0)
+    old_manifest = commands._manifest
+    old_cmd_type = commands._cmd_map.pop(cmd_name, None)
+    commands._manifest = stale_entries
+    commands._manifest_rebuilt = False
+    try:
+        return commands.get_command_type(cmd_node)
+    finally:
+        commands._manifest = old_manifest
+        commands._manifest_rebuilt = False
+        if old_cmd_type is not None:
+            commands._cmd_map[cmd_name] = old_cmd_type
+
+class TestStaleManifest:
+    """A stale manifest should be rebuilt once before a command is reported
+    as unknown."""
+    def test_manifest_lacks_command(self) -> None:
+        """A command that is missing from the manifest should still be
+        found."""
+        cmd_type = _get_with_manifest('header', {})
+        assert cmd_type.cmd_name == 'header'
+
+    def test_manifest_missing_module(self) -> None:
+        """A manifest entry pointing to a module that does not exist should
+        not make the lookup fail."""
+        cmd_type = _get_with_manifest('header', {'header': {
+            'module': 'no_such_module', 'signature': '', 'state_ext': None}})
+        assert cmd_type.cmd_name == 'header'
+
+    def test_manifest_wrong_module(self) -> None:
+        """A manifest entry pointing to the module of another command should
+        not return that command."""
+        cmd_type = _get_with_manifest('header', {'header': {
+            'module': 'def_alias', 'signature': '', 'state_ext': None}})
+        assert cmd_type.cmd_name == 'header'
+
+    def test_unknown_command(self) -> None:
+        """A command that does not exist should still be reported after the
+        manifest has been rebuilt."""
+        with pytest.raises(ValidationError, match='Unknown command'):
+            _get_with_manifest('no_such_command', {})
+
+def test_lazy_command_import():
+    """Validating a file should only import the modules of the commands it
+    uses. Needs a fresh interpreter, since this one has imported them all
+    already."""
+    check_src = '\n'.join([
+        'import sys',
+        'from zoia_processor import process_zoia_string',
+        "process_zoia_string('\\\\header[chapter]\\n', '<test>')",
+        "print(sorted(m for m in sys.modules if m.startswith('commands.')))",
+    ])
+    src_root = Path(commands.__file__).resolve().parents[1]
+    check_proc = subprocess.run([sys.executable, '-c', check_src],
+                                cwd=src_root, capture_output=True,
+                                check=True, text=True)
+    assert check_proc.stdout.strip() == "['commands._base', 'commands.header']"
@@ -83,6 +83,12 @@ class TestUpperPath(_ATestCfgFailing):
     _test_name = 'upper_path'
     _exp_error = "'Aliases.zoia' is not lowercased"
 
+class TestParallelNotBool(_ATestCfgFailing):
+    """A boolean option that is set to something other than true or false
+    should be rejected."""
+    _test_name = 'parallel_not_bool'
+    _exp_error = "'yes' is not a boolean (must be true or false)"
+
 # Passing tests begin here
 class TestNoConfigP(_ATestCfgPassing):
     """Similar to test_project_structure.TestSimpleStructure. No config means
@@ -90,6 +96,40 @@ class TestNoConfigP(_ATestCfgPassing):
     exist."""
     _test_name = 'no_config_p'
 
+class TestParallelOption(_ATestCfgPassing):
+    """A config file that enables parallel parsing should be accepted and the
+    project should still parse correctly."""
+    _test_name = 'parallel_option'
+
+    def test_proj_passes(self) -> None:
+        project = self._parse_project()
+        assert project.config.parsing.parallel.option_value is True
+
+class TestLazyOption(_ATestCfgPassing):
+    """A config file that enables lazy parsing should be accepted. The
+    project's Zoia files should then only be parsed when their ASTs are
+    needed."""
+    _test_name = 'lazy_option'
+
+    def test_proj_passes(self) -> None:
+        project = self._parse_project()
+        assert project.config.parsing.lazy.option_value is True
+        main_file = project.series.works[0].chapters[0].main_file
+        assert not main_file.is_ast_loaded()
+        assert main_file.file_ast.header.cmd_name == 'header'
+        assert main_file.is_ast_loaded()
+
+class TestDirectParserOption(_ATestCfgPassing):
+    """A config file that enables the direct parser should be accepted and
+    the project should still parse correctly."""
+    _test_name = 'direct_parser_option'
+
+    def test_proj_passes(self) -> None:
+        project = self._parse_project()
+        assert project.config.parsing.direct_parser.option_value is True
+        main_file = project.series.works[0].chapters[0].main_file
+        assert main_file.file_ast.header.cmd_name == 'header'
+
 class TestPresentSesailaYranoitcid(_ATestCfgPassing):
     """A config file which combines the changes from TestMissingSesaila and
     TestMissingYranoitcid is present here, but the two files are now present
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests for saving and loading ANTLR's DFAs."""
+import pickle
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from test.base import PlantedPickle, mks
+
+from _vendor.antlr4.dfa.DFA import DFA
+
+from grammar import zoiaLexer, zoiaParser
+from parsing import dfa_state_count, load_dfa_cache, save_dfa_cache
+from zoia_processor import process_zoia_string
+
+_TEST_SRC = mks('foo *bar* @baz', '\\cmd[a; b = **c**;\n]|d # e')
+
+def _parse_with_antlr():
+    """Parses the test source through ANTLR, warming up its DFAs."""
+    return process_zoia_string(_TEST_SRC, '<test>', skip_validation=True,
+                               use_direct_parser=False)
+
+def _reset_dfas():
+    """Throws away all DFA states, as if ANTLR was never run."""
+    for recog_class in (zoiaLexer, zoiaParser):
+        recog_class.decisionsToDFA[:] = [
+            DFA(ds, i) for i, ds in enumerate(recog_class.atn.decisionToState)]
+
+class TestDFACache:
+    """Saves warmed-up DFAs and loads them into fresh ones."""
+    def test_dfa_cache_roundtrip(self) -> None:
+        """The loaded DFAs should have all the states of the saved ones and
+        should not need to discover any new states for the same source."""
+        exp_ast = _parse_with_antlr()
+        warm_count = dfa_state_count()
+        assert warm_count > 0
+        with TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / 'antlr_dfa.pickle'
+            save_dfa_cache(cache_path)
+            _reset_dfas()
+            assert dfa_state_count() == 0
+            assert load_dfa_cache(cache_path)
+        assert dfa_state_count() == warm_count
+        assert _parse_with_antlr() == exp_ast
+        assert dfa_state_count() == warm_count
+
+    def test_dfa_cache_rejected(self) -> None:
+        """Missing files, broken files and files from another version of the
+        grammar should be rejected without touching the DFAs."""
+        _parse_with_antlr()
+        warm_count = dfa_state_count()
+        with TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / 'antlr_dfa.pickle'
+            assert not load_dfa_cache(cache_path)
+            cache_path.write_bytes(b'garbage')
+            assert not load_dfa_cache(cache_path)
+            cache_path.write_bytes(pickle.dumps(('0' * 64, [], [], {})))
+            assert not load_dfa_cache(cache_path)
+        assert dfa_state_count() == warm_count
+
+    def test_dfa_cache_planted(self) -> None:
+        """Files that try to load anything besides the ANTLR runtime's
+        classes should be rejected without running any of their code."""
+        _parse_with_antlr()
+        warm_count = dfa_state_count()
+        with TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / 'antlr_dfa.pickle'
+            marker_path = Path(tmp_dir) / 'planted'
+            cache_path.write_bytes(pickle.dumps(PlantedPickle(marker_path)))
+            assert not load_dfa_cache(cache_path)
+            assert not marker_path.exists()
+        assert dfa_state_count() == warm_count
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses conformance tests that make sure the direct parser
+produces exactly the same ASTs as the ANTLR parser plus ParseConverter."""
+from test.base import get_repo_zoia_paths, mks
+
+import pytest
+
+from _vendor.antlr4 import InputStream
+
+from direct_parser import parse_zoia_arg, parse_zoia_file
+from exception import ParsingError
+from grammar import parse
+from parse_converter import ParseConverter
+from zoia_processor import process_zoia_string
+
+def _antlr_ast(zoia_src: str, entry_rule: str):
+    """Parses the specified source with ANTLR and converts the result via
+    ParseConverter."""
+    return ParseConverter('<test>').visit(parse(InputStream(zoia_src),
+                                                entry_rule))
+
+# ==== Expect-Success Tests ===================================================
+class _ATestDirectParser:
+    """Base class for tests that compare the direct parser's AST for a file
+    to the one produced by ANTLR."""
+    _test_src: str
+
+    def test_direct_parser(self) -> None:
+        """Checks the source in this class' _test_src field."""
+        direct_ast = parse_zoia_file(self._test_src, '<test>')
+        assert direct_ast is not None
+        assert direct_ast == _antlr_ast(self._test_src, 'zoiaFile')
+
+class TestDirectParserEmpty(_ATestDirectParser):
+    """A header on its own, no lines."""
+    _test_src = '\\header[fragment]\n'
+
+class TestDirectParserLines(_ATestDirectParser):
+    """Empty lines, text, aliases and commands, with all three newline
+    styles."""
+    _test_src = mks('', 'foo bar', '\r', '  @a1 @a2|x\r\n', '\\a \\b|c\\\\')
+
+class TestDirectParserArguments(_ATestDirectParser):
+    """Arguments separated by newlines and spaces, including the trailing
+    spaces that ANTLR's greedy loops put into the argument."""
+    _test_src = mks('\\cmd[ a ;\n b = c d ;\n\te=f ; ]', '\\cmd[a ]',
+                    '\\cmd[\n\\x[y] ;]', '\\cmd[a;b;]|x', '\\cmd[a\n]')
+
+class TestDirectParserEmphasis(_ATestDirectParser):
+    """All three emphasis levels, next to each other and inside
+    arguments."""
+    _test_src = mks('*a*', '**a b**', '***\\c @d***', '*a***b**', '*a**b*',
+                    '\\cmd[*a*; k = **b**]')
+
+class TestDirectParserComments(_ATestDirectParser):
+    """Comments are skipped, but still count for source positions."""
+    _test_src = '\\header[a]# b\n\n# c\nfoo # bar\n\t#baz\n'
+
+class TestDirectParserCorpus:
+    """Compares the parsers on every Zoia file in the repository."""
+    def test_direct_parser_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        zoia_paths = get_repo_zoia_paths()
+        assert zoia_paths
+        for zoia_path in zoia_paths:
+            zoia_src = zoia_path.read_bytes().decode('utf-8')
+            direct_ast = parse_zoia_file(zoia_src, '<test>')
+            assert direct_ast is not None, zoia_path
+            assert direct_ast == _antlr_ast(zoia_src, 'zoiaFile'), zoia_path
+
+class _ATestDirectParserArg:
+    """Base class for tests that compare the direct parser's AST for an
+    argument value to the one produced by ANTLR."""
+    _test_src: str
+
+    def test_direct_parser_arg(self) -> None:
+        """Checks the argument value in this class' _test_src field."""
+        direct_ast = parse_zoia_arg(self._test_src, '<test>')
+        assert direct_ast is not None
+        assert direct_ast == _antlr_ast(self._test_src, 'lineElementsArg')
+
+class TestDirectParserArg(_ATestDirectParserArg):
+    """A regular argument value."""
+    _test_src = 'foo *bar* \\baz[qux] @a'
+
+class TestDirectParserArgLeftovers(_ATestDirectParserArg):
+    """lineElementsArg does not end with EOF, so everything after the first
+    token that can't continue the value gets ignored."""
+    _test_src = 'foo\n] bar'
+
+# ==== Expect-Failure Tests ===================================================
+class _ATestDirectParserFail:
+    """Base class for tests where the direct parser has to give up. The
+    processor then has to fall back to ANTLR for the error message."""
+    _test_src: str
+
+    def test_direct_parser_fail(self) -> None:
+        """Checks that the direct parser gives up on the source in this
+        class' _test_src field and that the processor reports the same error
+        as it would without the direct parser."""
+        assert parse_zoia_file(self._test_src, '<test>') is None
+        with pytest.raises(ParsingError) as exc_info:
+            process_zoia_string(self._test_src, '<test>',
+                                skip_validation=True)
+        with pytest.raises(ParsingError) as antlr_exc_info:
+            process_zoia_string(self._test_src, '<test>',
+                                skip_validation=True, use_direct_parser=False)
+        assert str(exc_info.value) == str(antlr_exc_info.value)
+
+class TestDirectParserFailLexer(_ATestDirectParserFail):
+    """Token recognition errors are reported by the lexer."""
+    _test_src = mks('foo @ bar')
+
+class TestDirectParserFailNoHeader(_ATestDirectParserFail):
+    """The header is required."""
+    _test_src = 'foo\n'
+
+class TestDirectParserFailEm(_ATestDirectParserFail):
+    """Mismatched asterisks."""
+    _test_src = mks('**a*')
+
+class TestDirectParserFailArgs(_ATestDirectParserFail):
+    """Empty arguments."""
+    _test_src = mks('\\cmd[a;;b]')
+
+class TestDirectParserFailNoNewline(_ATestDirectParserFail):
+    """Every line has to end with a newline."""
+    _test_src = '\\header[a]\nfoo'
@@ -20,7 +20,10 @@
 #
 # =============================================================================
 """This module houses tests related to custom exceptions."""
-from exception import AbstractError
+import pickle
+
+from exception import AbstractError, ParsingError
+from src_pos import SourcePos
 
 def test_abstract_msg() -> None:
     """AbstractError should correctly derive method names and source files."""
@@ -29,3 +32,13 @@ def test_abstract_msg() -> None:
     except AbstractError as e:
         assert 'test_abstract_msg' in str(e)
         assert 'test_exception' in str(e)
+
+def test_src_pos_error_pickle() -> None:
+    """SrcPosErrors should survive being pickled, e.g. when being sent back
+    from a worker process during parallel parsing."""
+    orig_error = ParsingError(SourcePos('foo.zoia', 3, 4), 'bar')
+    pickled_error = pickle.loads(pickle.dumps(orig_error))
+    assert isinstance(pickled_error, ParsingError)
+    assert str(pickled_error) == str(orig_error)
+    assert pickled_error.src_pos == orig_error.src_pos
+    assert pickled_error.orig_msg == orig_error.orig_msg
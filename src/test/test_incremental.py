@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests for incrementally reparsing edited Zoia files."""
+from test.base import mks
+
+import pytest
+
+from exception import ParsingError
+from zoia_processor import process_zoia_string, reparse_zoia_edit
+
+_TEST_SRC = mks('foo bar', '\\cmd[a;', '  b = c]', '', '*x* @y', '\\z[q]|w')
+
+def _parse(zoia_src: str):
+    """Parses the specified source, skipping validation."""
+    return process_zoia_string(zoia_src, '<test>', skip_validation=True)
+
+class _ATestReparse:
+    """Base class for tests that apply an edit to a file and compare the
+    result to reparsing the whole file."""
+    _test_src = _TEST_SRC
+    # The text to replace and what to replace it with. The edit is applied at
+    # the first occurrence of the text
+    _edit_target: str
+    _edit_replacement: str
+    # Whether the edit should be handled without reparsing the whole file
+    _exp_incremental: bool = True
+
+    def test_reparse(self) -> None:
+        """Applies the edit and checks that the resulting AST matches a full
+        parse of the edited source."""
+        orig_ast = _parse(self._test_src)
+        edit_start = self._test_src.index(self._edit_target)
+        edit_end = edit_start + len(self._edit_target)
+        new_src, new_ast = reparse_zoia_edit(
+            orig_ast, self._test_src, edit_start, edit_end,
+            self._edit_replacement, skip_validation=True)
+        assert new_src == self._test_src.replace(
+            self._edit_target, self._edit_replacement, 1)
+        full_ast = _parse(new_src)
+        assert new_ast == full_ast
+        # The index has to be updated without walking the whole file
+        assert new_ast.node_index == full_ast.node_index
+        assert (new_ast is orig_ast) == self._exp_incremental
+        # Reparsed lines have to share the source table of the file
+        assert all(l.src_table is new_ast.src_table for l in new_ast.lines)
+
+class TestReparseKeystroke(_ATestReparse):
+    """Typing inside a line only reparses that line."""
+    _edit_target = 'bar'
+    _edit_replacement = 'baz'
+
+class TestReparseNewLine(_ATestReparse):
+    """Inserting lines has to move all following lines down."""
+    _edit_target = 'foo '
+    _edit_replacement = 'foo\n\n\\new\n'
+
+class TestReparseMergeLines(_ATestReparse):
+    """Deleting a newline merges two lines and moves the rest up."""
+    _edit_target = 'bar\n'
+    _edit_replacement = 'bar '
+
+class TestReparseArgument(_ATestReparse):
+    """Edits inside arguments that span multiple lines reparse the whole
+    command."""
+    _edit_target = 'b = c'
+    _edit_replacement = 'b = c;\n d;\n'
+
+class TestReparseLastLine(_ATestReparse):
+    """Appending to the last line works as well."""
+    _edit_target = 'w\n'
+    _edit_replacement = 'w\nmore\n'
+
+class TestReparseHeader(_ATestReparse):
+    """Edits to the header cause a full reparse."""
+    _edit_target = 'fragment'
+    _edit_replacement = 'chapter'
+    _exp_incremental = False
+
+class TestReparseLoneCR(_ATestReparse):
+    """Lone '\\r's do not start a new line for ANTLR, so they cause a full
+    reparse."""
+    _edit_target = 'bar'
+    _edit_replacement = 'bar\rbaz'
+    _exp_incremental = False
+
+class TestReparseSyntaxError:
+    """Edits that cause syntax errors raise them like a full parse would and
+    leave the AST untouched."""
+    def test_reparse_syntax_error(self) -> None:
+        """Adds an unclosed bracket and checks that the AST stays intact."""
+        orig_ast = _parse(_TEST_SRC)
+        edit_start = _TEST_SRC.index('bar')
+        with pytest.raises(ParsingError):
+            reparse_zoia_edit(orig_ast, _TEST_SRC, edit_start, edit_start,
+                              '\\x[', skip_validation=True)
+        assert orig_ast == _parse(_TEST_SRC)
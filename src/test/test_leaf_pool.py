@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests for sharing identical leaves via LeafPool."""
+from test.base import get_repo_zoia_paths, mks
+
+import pytest
+
+from ast_nodes import AASTNode, LeafPool, LineElementsNode, ZoiaFileNode
+from ast_visitor import AASTVisitor
+from exception import InternalError
+from src_pos import SHARED_PACKED, SourcePos
+from zoia_processor import process_zoia_string, reparse_zoia_edit
+
+def _parse(zoia_src: str, leaf_pool: LeafPool | None = None, *,
+           use_direct_parser: bool = True):
+    """Parses the specified source, skipping validation."""
+    return process_zoia_string(zoia_src, '<test>', skip_validation=True,
+                               use_direct_parser=use_direct_parser,
+                               leaf_pool=leaf_pool)
+
+class _ElementPosCollector(AASTVisitor):
+    """Collects the positions of all line elements in the visited AST."""
+    __slots__ = ('element_positions',)
+
+    def __init__(self) -> None:
+        self.element_positions: list[SourcePos] = []
+
+    def visit_line_elements(self, node: LineElementsNode):
+        self.element_positions.extend(
+            node.element_src_pos(i) for i in range(len(node.elements)))
+        self._visit_default(node)
+
+def _element_positions(zoia_ast: AASTNode) -> list[SourcePos]:
+    """Returns the positions of all line elements in the specified AST."""
+    pos_collector = _ElementPosCollector()
+    pos_collector.visit(zoia_ast)
+    return pos_collector.element_positions
+
+def _index_positions(zoia_ast: ZoiaFileNode) -> tuple[dict, dict]:
+    """Returns the packed positions of all commands and aliases in the node
+    index of the specified AST, by name. The nodes themselves can't be
+    compared, since they contain text fragments."""
+    node_index = zoia_ast.node_index
+    return tuple({n: [x.src_packed for x in i_nodes]
+                  for n, i_nodes in index_dict.items()}
+                 for index_dict in (node_index.commands, node_index.aliases))
+
+def _check_shared(zoia_src: str) -> None:
+    """Checks that parsing the specified source with a leaf pool produces
+    the same AST as without one (apart from the sharing), with both
+    parsers."""
+    plain_ast = _parse(zoia_src)
+    shared_ast = _parse(zoia_src, LeafPool())
+    assert shared_ast.canonical() == plain_ast.canonical()
+    assert _element_positions(shared_ast) == _element_positions(plain_ast)
+    assert _index_positions(shared_ast) == _index_positions(plain_ast)
+    assert shared_ast == _parse(zoia_src, LeafPool(), use_direct_parser=False)
+
+class _ATestLeafPool:
+    """Base class for tests that compare parsing a file with a leaf pool to
+    parsing it without one."""
+    _test_src: str
+
+    def test_leaf_pool(self) -> None:
+        """Checks the source in this class' _test_src field."""
+        _check_shared(self._test_src)
+
+class TestLeafPoolLines(_ATestLeafPool):
+    """Empty lines, text, aliases and commands, with all three newline
+    styles."""
+    _test_src = mks('', 'foo bar', '\r', '  @a1 @a2|x\r\n', '\\a \\b|c\\\\')
+
+class TestLeafPoolArguments(_ATestLeafPool):
+    """Arguments, including keyword arguments and nested commands."""
+    _test_src = mks('\\cmd[ a ;\n b = c d ;\n\te=f ; ]', '\\cmd[a ]',
+                    '\\cmd[\n\\x[y] ;]', '\\cmd[a;b;]|x', '\\cmd[a\n]')
+
+class TestLeafPoolEmphasis(_ATestLeafPool):
+    """All three emphasis levels, next to each other and inside
+    arguments."""
+    _test_src = mks('*a*', '**a b**', '***\\c @d***', '*a***b**', '*a**b*',
+                    '\\cmd[*a*; k = **b**]')
+
+class TestLeafPoolComments(_ATestLeafPool):
+    """Comments are skipped, but still count for source positions."""
+    _test_src = '\\header[a]# b\n\n# c\nfoo # bar\n\t#baz\n'
+
+class TestLeafPoolCorpus:
+    """Compares parsing with and without a leaf pool on every Zoia file in
+    the repository."""
+    def test_leaf_pool_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        zoia_paths = get_repo_zoia_paths()
+        assert zoia_paths
+        for zoia_path in zoia_paths:
+            _check_shared(zoia_path.read_bytes().decode('utf-8'))
+
+class TestLeafPoolSharing:
+    """Identical leaves have to be shared, within one file and between
+    files parsed with the same pool."""
+    def test_leaf_pool_sharing(self) -> None:
+        """Parses two files with the same pool and checks their leaves."""
+        leaf_pool = LeafPool()
+        first_ast = _parse(mks('foo \\cmd[foo; k = v] @a'), leaf_pool)
+        second_ast = _parse(mks('foo @a \\cmd[k = v]'), leaf_pool)
+        first_elems = first_ast.lines[1].elements.elements
+        second_elems = second_ast.lines[1].elements.elements
+        foo_node = first_elems[0]
+        assert foo_node.src_packed == SHARED_PACKED
+        # Shared leaves have no position, their parents know where they are
+        with pytest.raises(InternalError):
+            _foo_pos = foo_node.src_pos
+        assert first_ast.lines[1].elements.element_src_pos(0) == SourcePos(
+            '<test>', 3, 0)
+        assert first_elems[2].arguments[0].arg_value.elements[0] is foo_node
+        assert second_elems[0] is foo_node
+        # Spaces are text fragments too
+        assert second_elems[1] is first_elems[1]
+        # Aliases keep their own positions, but their keys are shared
+        assert second_elems[2] is not first_elems[4]
+        assert second_elems[2].alias_key is first_elems[4].alias_key
+        assert second_elems[4].cmd_name is first_elems[2].cmd_name
+        assert (second_elems[4].arguments[0].kwd_name is
+                first_elems[2].arguments[1].kwd_name)
+        # foo, the space, v and the header's argument
+        assert len(leaf_pool) == 4
+
+class TestLeafPoolReparse:
+    """Incrementally reparsing a file that was parsed with a leaf pool has
+    to move the out-of-line positions, but not the shared leaves."""
+    def test_leaf_pool_reparse(self) -> None:
+        """Inserts lines in front of others and compares the result to a
+        full parse."""
+        test_src = mks('foo bar', '\\cmd[foo;', '  b = bar]', '*foo* @bar')
+        leaf_pool = LeafPool()
+        orig_ast = _parse(test_src, leaf_pool)
+        edit_start = test_src.index('bar')
+        new_src, new_ast = reparse_zoia_edit(
+            orig_ast, test_src, edit_start, edit_start + 3, 'bar\n\nfoo',
+            skip_validation=True, leaf_pool=leaf_pool)
+        assert new_ast is orig_ast
+        full_ast = _parse(new_src, leaf_pool)
+        assert new_ast == full_ast
+        assert _element_positions(new_ast) == _element_positions(
+            _parse(new_src))
+        # The shared space after *foo* must not move along with its line
+        assert new_ast.lines[-1].elements.elements[1].src_packed == \
+               SHARED_PACKED
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses differential tests that make sure the hand-written
+ZoiaFastLexer (and lex_zoia_tokens) produce exactly the same tokens and
+errors as the lexer that ANTLR generates from the grammar."""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from test.base import get_repo_zoia_paths
+
+from _vendor.antlr4 import FileStream, InputStream, MappedFileStream, Token
+from _vendor.antlr4.error.ErrorListener import ErrorListener
+
+from grammar import zoiaLexer
+from parsing import ZoiaFastLexer, lex_zoia_tokens
+
+class _RecordingErrorListener(ErrorListener):
+    """Error listener that records all errors instead of printing them."""
+    def __init__(self):
+        self.recorded_errors = []
+
+    # pylint: disable=arguments-renamed,too-many-arguments
+    def syntaxError(self, recognizer, offending_symbol, line, column, msg, e):
+        self.recorded_errors.append((offending_symbol, line, column, msg,
+                                     recognizer.inputStream.index))
+
+def _lex_all(lexer_class, zoia_src: str):
+    """Runs the specified lexer class on the specified source until it hits
+    EOF. Returns every property of the resulting tokens, all reported errors
+    and the lexer's final state."""
+    lexer = lexer_class(InputStream(zoia_src))
+    lexer.removeErrorListeners()
+    error_listener = _RecordingErrorListener()
+    lexer.addErrorListener(error_listener)
+    lexed_tokens = []
+    while True:
+        tok = lexer.nextToken()
+        lexed_tokens.append((tok.type, tok.text, tok.channel, tok.start,
+                             tok.stop, tok.line, tok.column))
+        if tok.type == Token.EOF:
+            break
+    return (lexed_tokens, error_listener.recorded_errors,
+            (lexer.line, lexer.column, lexer.inputStream.index))
+
+def _assert_same_lexing(zoia_src: str):
+    """Asserts that both lexers produce the same result for the specified
+    source."""
+    antlr_result = _lex_all(zoiaLexer, zoia_src)
+    assert _lex_all(ZoiaFastLexer, zoia_src) == antlr_result
+    antlr_tokens, antlr_errors, _antlr_state = antlr_result
+    exp_tuples = None if antlr_errors else [
+        (tok_type, tok_text, tok_line, tok_column) for tok_type, tok_text,
+        _channel, _start, _stop, tok_line, tok_column in antlr_tokens]
+    assert lex_zoia_tokens(zoia_src) == exp_tuples
+
+class _ATestLexerDiff:
+    """Base class for tests that compare the lexers on a snippet."""
+    _test_src: str
+
+    def test_lexer_diff(self) -> None:
+        """Checks the snippet in this class' _test_src field."""
+        _assert_same_lexing(self._test_src)
+
+class TestLexerEmpty(_ATestLexerDiff):
+    """Only an EOF token should be produced."""
+    _test_src = ''
+
+class TestLexerCommands(_ATestLexerDiff):
+    """Headers, commands and their arguments."""
+    _test_src = '\\header[a]\n\\cmd[foo; bar = qux]|\\a*\\b=c'
+
+class TestLexerHeaderPrefix(_ATestLexerDiff):
+    """'\\header' is a token even if the command name continues, while a
+    partial match falls back to a backslash and a word."""
+    _test_src = '\\headers \\head \\heade\\header\\'
+
+class TestLexerNewlines(_ATestLexerDiff):
+    """ANTLR only advances the line on '\\n', so bare '\\r's have to keep the
+    line the same."""
+    _test_src = 'a\r\nb\rc\n\r\r\nd\n'
+
+class TestLexerComments(_ATestLexerDiff):
+    """Comments are skipped, but still consume characters."""
+    _test_src = '# whole line\nfoo # rest of line\r\n#\n\\cmd#[x]'
+
+class TestLexerUnicode(_ATestLexerDiff):
+    """Unicode spaces, letters and numbers, including characters outside the
+    BMP."""
+    _test_src = ('a\u00a0b\u3000c\u2028d\te @\u00e9t\u00e9 @\u0663\U0001d7d8 '
+                 '\U0001f600 @x\u0301')
+
+class TestLexerAliasErrors(_ATestLexerDiff):
+    """Stray '@'s cause recognition errors that include the following
+    character, which is then skipped. That even swallows newlines."""
+    _test_src = 'foo @ bar @\nbaz @@qux @'
+
+class TestLexerCorpus:
+    """Compares the lexers on every Zoia file in the repository."""
+    def test_lexer_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        zoia_paths = get_repo_zoia_paths()
+        assert zoia_paths
+        for zoia_path in zoia_paths:
+            _assert_same_lexing(zoia_path.read_text(encoding='utf-8'))
+
+class TestMappedFileStream:
+    """MappedFileStream has to behave exactly like FileStream."""
+    def test_mapped_file_stream(self) -> None:
+        """Compares the two streams on an empty file and on one with
+        multi-byte characters and CRLF newlines."""
+        with TemporaryDirectory() as tmp_dir:
+            test_path = Path(tmp_dir) / 'test.zoia'
+            for test_src in ('', 'h\u00e9llo\r\n\U0001f600 @a\n'):
+                test_path.write_bytes(test_src.encode('utf-8'))
+                mapped_stream = MappedFileStream(str(test_path), 'utf-8')
+                file_stream = FileStream(str(test_path), 'utf-8')
+                assert mapped_stream.strdata == file_stream.strdata
+                assert mapped_stream.size == len(test_src)
+                assert ([mapped_stream.LA(i) for i in range(1, 12)] ==
+                        [file_stream.LA(i) for i in range(1, 12)])
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests related to the command and alias indexes of Zoia
+file ASTs."""
+from test.base import ATestParser, iter_repo_zoia_asts, parse_repo_zoia_file
+
+from ast_nodes import CommandNode, NodeIndex, ZoiaFileNode
+from ast_visitor import ACommandVisitor
+from zoia_processor import process_zoia_string
+
+class _CommandCollector(ACommandVisitor):
+    """Collects all commands in the order in which they get visited."""
+    def __init__(self) -> None:
+        self.visited_cmds = []
+
+    def visit_command(self, node: CommandNode):
+        self.visited_cmds.append(node)
+        super().visit_command(node)
+
+def _walked_index(zoia_ast: ZoiaFileNode) -> NodeIndex:
+    """Creates the index of the specified AST by walking it."""
+    return NodeIndex.from_nodes([zoia_ast.header, *zoia_ast.lines])
+
+def _index_ids(node_index: NodeIndex) -> tuple[dict, dict]:
+    """Returns the IDs of all nodes in the specified index, so that two
+    indexes of the same AST can be compared cheaply."""
+    return tuple({k: [id(n) for n in v] for k, v in d.items()}
+                 for d in (node_index.commands, node_index.aliases))
+
+class TestNodeIndex(ATestParser):
+    """Commands and aliases are grouped by name in source order, nested ones
+    included. The header is not indexed, but its arguments are."""
+    _test_src = ('\\header[fragment; \\h]\n'
+                 '\\a[\\b[@x] \\a[y]] @x|z\n'
+                 '*\\b* @y\n')
+
+    def test_node_index(self) -> None:
+        """Checks the names and positions of the indexed nodes."""
+        node_index = self._parse_src().node_index
+        assert {k: [(n.src_pos.src_line, n.src_pos.src_char) for n in v]
+                for k, v in node_index.commands.items()} == {
+            'h': [(1, 18)], 'a': [(2, 0), (2, 10)], 'b': [(2, 3), (3, 1)]}
+        assert {k: [(n.src_pos.src_line, n.src_pos.src_char) for n in v]
+                for k, v in node_index.aliases.items()} == {
+            'x': [(2, 6), (2, 17)], 'y': [(3, 5)]}
+        assert [c.cmd_name for c in node_index.all_commands()] == [
+            'h', 'a', 'b', 'a', 'b']
+
+class TestNodeIndexCorpus:
+    """Compares the indexes that the parsers record to walking the AST, and
+    all_commands to the order in which visitors see commands, on every Zoia
+    file in the repository."""
+    def test_node_index_corpus(self) -> None:
+        """Checks every Zoia file in the repository."""
+        for zoia_path, zoia_ast in iter_repo_zoia_asts():
+            recorded_index = zoia_ast.node_index
+            assert (_index_ids(recorded_index) ==
+                    _index_ids(_walked_index(zoia_ast))), zoia_path
+            cmd_collector = _CommandCollector()
+            cmd_collector.visit(zoia_ast)
+            assert ([id(c) for c in recorded_index.all_commands()] ==
+                    [id(c) for c in cmd_collector.visited_cmds]), zoia_path
+            zoia_src = zoia_path.read_bytes().decode('utf-8')
+            for stream_tokens in (False, True):
+                antlr_ast = process_zoia_string(
+                    zoia_src, zoia_path.name, skip_validation=True,
+                    use_direct_parser=False, stream_tokens=stream_tokens)
+                assert antlr_ast.node_index == recorded_index, zoia_path
+                assert (_index_ids(antlr_ast.node_index) ==
+                        _index_ids(_walked_index(antlr_ast))), zoia_path
+
+class TestNodeIndexLazy:
+    """ASTs built without a recorded index create it on first access."""
+    def test_node_index_lazy(self) -> None:
+        """Discards the recorded index and checks the recreated one."""
+        zoia_ast = parse_repo_zoia_file(
+            next(p for p, _a in iter_repo_zoia_asts()))
+        recorded_index = zoia_ast.node_index
+        zoia_ast.set_node_index(None)
+        assert zoia_ast.node_index == recorded_index
+        assert zoia_ast.node_index is zoia_ast.node_index
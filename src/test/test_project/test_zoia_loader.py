@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module runs tests that check whether ZoiaLoader correctly caches the
+ASTs of a project's Zoia files."""
+import pickle
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from test.base import PlantedPickle, _get_proj_path
+
+import pytest
+
+import build_supervisor
+import log
+from exception import ParsingError
+from project import Project, Series, ZoiaFile, ZoiaLoader, CACHE_FOLDER_NAME
+from validation import ContentTy, Default
+
+class TestZoiaLoaderCache:
+    """Parses a copy of the simple_structure test project with the AST cache
+    enabled and checks hits, misses and pruning."""
+    @staticmethod
+    def _parse_cached(proj_path: Path):
+        """Parses the specified project with the cache enabled and returns the
+        resulting project along with the AST cache's hits and misses."""
+        log.reset_stats()
+        # pylint: disable=protected-access
+        project = Project.parse_project(proj_path, raise_errors=True,
+                                        use_cache=True)
+        cache_counts = log._cache_stats.get('AST cache', [0, 0])
+        log.reset_stats()
+        return project, tuple(cache_counts)
+
+    def test_cache(self):
+        """A second parse of an unchanged project should be served entirely
+        from the cache and produce identical ASTs. Changing a file should
+        only cause a miss for that file and prune should remove the stale
+        entry."""
+        with TemporaryDirectory() as tmp_dir:
+            proj_path = Path(tmp_dir) / 'simple_structure'
+            shutil.copytree(_get_proj_path('simple_structure', __file__),
+                            proj_path)
+            cold_proj, cold_counts = self._parse_cached(proj_path)
+            assert cold_counts == (0, 3)
+            warm_proj, warm_counts = self._parse_cached(proj_path)
+            assert warm_counts == (3, 0)
+            cold_main = cold_proj.series.works[0].chapters[0].main_file
+            warm_main = warm_proj.series.works[0].chapters[0].main_file
+            assert cold_main.file_ast == warm_main.file_ast
+            assert warm_main.file_ast.header.proc_cmd.cmd_args == \
+                   cold_main.file_ast.header.proc_cmd.cmd_args
+            # Change one file, which should now miss
+            main_path = proj_path / 'src' / 'work1' / 'ch1' / 'main.zoia'
+            main_path.write_text('\\header[chapter]\n\nfoo\n',
+                                 encoding='utf-8')
+            changed_proj, changed_counts = self._parse_cached(proj_path)
+            assert changed_counts == (2, 1)
+            changed_main = changed_proj.series.works[0].chapters[0].main_file
+            assert changed_main.file_ast.lines[-1].canonical() == 'foo\n'
+            # The entry for the old version of the file is now stale
+            cache_folder = proj_path / CACHE_FOLDER_NAME / 'ast'
+            assert len(list(cache_folder.iterdir())) == 4
+            assert ZoiaLoader.prune_cache(proj_path.resolve()) == 1
+            assert len(list(cache_folder.iterdir())) == 3
+            _final_proj, final_counts = self._parse_cached(proj_path)
+            assert final_counts == (3, 0)
+
+    def test_planted_cache_entry(self):
+        """Cache entries that try to load anything besides the compiler's own
+        classes should be discarded without running any of their code."""
+        with TemporaryDirectory() as tmp_dir:
+            proj_path = Path(tmp_dir) / 'simple_structure'
+            shutil.copytree(_get_proj_path('simple_structure', __file__),
+                            proj_path)
+            self._parse_cached(proj_path)
+            marker_path = Path(tmp_dir) / 'planted'
+            cache_folder = proj_path / CACHE_FOLDER_NAME / 'ast'
+            for entry_path in cache_folder.iterdir():
+                entry_path.write_bytes(
+                    pickle.dumps(PlantedPickle(marker_path)))
+            _planted_proj, planted_counts = self._parse_cached(proj_path)
+            assert planted_counts == (0, 3)
+            assert not marker_path.exists()
+
+    def test_no_cache(self):
+        """Parsing without the cache should not create a cache folder."""
+        with TemporaryDirectory() as tmp_dir:
+            proj_path = Path(tmp_dir) / 'simple_structure'
+            shutil.copytree(_get_proj_path('simple_structure', __file__),
+                            proj_path)
+            Project.parse_project(proj_path, raise_errors=True)
+            assert not (proj_path / CACHE_FOLDER_NAME).exists()
+
+def _all_zoia_files(project: Project) -> list[ZoiaFile]:
+    """Returns all Zoia files in the specified project."""
+    zoia_files = list(project.series.zoia_files)
+    for w in project.series.works:
+        zoia_files.extend(w.zoia_files)
+        for c in w.chapters:
+            zoia_files.append(c.main_file)
+            zoia_files.extend(c.zoia_files)
+    return zoia_files
+
+def _all_zoia_asts(project: Project) -> dict:
+    """Maps the paths of all Zoia files in the specified project to their
+    ASTs."""
+    return {z.file_path: z.file_ast for z in _all_zoia_files(project)}
+
+class TestZoiaLoaderParallel:
+    """Parses projects with parallel parsing enabled and compares the results
+    with those of serial parsing."""
+    def test_parallel_matches_serial(self):
+        """Parallel parsing should produce the same ASTs as serial parsing."""
+        proj_path = _get_proj_path('arbitrary_zoia_files', __file__)
+        serial_proj = Project.parse_project(proj_path, raise_errors=True,
+                                            parallel=False)
+        parallel_proj = Project.parse_project(proj_path, raise_errors=True,
+                                              parallel=True)
+        serial_asts = _all_zoia_asts(serial_proj)
+        assert len(serial_asts) == 13
+        assert serial_asts == _all_zoia_asts(parallel_proj)
+
+    def test_prefetch_finds_all_files(self):
+        """The files handed to prefetch should be exactly the ones that
+        parsing the series loads."""
+        proj_path = _get_proj_path('arbitrary_zoia_files', __file__).resolve()
+        project = Project.parse_project(proj_path, raise_errors=True)
+        zoia_paths = Series.find_zoia_files(proj_path / 'src')
+        assert sorted(zoia_paths) == sorted(
+            z.file_path for z in _all_zoia_files(project))
+
+    def test_parallel_error(self):
+        """Errors in worker processes should be raised when the walk over the
+        project reaches the broken file."""
+        with TemporaryDirectory() as tmp_dir:
+            proj_path = Path(tmp_dir) / 'simple_structure'
+            shutil.copytree(_get_proj_path('simple_structure', __file__),
+                            proj_path)
+            main_path = proj_path / 'src' / 'work1' / 'ch1' / 'main.zoia'
+            main_path.write_text('\\header[chapter]\n\n*foo\n',
+                                 encoding='utf-8')
+            with pytest.raises(ParsingError) as exc_info:
+                Project.parse_project(proj_path, raise_errors=True,
+                                      parallel=True)
+            assert exc_info.value.src_pos.src_file == str(
+                Path('src') / 'work1' / 'ch1' / 'main.zoia')
+
+class TestZoiaLoaderLazy:
+    """Parses projects with lazy parsing enabled and checks that ASTs are
+    only loaded once they are needed."""
+    def test_lazy_matches_eager(self):
+        """Lazily loaded ASTs should be the same as eagerly loaded ones, and
+        no AST should be loaded before it is accessed."""
+        proj_path = _get_proj_path('arbitrary_zoia_files', __file__)
+        eager_proj = Project.parse_project(proj_path, raise_errors=True,
+                                           lazy=False)
+        lazy_proj = Project.parse_project(proj_path, raise_errors=True,
+                                          lazy=True, parallel=True)
+        lazy_files = _all_zoia_files(lazy_proj)
+        assert not any(z.is_ast_loaded() for z in lazy_files)
+        assert _all_zoia_asts(lazy_proj) == _all_zoia_asts(eager_proj)
+        assert all(z.is_ast_loaded() for z in lazy_files)
+
+    def test_lazy_threads(self):
+        """Accessing an AST from multiple threads at once should load it only
+        once."""
+        proj_path = _get_proj_path('simple_structure', __file__)
+        lazy_proj = Project.parse_project(proj_path, raise_errors=True,
+                                          lazy=True)
+        main_file = lazy_proj.series.works[0].chapters[0].main_file
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            loaded_asts = list(executor.map(lambda _i: main_file.file_ast,
+                                            range(32)))
+        assert all(a is loaded_asts[0] for a in loaded_asts)
+
+    def test_lazy_error(self):
+        """Errors in a lazily loaded file should only be raised once its AST
+        is accessed, and again on every further access."""
+        with TemporaryDirectory() as tmp_dir:
+            proj_path = Path(tmp_dir) / 'simple_structure'
+            shutil.copytree(_get_proj_path('simple_structure', __file__),
+                            proj_path)
+            main_path = proj_path / 'src' / 'work1' / 'ch1' / 'main.zoia'
+            main_path.write_text('\\header[chapter]\n\n*foo\n',
+                                 encoding='utf-8')
+            lazy_proj = Project.parse_project(proj_path, raise_errors=True,
+                                              lazy=True)
+            main_file = lazy_proj.series.works[0].chapters[0].main_file
+            for _i in range(2):
+                with pytest.raises(ParsingError):
+                    _ = main_file.file_ast
+            assert not main_file.is_ast_loaded()
+
+    def test_lazy_build_error(self):
+        """Errors in a lazily loaded file that the build needs should be
+        logged and abort the build instead of propagating."""
+        with TemporaryDirectory() as tmp_dir:
+            proj_path = Path(tmp_dir) / 'simple_structure'
+            shutil.copytree(_get_proj_path('simple_structure', __file__),
+                            proj_path)
+            lazy_proj = Project.parse_project(proj_path, lazy=True)
+            assert build_supervisor.build(lazy_proj)
+            aliases_path = proj_path / 'src' / 'aliases.zoia'
+            aliases_path.write_text('\\header[aliases]\n\n'
+                                    '\\def_alias[a; b\n', encoding='utf-8')
+            lazy_proj = Project.parse_project(proj_path, lazy=True)
+            assert lazy_proj is not None
+            assert lazy_proj.aliases_file.load_file_ast(
+                raise_errors=False) is None
+            with pytest.raises(ParsingError):
+                lazy_proj.aliases_file.load_file_ast(raise_errors=True)
+            assert not build_supervisor.build(lazy_proj)
+
+    def test_lazy_saves_caches(self):
+        """Whatever lazily loaded files add to the caches should be saved once
+        the project is closed."""
+        with TemporaryDirectory() as tmp_dir:
+            proj_path = Path(tmp_dir) / 'simple_structure'
+            shutil.copytree(_get_proj_path('simple_structure', __file__),
+                            proj_path)
+            default_cache = (proj_path / CACHE_FOLDER_NAME /
+                             'signature_defaults.pickle')
+            with Project.parse_project(proj_path, raise_errors=True,
+                                       use_cache=True, lazy=True) as lazy_proj:
+                _ = lazy_proj.aliases_file.file_ast
+                # Stands in for a lazy load that parses a new default value
+                _ = Default(ContentTy(), 'a *lazily* parsed default').default
+                assert not default_cache.exists()
+            assert default_cache.is_file()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests for reusing lexers and parsers via the recognizer
+pool."""
+import threading
+from test.base import mks
+
+import pytest
+
+from _vendor.antlr4 import InputStream
+from _vendor.antlr4.error.ErrorListener import ConsoleErrorListener, \
+    ErrorListener
+
+from exception import ParsingError
+from grammar import parse, zoiaLexer
+from parsing import ZoiaFastLexer, acquire_parser, release_parser
+from zoia_processor import process_zoia_string
+
+_TEST_SRC = mks('foo *bar* @baz', '\\cmd[a; b = **c**;\n]|d # e')
+_BROKEN_SRC = mks('foo *bar', 'baz')
+
+def _process_with_antlr(zoia_src: str):
+    """Processes the specified source through ANTLR."""
+    return process_zoia_string(zoia_src, '<test>', skip_validation=True,
+                               use_direct_parser=False)
+
+class TestRecognizerPoolReuse:
+    """Checks which parsers the pool hands out."""
+    def test_recognizer_pool_reuse(self) -> None:
+        """A released parser should be handed out again, with its lexer
+        pointed at the new input."""
+        first_parser = acquire_parser(ZoiaFastLexer, InputStream('a'))
+        release_parser(ZoiaFastLexer, first_parser)
+        second_stream = InputStream('b')
+        second_parser = acquire_parser(ZoiaFastLexer, second_stream)
+        try:
+            assert second_parser is first_parser
+            lexer = second_parser.getTokenStream().tokenSource
+            assert lexer.inputStream is second_stream
+            assert lexer.nextToken().text == 'b'
+        finally:
+            release_parser(ZoiaFastLexer, second_parser)
+
+    def test_recognizer_pool_nested(self) -> None:
+        """Parsers that are still in use must not be handed out again, not
+        even for nested parses."""
+        outer_parser = acquire_parser(ZoiaFastLexer, InputStream('a'))
+        try:
+            inner_parser = acquire_parser(ZoiaFastLexer, InputStream('b'))
+            assert inner_parser is not outer_parser
+            release_parser(ZoiaFastLexer, inner_parser)
+        finally:
+            release_parser(ZoiaFastLexer, outer_parser)
+
+    def test_recognizer_pool_lexer_types(self) -> None:
+        """Each lexer class should get its own parsers."""
+        fast_parser = acquire_parser(ZoiaFastLexer, InputStream('a'))
+        release_parser(ZoiaFastLexer, fast_parser)
+        antlr_parser = acquire_parser(zoiaLexer, InputStream('a'))
+        try:
+            assert antlr_parser is not fast_parser
+            assert not isinstance(antlr_parser.getTokenStream().tokenSource,
+                                  ZoiaFastLexer)
+        finally:
+            release_parser(zoiaLexer, antlr_parser)
+
+    def test_recognizer_pool_threads(self) -> None:
+        """Other threads should never get this thread's parsers."""
+        own_parser = acquire_parser(ZoiaFastLexer, InputStream('a'))
+        release_parser(ZoiaFastLexer, own_parser)
+        thread_parsers = []
+        def acquire_in_thread():
+            thread_parser = acquire_parser(ZoiaFastLexer, InputStream('a'))
+            release_parser(ZoiaFastLexer, thread_parser)
+            thread_parsers.append(thread_parser)
+        worker = threading.Thread(target=acquire_in_thread)
+        worker.start()
+        worker.join()
+        assert thread_parsers and thread_parsers[0] is not own_parser
+
+    def test_recognizer_pool_listeners(self) -> None:
+        """Error listeners should only be attached while the parser is in
+        use."""
+        error_listener = ErrorListener()
+        parser = acquire_parser(ZoiaFastLexer, InputStream('a'),
+                                error_listener)
+        lexer = parser.getTokenStream().tokenSource
+        for recognizer in (lexer, parser):
+            assert recognizer.getErrorListenerDispatch().delegates == [
+                error_listener]
+        release_parser(ZoiaFastLexer, parser, error_listener)
+        for recognizer in (lexer, parser):
+            assert recognizer.getErrorListenerDispatch().delegates == [
+                ConsoleErrorListener.INSTANCE]
+
+class TestRecognizerPoolParsing:
+    """Parses several sources in a row with pooled recognizers."""
+    def test_recognizer_pool_trees(self) -> None:
+        """Parse trees should stay intact when their parser is reused."""
+        first_tree = parse(InputStream('foo *bar*'), 'lineElementsArg')
+        exp_text = first_tree.getText()
+        parse(InputStream('\\baz[qux]'), 'lineElementsArg')
+        assert first_tree.getText() == exp_text
+
+    def test_recognizer_pool_errors(self) -> None:
+        """Errors should not leave any state behind in pooled recognizers."""
+        exp_ast = _process_with_antlr(_TEST_SRC)
+        exp_msgs = []
+        for _i in range(2):
+            with pytest.raises(ParsingError) as exc_info:
+                _process_with_antlr(_BROKEN_SRC)
+            exp_msgs.append(str(exc_info.value))
+            assert _process_with_antlr(_TEST_SRC) == exp_ast
+        assert exp_msgs[0] == exp_msgs[1]
+        assert 'line 3, column 9' in exp_msgs[0]
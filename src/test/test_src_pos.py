@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests related to source positions."""
+import pickle
+
+import pytest
+
+from ast_nodes import TextFragmentNode
+from src_pos import SourcePos, SourceTable, pack_pos, packed_line
+
+def test_pack_roundtrip() -> None:
+    """Packed positions should turn back into the same line and offset, even
+    for large values."""
+    src_table = SourceTable('foo.zoia')
+    for src_line, src_char in ((1, 0), (7, 255), (123456, 65432)):
+        packed_pos = pack_pos(src_line, src_char)
+        assert packed_line(packed_pos) == src_line
+        assert src_table.source_pos(packed_pos) == SourcePos(
+            'foo.zoia', src_line, src_char)
+
+def test_pack_offset_range() -> None:
+    """Offsets that don't fit next to the line number should be rejected
+    instead of changing the line."""
+    pack_pos(1, (1 << 24) - 1)
+    with pytest.raises(AssertionError):
+        pack_pos(1, 1 << 24)
+    with pytest.raises(AssertionError):
+        pack_pos(1, -1)
+
+def test_pack_shift() -> None:
+    """Adding a packed line delta should move a position by that many lines
+    without touching its offset."""
+    packed_pos = pack_pos(10, 5)
+    assert packed_pos + pack_pos(3, 0) == pack_pos(13, 5)
+    assert packed_pos + pack_pos(-9, 0) == pack_pos(1, 5)
+
+def test_node_src_pos() -> None:
+    """AST nodes should materialize their SourcePos from their source table,
+    also after being pickled (e.g. by the AST cache)."""
+    src_table = SourceTable('foo.zoia')
+    # noinspection PyArgumentList
+    orig_node = TextFragmentNode('bar', src_table=src_table,
+                                 src_packed=pack_pos(3, 4))
+    assert orig_node.src_pos == SourcePos('foo.zoia', 3, 4)
+    pickled_node = pickle.loads(pickle.dumps(orig_node))
+    assert pickled_node == orig_node
+    assert pickled_node.src_pos == orig_node.src_pos
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# GPL License and Copyright Notice ============================================
+#
+#   This file is part of Zoia, a language for writing fiction.
+#   Copyright (C) 2021-2023 Infernio
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# =============================================================================
+"""This module houses tests for parsing Zoia files line by line through ANTLR
+with a bounded token window."""
+from test.base import get_repo_zoia_paths, mks
+
+import pytest
+
+from _vendor.antlr4 import InputStream, Token
+from _vendor.antlr4.error.Errors import IllegalStateException
+
+from exception import ParsingError
+from parsing import WindowedTokenStream, ZoiaFastLexer, \
+    parse_zoia_file_streaming
+from zoia_processor import process_zoia_string
+
+def _process_with_antlr(zoia_src: str, stream_tokens: bool):
+    """Processes the specified source through ANTLR, optionally in streaming
+    mode."""
+    return process_zoia_string(zoia_src, '<test>', skip_validation=True,
+                               use_direct_parser=False,
+                               stream_tokens=stream_tokens)
+
+class TestWindowedTokenStream:
+    """Tests the token stream on its own."""
+    def test_windowed_token_stream(self) -> None:
+        """Lookahead and lookbehind should work like in CommonTokenStream,
+        until tokens get discarded."""
+        token_stream = WindowedTokenStream(ZoiaFastLexer(InputStream(
+            'foo bar\nbaz')))
+        assert token_stream.LT(1).text == 'foo'
+        assert token_stream.LT(3).text == 'bar'
+        assert token_stream.LB(1) is None
+        for _i in range(4):
+            token_stream.consume()
+        assert token_stream.LT(1).text == 'baz'
+        assert token_stream.LT(-1).text == '\n'
+        assert token_stream.LT(2).type == Token.EOF
+        assert token_stream.LT(5).type == Token.EOF
+        assert token_stream.getText() == 'foo bar\nbaz'
+        token_stream.discard_consumed()
+        assert token_stream.LT(-1).text == '\n'
+        assert token_stream.getText() == '\nbaz'
+        with pytest.raises(IllegalStateException):
+            token_stream.get(0)
+        with pytest.raises(IllegalStateException):
+            token_stream.seek(2)
+        token_stream.consume()
+        with pytest.raises(IllegalStateException):
+            token_stream.consume()
+
+class TestStreamingParseWindow:
+    """Checks that tokens of completed lines are actually discarded."""
+    def test_streaming_parse_window(self) -> None:
+        """When a line is handed out, only the tokens of that line (plus the
+        lookahead) should still be buffered."""
+        test_lines = ['foo *bar*', '\\cmd[a; b = c]', '', 'baz', 'qux']
+        max_lookahead = max(len(l) for l in test_lines) + 1
+        parsed_lines = []
+        def on_line(line_ctx):
+            # The newline ending the previous line, this line and at most the
+            # next line
+            window_text = line_ctx.parser.getTokenStream().getText()
+            line_text = line_ctx.getText()
+            assert window_text.startswith(f'\n{line_text}')
+            assert len(window_text) <= len(line_text) + 1 + max_lookahead
+            parsed_lines.append(line_text)
+        file_ctx = parse_zoia_file_streaming(
+            InputStream(mks(*test_lines)), on_line)
+        # The default header is followed by an empty line
+        assert parsed_lines == [f'{l}\n' for l in ['', *test_lines]]
+        assert not file_ctx.line()
+        assert file_ctx.header() is not None
+
+class TestStreamingParseCorpus:
+    """Compares the streaming mode against the regular one on all Zoia files
+    in the repository."""
+    def test_streaming_parse_corpus(self) -> None:
+        """Both modes should produce the same ASTs."""
+        for zoia_path in get_repo_zoia_paths():
+            zoia_src = zoia_path.read_text(encoding='utf-8')
+            assert (_process_with_antlr(zoia_src, stream_tokens=True) ==
+                    _process_with_antlr(zoia_src, stream_tokens=False))
+
+class _ATestStreamingParseFail:
+    """Base class for tests where ANTLR has to report a syntax error. The
+    error should be the same in both modes."""
+    _test_src: str
+
+    def test_streaming_parse_fail(self) -> None:
+        """Checks the source in this class' _test_src field."""
+        with pytest.raises(ParsingError) as exc_info:
+            _process_with_antlr(self._test_src, stream_tokens=True)
+        with pytest.raises(ParsingError) as exp_exc_info:
+            _process_with_antlr(self._test_src, stream_tokens=False)
+        assert str(exc_info.value) == str(exp_exc_info.value)
+
+class TestStreamingParseFailEm(_ATestStreamingParseFail):
+    """Mismatched asterisks after a completed line."""
+    _test_src = mks('foo', 'foo *bar', 'baz')
+
+class TestStreamingParseFailLate(_ATestStreamingParseFail):
+    """An error long after the first discarded tokens."""
+    _test_src = mks(*(['ok'] * 50), 'x]')
+
+class TestStreamingParseFailNoNewline(_ATestStreamingParseFail):
+    """Every line has to end with a newline, even the last one."""
+    _test_src = mks('foo', 'bar')[:-1]
@@ -20,15 +20,23 @@
 #
 # =============================================================================
 """This module houses tests related to validation of Zoia code."""
-from test.base import ATestParser
+import pickle
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from test.base import ATestParser, PlantedPickle
 
 import pytest
 
-from ast_nodes import CommandNode, ZoiaFileNode
+from ast_nodes import AASTNode, CommandNode, ZoiaFileNode
+from ast_validator import ASTValidator, _CachedArgs
 from exception import ValidationError
+from utils import compiler_stamp
 from validation import Signature, Default, AnyTy, ATy, Varargs, NoneTy, \
     VARARGS_STD, VARARGS_EITHER_OR, VARARGS_KWD, WordTy, IntTy, PureTextTy, \
-    ContentTy, FloatTy, HeaderKindTy, TagTy, TextTy
+    ContentTy, FloatTy, HeaderKind, HeaderKindTy, TagTy, TextTy, \
+    load_default_cache, parsed_default_count, save_default_cache
+from validation import default as default_module
 
 # Signature syntax tests begin here
 class _ATestSigSyntax:
@@ -180,12 +188,12 @@ class _ATestSigVal(ATestParser):
 
     def _validate_signature(self):
         """Validates this class' command's argument against this class'
-        signature."""
+        signature and returns the result (see Signature.validate_args)."""
         self._signature.init_default_values()
         test_node = self._parse_src().lines[1].elements.elements[0]
         if not isinstance(test_node, CommandNode):
             pytest.fail('_test_src must contain a single command')
-        self._signature.validate_args(test_node)
+        return self._signature.validate_args(test_node)
 
 class _ATestSigValPass(_ATestSigVal):
     """Base class for passing signature validation tests."""
@@ -298,6 +306,37 @@ class TestSigValTag(_ATestSigValPass):
     _test_src = ('\\foo[This is a tag - you can use it to specify various '
                  'metadata for a story]')
 
+class TestSigValBoundArgs(_ATestSigVal):
+    """Arguments are bound to the right parameters, in the order in which
+    they were specified, followed by the defaults of all optional parameters
+    that were not filled."""
+    _signature = Signature(
+        std_only={
+            'a': WordTy(),
+        },
+        either_or={
+            'b': WordTy(),
+            'c': Default(WordTy(), 'citrus'),
+        },
+        kwd_only={
+            'd': Default(WordTy(), 'date'),
+        },
+        varargs=Varargs(VARARGS_KWD, WordTy()),
+    )
+    _test_src = '\\foo[apple; d = durian; x = xigua; b = banana]'
+
+    def test_bound_args(self):
+        """Checks the values and nodes of the bound arguments."""
+        cmd_args, cmd_arg_nodes, cmd_varargs, cmd_vararg_nodes = \
+            self._validate_signature()
+        assert cmd_args == {'a': 'apple', 'd': 'durian', 'b': 'banana',
+                            'c': 'citrus'}
+        assert list(cmd_args) == ['a', 'd', 'b', 'c']
+        assert cmd_arg_nodes['c'] is None
+        assert cmd_arg_nodes['d'].kwd_name == 'd'
+        assert cmd_varargs == ['xigua']
+        assert cmd_vararg_nodes[0].kwd_name == 'x'
+
 # Failing signature validation tests begin here
 class TestSigValNoStds1(_ATestSigValFail):
     """A signature without any arguments should reject standard arguments."""
@@ -352,6 +391,18 @@ class TestSigValKwdTwice(_ATestSigValFail):
     _test_src = '\\foo[fruit = pear; fruit = apple]'
     _exp_error = "Keyword argument 'fruit' specified twice"
 
+class TestSigValKwdAfterStd(_ATestSigValFail):
+    """Keyword arguments may not fill parameters that were already filled by
+    standard arguments."""
+    _signature = Signature(
+        either_or={
+            'a': AnyTy(),
+            'b': AnyTy(),
+        }
+    )
+    _test_src = '\\foo[apple; a = avocado]'
+    _exp_error = "Keyword argument 'a' specified twice"
+
 class TestSigValTooManyStd(_ATestSigValFail):
     """If there are a limited number of std-accepting parameters (i.e. no
     compatible varargs), then specifying too many is illegal."""
@@ -423,6 +474,42 @@ class TestSigValNoneInContent(_ATestSigValFail):
     _exp_error = ('Parameters of type Content only accept Content, but '
                   '\\def_alias returns None')
 
+class TestSigValNestedNoneInContent(TestSigValNoneInContent):
+    """Parameters of type Content should not accept None-returning commands
+    nested inside of other elements either."""
+    _test_src = '\\foo[Some *emphasized \\def_alias[A; B]|*]'
+
+class TestSigValNoneInText(_ATestSigValFail):
+    """Parameters of type Text should not accept None-returning commands,
+    with an error naming the most specific return type they require."""
+    _signature = Signature(
+        std_only={
+            'a': TextTy(),
+        }
+    )
+    _test_src = '\\foo[Text and \\def_alias[A; B]]'
+    _exp_error = ('Parameters of type Text only accept Text and its '
+                  'subtypes, but \\def_alias returns None')
+
+class TestSigValNoneInPureText(TestSigValNoneInText):
+    """Parameters of type PureText report None-returning commands the same
+    way as Text does."""
+    _signature = Signature(
+        std_only={
+            'a': PureTextTy(),
+        }
+    )
+    _exp_error = ('Parameters of type PureText only accept Text and its '
+                  'subtypes, but \\def_alias returns None')
+
+class TestSigValContentAndNoneInText(TestSigValNoneInText):
+    """Non-text elements in a Text parameter are reported before commands
+    with the wrong return type."""
+    _test_src = '\\foo[\\def_alias[A; B]| and *bar*]'
+    _exp_error = ('Parameters of type Text only accept text fragments and '
+                  'commands with a return type of Text (or one of its '
+                  'subtypes)')
+
 class TestSigValContentInText(_ATestSigValFail):
     """Parameters of type Text should only accept text fragments and commands
     that return Text."""
@@ -566,6 +653,160 @@ class TestSigValWordTwoExtra(TestSigValWordOneExtra):
     _exp_error = ("Parameters of type Word only accept single words - 'words' "
                   "and 'here' are extraneous")
 
+# Default value tests begin here
+class TestDefaultLazy(ATestParser):
+    """Default values should only be parsed once they are actually used."""
+    _signature = Signature(
+        std_only={
+            'a': Default(WordTy(), 'two words'),
+        }
+    )
+
+    def _validate_cmd(self, test_src: str):
+        """Validates the command in the specified source against this class'
+        signature."""
+        test_node = self._parse_src(test_src).lines[1].elements.elements[0]
+        return self._signature.validate_args(test_node)
+
+    def test_default_unused(self):
+        """The invalid default value is never needed if the parameter is
+        filled, so it should not cause an error."""
+        assert self._validate_cmd('\\foo[one]')[0] == {'a': 'one'}
+
+    def test_default_used(self):
+        """Once the invalid default value is needed, it should fail just like
+        it would have failed when initialized eagerly."""
+        with pytest.raises(SyntaxError) as exc_info:
+            self._validate_cmd('\\foo|')
+        assert str(exc_info.value) == ('Failed to validate a Signature '
+                                       'default value')
+
+def test_default_parsed_once():
+    """Defaults with the same string should only parse it once, but each get
+    their own copy of the AST."""
+    first_default = Default(ContentTy(), 'some *shared* words')
+    assert first_default.default.canonical() == 'some *shared* words'
+    num_parsed = parsed_default_count()
+    second_default = Default(ContentTy(), 'some *shared* words')
+    assert second_default.default == first_default.default
+    assert parsed_default_count() == num_parsed
+    assert second_default.default is not first_default.default
+    first_default.default.elements.clear()
+    assert second_default.default.canonical() == 'some *shared* words'
+
+class TestDefaultCache:
+    """Saves parsed default values and loads them again."""
+    def test_default_cache_roundtrip(self) -> None:
+        """Loaded default values should be used instead of parsing them
+        again."""
+        # pylint: disable=protected-access
+        exp_ast = Default(ContentTy(), 'a *cached* default').default
+        with TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / 'signature_defaults.pickle'
+            save_default_cache(cache_path)
+            del default_module._parsed_defaults['a *cached* default']
+            num_parsed = parsed_default_count()
+            assert load_default_cache(cache_path)
+        assert parsed_default_count() == num_parsed + 1
+        loaded_ast = Default(ContentTy(), 'a *cached* default').default
+        assert loaded_ast == exp_ast
+        assert loaded_ast is not exp_ast
+
+    def test_default_cache_rejected(self) -> None:
+        """Missing files, broken files and files from another version of the
+        compiler should be rejected without changing anything."""
+        num_parsed = parsed_default_count()
+        with TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / 'signature_defaults.pickle'
+            assert not load_default_cache(cache_path)
+            cache_path.write_bytes(b'garbage')
+            assert not load_default_cache(cache_path)
+            cache_path.write_bytes(pickle.dumps(('0' * 64, {'foo': None})))
+            assert not load_default_cache(cache_path)
+        assert parsed_default_count() == num_parsed
+
+    def test_default_cache_planted(self) -> None:
+        """Files that try to load anything besides the compiler's own classes
+        should be rejected without running any of their code."""
+        num_parsed = parsed_default_count()
+        with TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / 'signature_defaults.pickle'
+            marker_path = Path(tmp_dir) / 'planted'
+            cache_path.write_bytes(pickle.dumps(
+                (compiler_stamp(), {'foo': PlantedPickle(marker_path)})))
+            assert not load_default_cache(cache_path)
+            assert not marker_path.exists()
+        assert parsed_default_count() == num_parsed
+
+# Validation cache tests begin here
+class TestValidationCache(ATestParser):
+    """Identical commands reuse the validated arguments of the first one, but
+    with their own argument nodes and values."""
+    _test_src = '\n'.join(['\\def_alias[a; Some *value*]',
+                           '\\def_alias[b; Some *value*]',
+                           '\\def_alias[a; Some *value*]'])
+
+    def test_identical_commands(self):
+        """Validates the same command twice in one file."""
+        test_ast = self._parse_src(skip_validation=False)
+        first_cmd, _other_cmd, second_cmd = \
+            test_ast.node_index.all_commands()
+        assert first_cmd.canonical() == second_cmd.canonical()
+        for cmd_node in (first_cmd, second_cmd):
+            proc_cmd = cmd_node.proc_cmd
+            assert proc_cmd.cmd_args['key'] == 'a'
+            assert proc_cmd.cmd_args['val'] is (
+                cmd_node.arguments[1].arg_value)
+            assert proc_cmd.cmd_arg_nodes == {'key': cmd_node.arguments[0],
+                                              'val': cmd_node.arguments[1]}
+        assert (first_cmd.proc_cmd.cmd_args is not
+                second_cmd.proc_cmd.cmd_args)
+        assert (second_cmd.proc_cmd.cmd_arg_nodes['key'].src_pos !=
+                first_cmd.proc_cmd.cmd_arg_nodes['key'].src_pos)
+
+    def test_identical_headers(self):
+        """Validates two files with the same header, which has varargs, with
+        the same validator."""
+        header_src = '\\header[chapter; some; more = stuff]\n'
+        ast_validator = ASTValidator()
+        header_nodes = []
+        for _i in range(2):
+            test_ast = self._parse_src(header_src)
+            ast_validator.visit(test_ast)
+            header_nodes.append(test_ast.header)
+        for header_node in header_nodes:
+            proc_cmd = header_node.proc_cmd
+            assert proc_cmd.cmd_args == {'header_kind': HeaderKind.CHAPTER}
+            assert proc_cmd.cmd_varargs == [
+                a.arg_value for a in header_node.arguments[1:]]
+            assert proc_cmd.cmd_vararg_nodes == header_node.arguments[1:]
+            assert all(a is b for a, b in zip(proc_cmd.cmd_vararg_nodes,
+                                              header_node.arguments[1:]))
+
+    def test_no_ast_references(self):
+        """The cache must not keep any part of the validated ASTs alive."""
+        ast_validator = ASTValidator()
+        ast_validator.visit(self._parse_src())
+        # pylint: disable=protected-access
+        cached_vals = list(ast_validator._cached_args.values())
+        assert len(cached_vals) == 3
+        while cached_vals:
+            cached_val = cached_vals.pop()
+            assert not isinstance(cached_val, AASTNode)
+            if isinstance(cached_val, _CachedArgs):
+                cached_vals.extend(getattr(cached_val, a)
+                                   for a in _CachedArgs.__slots__)
+            elif isinstance(cached_val, tuple):
+                cached_vals.extend(cached_val)
+
+    def test_identical_invalid_commands(self):
+        """Invalid commands are never cached, so every occurrence fails."""
+        ast_validator = ASTValidator()
+        for _i in range(2):
+            with pytest.raises(ValidationError):
+                ast_validator.visit(self._parse_src(
+                    '\\def_alias[two words; value]'))
+
 # Compact representation tests begin here
 class _ATestSigCR:
     """Base class for compact representation tests."""
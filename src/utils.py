@@ -20,11 +20,15 @@
 #
 # =============================================================================
 """Random utility functions and classes that didn't fit anywhere else."""
+import hashlib
+import pickle
+from functools import cache
 from itertools import groupby
 from os import PathLike
+from pathlib import Path
 
 import log
-from exception import ProjectStructureError
+from exception import AbstractError, ProjectStructureError
 
 def is_contiguous(l: list[int]) -> bool:
     """Returns True if the specified list of integers is contiguous. In other
@@ -65,3 +69,67 @@ def format_word_list(word_list: list[str]) -> str:
     # We have more than two words, so put commas between all the others
     first_few = ', '.join(quoted_words[:-2])
     return f'{first_few}, {last_two}'
+
+@cache
+def compiler_stamp() -> str:
+    """Returns a version stamp for this build of the Zoia compiler. It is
+    derived from the contents of every Python source file making up the
+    compiler (grammar included), so any change to the compiler results in a
+    new stamp. Meant to be used for invalidating persistent caches."""
+    src_root = Path(__file__).resolve().parent
+    stamp_hash = hashlib.sha256()
+    for py_path in sorted(src_root.rglob('*.py')):
+        py_rel = py_path.relative_to(src_root)
+        if py_rel.parts[0] == 'test':
+            continue # Tests do not influence the compiler's output
+        stamp_hash.update(py_rel.as_posix().encode('utf-8'))
+        stamp_hash.update(py_path.read_bytes())
+    return stamp_hash.hexdigest()
+
+class AClosable:
+    """Base class for objects that have to be closed once they are no longer
+    needed. They can be used as context managers, which closes them on
+    exit."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Releases whatever this object holds on to."""
+        raise AbstractError()
+
+class CacheUnpickler(pickle.Unpickler):
+    """Unpickler for the compiler's persistent caches. The caches live inside
+    the project folder, so they have to be treated as untrusted input. Unlike
+    a regular unpickler, this one only resolves classes defined in the
+    packages listed in _allowed_packages, plus the globals listed in
+    _allowed_globals. Anything else (e.g. os.system) raises an
+    UnpicklingError, so a planted cache file can't run arbitrary code."""
+    _allowed_packages: tuple[str, ...] = ('ast_nodes', 'commands', 'src_pos',
+                                          'validation')
+    _allowed_globals: frozenset[tuple[str, str]] = frozenset()
+    __slots__ = ()
+
+    def find_class(self, module: str, name: str):
+        """Resolves the specified global, but only if it is allowed."""
+        if (module, name) in self._allowed_globals:
+            return super().find_class(module, name)
+        if '.' not in name and self._is_allowed_module(module):
+            found_global = super().find_class(module, name)
+            # Only classes, and only ones that are actually defined in an
+            # allowed package, not imported into one
+            if (isinstance(found_global, type) and
+                    self._is_allowed_module(found_global.__module__)):
+                return found_global
+        raise pickle.UnpicklingError(
+            f'Refusing to load {module}.{name} from a cache file')
+
+    def _is_allowed_module(self, module: str) -> bool:
+        """Checks if the specified module is one of the allowed packages or
+        inside one of them."""
+        return any(module == p or module.startswith(f'{p}.')
+                   for p in self._allowed_packages)
@@ -20,8 +20,14 @@
 #
 # =============================================================================
 """This module provides the ability to specify optional parameters by provding
-default values for validators."""
+default values for validators. Default values are only parsed once they are
+first needed. The parsed values can be saved to a file and loaded again in a
+later run, see save_default_cache and load_default_cache."""
+import copy
+import os
+import pickle
 from dataclasses import dataclass, field
+from pathlib import Path
 from typing import Any
 
 from validation.base import _ACmdValidator
@@ -29,8 +35,31 @@ from validation.tys import ATy
 
 from ast_nodes import LineElementsNode
 from exception import ValidationError
+from utils import CacheUnpickler, compiler_stamp
 from zoia_processor import process_zoia_arg
 
+__all__ = ['Default', 'load_default_cache', 'parsed_default_count',
+           'save_default_cache']
+
+# Maps the strings of all default values parsed so far (or loaded from a
+# cache file) to their validated ASTs. These are never handed out directly,
+# see _parse_default
+_parsed_defaults: dict[str, LineElementsNode] = {}
+# Marks Defaults whose value has not been parsed yet
+_UNPARSED = object()
+
+def _parse_default(default_str: str) -> LineElementsNode:
+    """Returns the validated AST for the specified default value string,
+    parsing it if it hasn't been parsed before. Each call returns a copy of
+    its own, so that changing the default value of one Default can't affect
+    any other Default with the same string (or the cache)."""
+    try:
+        default_ast = _parsed_defaults[default_str]
+    except KeyError:
+        default_ast = process_zoia_arg(default_str, '<Signature default>')
+        _parsed_defaults[default_str] = default_ast
+    return copy.deepcopy(default_ast)
+
 @dataclass(slots=True)
 class Default(_ACmdValidator):
     """A validator that provides a default value for a validator, thereby
@@ -39,16 +68,26 @@ class Default(_ACmdValidator):
     zoia_processor.process_zoia_arg."""
     ty: ATy
     _default_str: str = field(repr=False)
-    default: Any = field(init=False)
+    _default_val: Any = field(default=_UNPARSED, init=False, repr=False,
+                              compare=False)
+
+    @property
+    def default(self) -> Any:
+        """The default value, parsed from the argument string when it is
+        first needed (see init_default_value)."""
+        if self._default_val is _UNPARSED:
+            self.init_default_value()
+        return self._default_val
 
     def init_default_value(self):
         """Parses and validates this Default's argument string into an actual
-        default value. Called once all signatures are defined to avoid
-        situations where validation of a value may end up needing to validate
-        itself, which would cause a stack overflow."""
+        default value. Only called once the value is needed, at which point
+        all signatures have been defined. That avoids situations where
+        validation of a value may end up needing to validate itself, which
+        would cause a stack overflow."""
         try:
-            self.default = self.validate_arg(process_zoia_arg(
-                self._default_str, '<Signature default>'))
+            self._default_val = self.validate_arg(_parse_default(
+                self._default_str))
         except ValidationError as e:
             raise SyntaxError('Failed to validate a Signature default '
                               'value') from e
@@ -58,3 +97,41 @@ class Default(_ACmdValidator):
 
     def compact(self) -> str:
         return f'{self.ty.compact()} = {self._default_str}'
+
+def parsed_default_count() -> int:
+    """Returns the number of default values that have been parsed (or loaded)
+    so far. Useful for checking if saving them is worth it."""
+    return len(_parsed_defaults)
+
+def save_default_cache(cache_path: Path) -> None:
+    """Saves all default values parsed so far to the specified file. The file
+    is written atomically, so a concurrent load_default_cache never sees a
+    partial file. Raises OSError if the file can't be written."""
+    tmp_path = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with tmp_path.open('wb') as out:
+            pickle.dump((compiler_stamp(), _parsed_defaults), out,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+def load_default_cache(cache_path: Path) -> bool:
+    """Adds the default values saved in the specified file by
+    save_default_cache to the ones parsed so far. Returns False if the file
+    does not exist, is broken, was created by a different version of the
+    compiler or tries to load anything besides the compiler's own classes (see
+    utils.CacheUnpickler), in which case nothing is changed."""
+    try:
+        with cache_path.open('rb') as ins:
+            cache_stamp, cached_defaults = CacheUnpickler(ins).load()
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+            ImportError, IndexError, TypeError, ValueError):
+        return False
+    if cache_stamp != compiler_stamp() or not isinstance(cached_defaults,
+                                                         dict):
+        return False
+    for default_str, default_ast in cached_defaults.items():
+        _parsed_defaults.setdefault(default_str, default_ast)
+    return True
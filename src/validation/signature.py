@@ -32,9 +32,8 @@ from validation.tys import ATy, NoneTy
 from validation.varargs import Varargs, VARARGS_EITHER_OR, VARARGS_KWD, \
     VARARGS_STD
 
-from ast_nodes import CommandNode, KwdArgumentNode
-from exception import ValidationError, InternalError
-from src_pos import SourcePos
+from ast_nodes import AArgumentNode, CommandNode, KwdArgumentNode
+from exception import ValidationError
 from utils import format_word_list
 
 # Sentinel object used to indicate that the next parsed parameter is not a
@@ -61,6 +60,130 @@ def _raise_if_unfilled(unfilled_params: list[str],
         raise ValidationError(error_pos, f'The required arguments '
                                          f'{fmt_unfilled} are missing')
 
+@dataclass(slots=True)
+class _ArgBinder:
+    """Binds the arguments of a command to the parameters of a Signature.
+    Precomputes everything that validate_args would otherwise have to derive
+    from the signature's validator dicts for every single command, see
+    Signature.compile_binder."""
+    # The names and validators of all parameters that accept standard
+    # arguments, in the order in which standard arguments fill them
+    std_params: tuple[tuple[str, _ACmdValidator], ...]
+    # Maps the names of all parameters to the validator to use when they are
+    # filled by a keyword argument (None for std-only parameters, which are
+    # still needed to detect parameters that were specified twice)
+    kwd_params: dict[str, _ACmdValidator | None]
+    # The Default of each parameter (or None if it is required), in signature
+    # order. Their values are only looked up once they are needed, see
+    # Default.default
+    param_defaults: tuple[tuple[str, Default | None], ...]
+    # The varargs, if they accept standard/keyword arguments
+    std_varargs: Varargs | None
+    kwd_varargs: Varargs | None
+    accepts_std: bool = field(init=False)
+    accepts_kwd: bool = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.accepts_std = bool(self.std_params) or bool(self.std_varargs)
+        self.accepts_kwd = (self._num_kwd_params() > 0 or
+                            bool(self.kwd_varargs))
+
+    def _num_kwd_params(self) -> int:
+        """Returns the number of parameters that accept keyword arguments,
+        not counting the varargs."""
+        return sum(kwd_v is not None for kwd_v in self.kwd_params.values())
+
+    def _fill_defaults(self, filled_params: dict[str],
+                       filled_params_nodes: dict[str, AArgumentNode | None],
+                       cmd_node: CommandNode) -> None:
+        """Fills the specified parameters and parameter nodes with default
+        values for all unfilled optional parameters and raises an error if any
+        required parameters are unfilled."""
+        unfilled_params = []
+        for param_n, param_default in self.param_defaults:
+            if param_n not in filled_params:
+                if param_default is None:
+                    unfilled_params.append(param_n)
+                else:
+                    filled_params[param_n] = param_default.default
+                    # No argument node since it was a default argument
+                    filled_params_nodes[param_n] = None
+        _raise_if_unfilled(unfilled_params, cmd_node)
+
+    def bind_args(self, cmd_node: CommandNode) \
+            -> tuple[dict[str, Any], dict[str, AArgumentNode | None],
+                     list[Any], list[AArgumentNode]]:
+        """Implements Signature.validate_args in a single pass over the
+        arguments of the specified command."""
+        # This is the hot path of validation, so avoid splitting it up
+        # pylint: disable=too-many-branches
+        filled_params = {}
+        filled_params_nodes = {}
+        varargs_list = []
+        varargs_list_nodes = []
+        found_kwd = False
+        std_params = self.std_params
+        num_std_filled = 0
+        for cmd_arg in cmd_node.arguments:
+            if isinstance(cmd_arg, KwdArgumentNode):
+                if not self.accepts_kwd:
+                    raise ValidationError(
+                        cmd_arg.src_pos,
+                        f'\\{cmd_node.cmd_name} does not accept keyword '
+                        f'arguments')
+                # Once we've found a keyword argument, reject all further
+                # standard arguments
+                found_kwd = True
+                kwd_arg_name = cmd_arg.kwd_name
+                if kwd_arg_name in filled_params:
+                    raise ValidationError(
+                        cmd_arg.src_pos,
+                        f"Keyword argument '{kwd_arg_name}' specified twice")
+                next_validator = self.kwd_params.get(kwd_arg_name)
+                if next_validator is None:
+                    next_validator = self.kwd_varargs
+                    if next_validator is None:
+                        raise ValidationError(
+                            cmd_arg.src_pos,
+                            f'All {self._num_kwd_params()} parameters that '
+                            f'accept keyword arguments have been filled')
+                    kwd_arg_name = _VARARGS_SENTINEL
+            else:
+                if not self.accepts_std:
+                    raise ValidationError(
+                        cmd_arg.src_pos,
+                        f'\\{cmd_node.cmd_name} does not accept standard '
+                        f'arguments')
+                if found_kwd:
+                    raise ValidationError(
+                        cmd_arg.src_pos,
+                        'Standard arguments may not be placed after keyword '
+                        'arguments')
+                # No keyword arguments so far, so standard arguments fill the
+                # parameters strictly in order
+                if num_std_filled < len(std_params):
+                    kwd_arg_name, next_validator = std_params[num_std_filled]
+                    num_std_filled += 1
+                else:
+                    next_validator = self.std_varargs
+                    if next_validator is None:
+                        raise ValidationError(
+                            cmd_arg.src_pos,
+                            f'All {len(std_params)} parameters that '
+                            f'accept standard arguments have been filled')
+                    kwd_arg_name = _VARARGS_SENTINEL
+            processed_arg = next_validator.validate_arg(cmd_arg.arg_value)
+            if kwd_arg_name is _VARARGS_SENTINEL:
+                varargs_list.append(processed_arg)
+                varargs_list_nodes.append(cmd_arg)
+            else:
+                filled_params[kwd_arg_name] = processed_arg
+                filled_params_nodes[kwd_arg_name] = cmd_arg
+        if len(filled_params) != len(self.param_defaults):
+            self._fill_defaults(filled_params, filled_params_nodes, cmd_node)
+        return (filled_params, filled_params_nodes, varargs_list,
+                varargs_list_nodes)
+
 @dataclass(slots=True, kw_only=True)
 class Signature:
     """The Signature class describes a command's signature, specifying what
@@ -72,6 +195,9 @@ class Signature:
     kwd_only: dict[str, _ACmdValidator] = field(default_factory=dict)
     varargs: Varargs | None = None
     ret_ty: ATy = field(default_factory=NoneTy)
+    # See compile_binder
+    _binder: _ArgBinder | None = field(default=None, init=False, repr=False,
+                                       compare=False)
 
     def __post_init__(self) -> None:
         # Once we've found a Default, all later validators must be Defaults too
@@ -130,93 +256,6 @@ class Signature:
         return self.varargs and self.varargs.va_kind in (VARARGS_EITHER_OR,
                                                          VARARGS_KWD)
 
-    def _accepts_standards(self) -> bool:
-        """Returns True if this signature could accept standard arguments."""
-        return (self.std_only or self.either_or or
-                self._varargs_accept_standards())
-
-    def _accepts_keywords(self) -> bool:
-        """Returns True if this signature could accept keyword arguments."""
-        return (self.either_or or self.kwd_only or
-                self._varargs_accept_keywords())
-
-    def _num_std_params(self) -> int:
-        """Returns the number of parameters in this signature that could accept
-        a standard argument. Raises an internal error if varargs are present
-        and could accept standard arguments, since in that case an infinite
-        number of standard arguments could be accepted."""
-        if self._varargs_accept_standards():
-            raise InternalError('_num_std_params may not be called if '
-                                'varargs accept standard arguments')
-        return len(self.std_only) + len(self.either_or)
-
-    def _num_kwd_params(self) -> int:
-        """Returns the number of parameters in this signature that could accept
-        a keyword argument. Raises an internal error if varargs are present
-        and could accept keyword arguments, since in that case an infinite
-        number of keyword arguments could be accepted"""
-        if self._varargs_accept_keywords():
-            raise InternalError('_num_kwd_params may not be called if '
-                                'varargs accept keyword arguments')
-        return len(self.either_or) + len(self.kwd_only)
-
-    def _next_std_param(self, filled_params: dict[str]) \
-            -> tuple[str | object | None, _ACmdValidator | None]:
-        """Given the specified already filled parameters, returns the name and
-        validator for the next parameter that can accept a standard argument.
-        Returns _VARARGS_SENTINEL if the next parameter is the varargs and None
-        if all parameters that can accept standard arguments have been
-        filled."""
-        for std_n, std_v in self.std_only.items():
-            if std_n not in filled_params:
-                return std_n, std_v
-        for eo_n, eo_v in self.either_or.items():
-            if eo_n not in filled_params:
-                return eo_n, eo_v
-        if self._varargs_accept_standards():
-            return _VARARGS_SENTINEL, self.varargs
-        # No more std args to fill
-        return None, None
-
-    def _next_kwd_param(self, kwd_arg_name: str) \
-            -> tuple[str | object | None, _ACmdValidator | None]:
-        """Given the specified keyword argument name, returns the name and
-        validator for the next parameter that can accept said keyword argument.
-        Returns _VARARGS_SENTINEL if the next parameter is the varargs and None
-        if all parameters that can accept said keyword argument have been
-        filled."""
-        kwd_validator = self.either_or.get(kwd_arg_name)
-        if kwd_validator is not None:
-            return kwd_arg_name, kwd_validator
-        kwd_validator = self.kwd_only.get(kwd_arg_name)
-        if kwd_validator is not None:
-            return kwd_arg_name, kwd_validator
-        if self._varargs_accept_keywords():
-            return _VARARGS_SENTINEL, self.varargs
-        # No more kwd args to fill
-        return None, None
-
-    def _fill_defaults(self, filled_params: dict[str],
-                       filled_params_pos: dict[str, SourcePos | None]) \
-            -> list[str]:
-        """Fills the specified parameters and parameter positions with default
-        values for all optional parameters and returns a list of parameter
-        names for all unfilled required parameters."""
-        unfilled_params = []
-        def _fill_from_dict(cv_dict: dict[str, _ACmdValidator]) -> None:
-            for cv_n, cv_v in cv_dict.items():
-                if cv_n not in filled_params:
-                    if isinstance(cv_v, Default):
-                        filled_params[cv_n] = cv_v.default
-                        # No source position since it was a default argument
-                        filled_params_pos[cv_n] = None
-                    else:
-                        unfilled_params.append(cv_n)
-        _fill_from_dict(self.std_only)
-        _fill_from_dict(self.either_or)
-        _fill_from_dict(self.kwd_only)
-        return unfilled_params
-
     # Public API begins here
     def compact(self) -> str:
         """Returns the compact signature representation of this signature as a
@@ -241,8 +280,9 @@ class Signature:
 
     def init_default_values(self) -> None:
         """Initializes this signature's default values by parsing their string
-        representations. Called by finalize_command once all command modules
-        have been imported and all command signatures have been created."""
+        representations right away. Commands don't need to call this, every
+        default value is parsed when it is first used (see Default.default),
+        but it is useful for checking that all of them are valid."""
         def _init_defaults(cv_dict: dict[str, _ACmdValidator]) -> None:
             for cv_v in cv_dict.values():
                 if isinstance(cv_v, Default):
@@ -251,78 +291,36 @@ class Signature:
         _init_defaults(self.either_or)
         _init_defaults(self.kwd_only)
 
+    def compile_binder(self) -> None:
+        """Compiles the binder that validate_args uses to bind arguments to
+        this signature's parameters. Called by finalize_command once all
+        command signatures have been created. If it hasn't been called,
+        validate_args compiles the binder when it is first called."""
+        kwd_params = {std_n: None for std_n in self.std_only}
+        kwd_params.update(self.either_or)
+        kwd_params.update(self.kwd_only)
+        self._binder = _ArgBinder(
+            (*self.std_only.items(), *self.either_or.items()), kwd_params,
+            tuple((cv_n, cv_v if isinstance(cv_v, Default) else None)
+                  for cv_dict in (self.std_only, self.either_or,
+                                  self.kwd_only)
+                  for cv_n, cv_v in cv_dict.items()),
+            self.varargs if self._varargs_accept_standards() else None,
+            self.varargs if self._varargs_accept_keywords() else None)
+
     def validate_args(self, cmd_node: CommandNode) \
-            -> tuple[dict[str, Any], dict[str, SourcePos | None],
-                     list[Any], list[SourcePos]]:
+            -> tuple[dict[str, Any], dict[str, AArgumentNode | None],
+                     list[Any], list[AArgumentNode]]:
         """Given a CommandNode, processes and validates all its arguments and
         returns them in a tuple containing a dict mapping command names to
-        their processed values, a dict mapping command names to their origin
-        source positions (or None if it was a default value), a list of
-        processed varargs values and a list of varargs source positions."""
-        filled_params = {}
-        filled_params_pos = {}
-        varargs_list = []
-        varargs_list_pos = []
-        found_kwd = False
-        accepts_std = self._accepts_standards()
-        accepts_kwd = self._accepts_keywords()
-        for cmd_arg in cmd_node.arguments:
-            # First extract the next parameter name and validator, which
-            # differs between standard and keyword arguments
-            if isinstance(cmd_arg, KwdArgumentNode):
-                if not accepts_kwd:
-                    raise ValidationError(
-                        cmd_arg.src_pos,
-                        f'\\{cmd_node.cmd_name} does not accept keyword '
-                        f'arguments')
-                # Once we've found a keyword argument, reject all further
-                # standard arguments
-                found_kwd = True
-                kwd_arg_name = cmd_arg.kwd_name
-                if kwd_arg_name in filled_params:
-                    raise ValidationError(
-                        cmd_arg.src_pos,
-                        f"Keyword argument '{kwd_arg_name}' specified twice")
-                next_param_name, next_validator = self._next_kwd_param(
-                    kwd_arg_name)
-                if next_param_name is None:
-                    raise ValidationError(
-                        cmd_arg.src_pos,
-                        f'All {self._num_kwd_params()} parameters that accept '
-                        f'keyword arguments have been filled')
-            else:
-                if not accepts_std:
-                    raise ValidationError(
-                        cmd_arg.src_pos,
-                        f'\\{cmd_node.cmd_name} does not accept standard '
-                        f'arguments')
-                if found_kwd:
-                    raise ValidationError(
-                        cmd_arg.src_pos,
-                        'Standard arguments may not be placed after keyword '
-                        'arguments')
-                next_param_name, next_validator = self._next_std_param(
-                    filled_params)
-                if next_param_name is None:
-                    raise ValidationError(
-                        cmd_arg.src_pos,
-                        f'All {self._num_std_params()} parameters that accept '
-                        f'standard arguments have been filled')
-            # We have a name and a validator for the next parameter, so process
-            # and store, making sure to check if we're going to store to
-            # varargs instead of regular parameters
-            processed_arg = next_validator.validate_arg(cmd_arg.arg_value)
-            if next_param_name is _VARARGS_SENTINEL:
-                varargs_list.append(processed_arg)
-                varargs_list_pos.append(cmd_arg.src_pos)
-            else:
-                filled_params[next_param_name] = processed_arg
-                filled_params_pos[next_param_name] = cmd_arg.src_pos
-        # All arguments processed, fill optional parameters with defaults and
-        # raise an error if required arguments are missing
-        unfilled_params = self._fill_defaults(filled_params, filled_params_pos)
-        _raise_if_unfilled(unfilled_params, cmd_node)
-        return filled_params, filled_params_pos, varargs_list, varargs_list_pos
+        their processed values, a dict mapping command names to the argument
+        nodes they came from (or None if it was a default value), a list of
+        processed varargs values and a list of varargs argument nodes. The
+        nodes are returned instead of their source positions, since those are
+        only needed to report errors (see AASTNode.src_pos)."""
+        if self._binder is None:
+            self.compile_binder()
+        return self._binder.bind_args(cmd_node)
 
     def __repr__(self) -> str:
         return self.compact()
@@ -23,25 +23,42 @@
 from dataclasses import dataclass
 
 from validation.tys.any_ty import AnyTy
+from validation.tys.ty import ATy
 
 from ast_nodes import LineElementsNode, CommandNode
 from ast_visitor import ACommandVisitor
 from commands import get_command_type
 from exception import ValidationError
 
+# Maps command types and ty classes to whether the return type of the command
+# type is an instance of the ty class. Command signatures never change once
+# the commands have been initialized, so this only has to be checked once
+_ret_ty_checks: dict[tuple[type, type[ATy]], bool] = {}
+
 @dataclass(slots=True)
-class _ContentValidator(ACommandVisitor):
-    """Command visitor that ensures every command in the value has a non-None
-    return type."""
+class _RetTyValidator(ACommandVisitor):
+    """Command visitor that ensures every command in the value has a return
+    type that is an instance of ret_ty_class. Shared by Content and all its
+    subtypes, so that only the most specific return type has to be checked in
+    a single walk over the value."""
     parent_ty_name: str
+    ret_ty_class: type[ATy]
+    ret_ty_desc: str
 
     def visit_command(self, node: CommandNode):
-        if not isinstance(get_command_type(node).signature.ret_ty, ContentTy):
+        cmd_type = get_command_type(node)
+        check_key = cmd_type, self.ret_ty_class
+        try:
+            ret_ty_ok = _ret_ty_checks[check_key]
+        except KeyError:
+            ret_ty_ok = _ret_ty_checks[check_key] = isinstance(
+                cmd_type.signature.ret_ty, self.ret_ty_class)
+        if not ret_ty_ok:
             raise ValidationError(
                 node.src_pos,
                 f'Parameters of type {self.parent_ty_name} only accept '
-                f'Content, but \\{node.cmd_name} returns '
-                f'{get_command_type(node).signature.ret_ty.compact()}')
+                f'{self.ret_ty_desc}, but \\{node.cmd_name} returns '
+                f'{cmd_type.signature.ret_ty.compact()}')
         super().visit_command(node)
 
 class ContentTy(AnyTy):
@@ -49,8 +66,22 @@ class ContentTy(AnyTy):
     result in something visible in the output (in at least one backend - not
     every backend will support every kind of Content)."""
     _ty_name = 'Content'
+    # How to refer to _cmd_ret_ty in errors
+    _cmd_ret_desc = 'Content'
     __slots__ = ()
 
     def validate_arg(self, cmd_arg: LineElementsNode):
-        _ContentValidator(self._ty_name).visit(cmd_arg)
-        return super().validate_arg(cmd_arg)
+        self._check_commands(cmd_arg)
+        return cmd_arg
+
+    @staticmethod
+    def _cmd_ret_ty() -> type[ATy]:
+        """Returns the ty class that the return types of all commands in a
+        value of this type have to be instances of."""
+        return ContentTy
+
+    def _check_commands(self, cmd_arg: LineElementsNode) -> None:
+        """Checks the return type of every command in the specified value
+        against this type's _cmd_ret_ty."""
+        _RetTyValidator(self._ty_name, self._cmd_ret_ty(),
+                        self._cmd_ret_desc).visit(cmd_arg)
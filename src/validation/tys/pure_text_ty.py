@@ -20,11 +20,9 @@
 #
 # =============================================================================
 """This module implements the PureText type."""
-from io import StringIO
-
 from validation.tys.text_ty import TextTy
 
-from ast_nodes import LineElementsNode, TextFragmentNode
+from ast_nodes import LineElementsNode, CommandNode, TextFragmentNode
 from exception import ValidationError
 
 class PureTextTy(TextTy):
@@ -34,13 +32,21 @@ class PureTextTy(TextTy):
     __slots__ = ()
 
     def validate_arg(self, cmd_arg: LineElementsNode):
-        super().validate_arg(cmd_arg)
-        s = StringIO()
+        text_parts = []
+        first_command = None
         for arg_element in cmd_arg.elements:
-            if not isinstance(arg_element, TextFragmentNode):
-                raise ValidationError(
-                    arg_element.src_pos,
-                    f'Parameters of type {self._ty_name} only accept text '
-                    f'fragments')
-            s.write(arg_element.text_val)
-        return s.getvalue().strip()
+            if isinstance(arg_element, TextFragmentNode):
+                text_parts.append(arg_element.text_val)
+            elif isinstance(arg_element, CommandNode):
+                if first_command is None:
+                    first_command = arg_element
+            else:
+                raise self._not_text_error(arg_element)
+        if first_command is not None:
+            # Commands that don't return Text get the more specific error
+            self._check_commands(cmd_arg)
+            raise ValidationError(
+                first_command.src_pos,
+                f'Parameters of type {self._ty_name} only accept text '
+                f'fragments')
+        return ''.join(text_parts).strip()
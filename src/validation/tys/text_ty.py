@@ -20,45 +20,41 @@
 #
 # =============================================================================
 """This module implements the Text type."""
-from dataclasses import dataclass
-
 from validation.tys.content_ty import ContentTy
 
 from ast_nodes import LineElementsNode, CommandNode, TextFragmentNode
-from ast_visitor import ACommandVisitor
-from commands import get_command_type
 from exception import ValidationError
 
-@dataclass(slots=True)
-class _TextValidator(ACommandVisitor):
-    """Command visitor that ensures every command in the value has a PureText
-    or Text return type."""
-    parent_ty_name: str
-
-    def visit_command(self, node: CommandNode):
-        cmd_ret_ty = get_command_type(node).signature.ret_ty
-        if not isinstance(cmd_ret_ty, TextTy):
-            raise ValidationError(
-                node.src_pos,
-                f'Parameters of type {self.parent_ty_name} only accept '
-                f'Text and its subtypes, but \\{node.cmd_name} returns '
-                f'{cmd_ret_ty.compact()}')
-        super().visit_command(node)
-
 class TextTy(ContentTy):
     """A parameter of type Text will accept any value that will eventually
     result in PureText after evaluating it (in other words, its return type
     must be Text or a subtype of Text)."""
     _ty_name = 'Text'
+    _cmd_ret_desc = 'Text and its subtypes'
     __slots__ = ()
 
+    @staticmethod
+    def _cmd_ret_ty() -> type[ContentTy]:
+        return TextTy
+
     def validate_arg(self, cmd_arg: LineElementsNode):
+        found_command = False
         for arg_element in cmd_arg.elements:
-            if not isinstance(arg_element, (TextFragmentNode, CommandNode)):
-                raise ValidationError(
-                    arg_element.src_pos,
-                    f'Parameters of type {self._ty_name} only accept text '
-                    f'fragments and commands with a return type of Text (or '
-                    f'one of its subtypes)')
-        _TextValidator(self._ty_name).visit(cmd_arg)
-        return super().validate_arg(cmd_arg)
+            if isinstance(arg_element, CommandNode):
+                found_command = True
+            elif not isinstance(arg_element, TextFragmentNode):
+                raise self._not_text_error(arg_element)
+        # Text fragments can't contain commands, so we only have to look for
+        # them if there are commands at the top level
+        if found_command:
+            self._check_commands(cmd_arg)
+        return cmd_arg
+
+    def _not_text_error(self, arg_element) -> ValidationError:
+        """Returns the error to raise for the specified element, which is
+        neither a text fragment nor a command."""
+        return ValidationError(
+            arg_element.src_pos,
+            f'Parameters of type {self._ty_name} only accept text fragments '
+            f'and commands with a return type of Text (or one of its '
+            f'subtypes)')
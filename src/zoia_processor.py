@@ -21,17 +21,24 @@
 # =============================================================================
 """High-level interface for parsing a Zoia file and converting it into an
 AST."""
+import re
+from array import array
+from bisect import bisect_right
 from pathlib import Path
 
-from _vendor.antlr4 import FileStream, InputStream, Token
-from _vendor.antlr4.tree.Tree import ParseTree
+from _vendor.antlr4 import InputStream, MappedFileStream, Token
 
-from ast_nodes import ZoiaFileNode, LineElementsNode
+from ast_nodes import AASTNode, AArgumentNode, AEmLineElementNode, \
+    CommandNode, LeafPool, LineElementsNode, LineNode, TextFragmentNode, \
+    ZoiaFileNode
 from ast_validator import ASTValidator
+from ast_visitor import AASTVisitor
+from direct_parser import parse_zoia_arg, parse_zoia_file, parse_zoia_lines
 from exception import ParsingError
 from grammar import parse, SA_ErrorListener
 from parse_converter import ParseConverter
-from src_pos import SourcePos
+from parsing import parse_zoia_file_streaming
+from src_pos import SHARED_PACKED, SourcePos, pack_pos, packed_line
 
 class _RaiseErrorListener(SA_ErrorListener):
     """Error listener that reports parsing errors to our logging framework."""
@@ -59,43 +66,243 @@ class _RaiseErrorListener(SA_ErrorListener):
 
 _validate_ast = ASTValidator().visit
 
-def _process_shared(parse_tree: ParseTree, src_name: str,
+def _process_shared(zoia_ast: ZoiaFileNode | LineElementsNode,
                     skip_validation: bool):
-    """Shared code of process_zoia_file and process_zoia_string."""
-    ret_ast = ParseConverter(src_name).visit(parse_tree)
+    """Shared code of process_zoia_file, process_zoia_string and
+    process_zoia_arg."""
     if not skip_validation:
-        _validate_ast(ret_ast)
-    return ret_ast
+        _validate_ast(zoia_ast)
+    return zoia_ast
+
+def _antlr_parse_file(ins: InputStream, src_name: str,
+                      err_listener: SA_ErrorListener, stream_tokens: bool,
+                      leaf_pool: LeafPool | None) -> ZoiaFileNode:
+    """Parses the specified stream as a whole Zoia file via ANTLR and converts
+    the resulting parse tree. See process_zoia_file for stream_tokens and
+    leaf_pool."""
+    parse_converter = ParseConverter(src_name, leaf_pool)
+    if not stream_tokens:
+        return parse_converter.visit(parse(ins, 'zoiaFile',
+                                           sa_err_listener=err_listener))
+    line_nodes = []
+    add_line = line_nodes.append
+    visit_line = parse_converter.visitLine
+    file_ctx = parse_zoia_file_streaming(
+        ins, lambda line_ctx: add_line(visit_line(line_ctx)),
+        sa_err_listener=err_listener)
+    return parse_converter.finish_file_node(ZoiaFileNode(
+        parse_converter.visitHeader(file_ctx.header()), line_nodes,
+        src_table=parse_converter.src_table,
+        src_packed=parse_converter.pack_pos(file_ctx)))
 
 def process_zoia_file(zoia_path: Path, project_folder: Path, *,
-                        skip_validation: bool = False) -> ZoiaFileNode:
+                        skip_validation: bool = False,
+                        use_direct_parser: bool = False,
+                        stream_tokens: bool = False,
+                        leaf_pool: LeafPool | None = None) -> ZoiaFileNode:
     """Parses the Zoia file at the specified path and converts it into a Zoia
-    AST. Also performs validation on the resulting AST."""
+    AST. Also performs validation on the resulting AST. If use_direct_parser
+    is True, the hand-written direct parser is tried first and ANTLR is only
+    used if that fails (i.e. to report the syntax error). It is off by
+    default, see the 'direct_parser' option of the 'parsing' config
+    section. If stream_tokens is True, ANTLR converts the file line by line
+    instead of building a parse tree for the whole file first, which keeps
+    its peak memory usage down for very large files (see
+    parsing.streaming_parse). If a leaf_pool is specified,
+    identical leaves of the AST are shared via it (see LeafPool)."""
     origin_path = str(zoia_path)
     # UTF-8 required by specification, so this is fine
-    ins = FileStream(origin_path, encoding='utf-8')
+    ins = MappedFileStream(origin_path, encoding='utf-8')
+    src_name = origin_path
     if zoia_path.is_relative_to(project_folder):
-        origin_path = str(zoia_path.relative_to(project_folder))
-    parse_tree = parse(ins, 'zoiaFile',
-                       sa_err_listener=_RaiseErrorListener(project_folder))
-    return _process_shared(parse_tree, origin_path, skip_validation)
+        src_name = str(zoia_path.relative_to(project_folder))
+    ret_ast = None
+    if use_direct_parser:
+        ret_ast = parse_zoia_file(ins.strdata, src_name, leaf_pool)
+    if ret_ast is None:
+        ret_ast = _antlr_parse_file(ins, src_name,
+                                    _RaiseErrorListener(project_folder),
+                                    stream_tokens, leaf_pool)
+    return _process_shared(ret_ast, skip_validation)
 
 def process_zoia_string(zoia_src: str, src_name: str, *,
-                        skip_validation: bool = False) -> ZoiaFileNode:
+                        skip_validation: bool = False,
+                        use_direct_parser: bool = False,
+                        stream_tokens: bool = False,
+                        leaf_pool: LeafPool | None = None) -> ZoiaFileNode:
     """Parses the specified string representation of a Zoia file and converts
     it into a Zoia AST. src_name specifies the name of the source to use in
-    errors etc. Also performs validation on the resulting AST."""
-    ins = InputStream(zoia_src)
-    parse_tree = parse(ins, 'zoiaFile', sa_err_listener=_RaiseErrorListener())
-    return _process_shared(parse_tree, src_name, skip_validation)
+    errors etc. Also performs validation on the resulting AST. See
+    process_zoia_file for use_direct_parser, stream_tokens and leaf_pool."""
+    ret_ast = None
+    if use_direct_parser:
+        ret_ast = parse_zoia_file(zoia_src, src_name, leaf_pool)
+    if ret_ast is None:
+        ret_ast = _antlr_parse_file(InputStream(zoia_src), src_name,
+                                    _RaiseErrorListener(), stream_tokens,
+                                    leaf_pool)
+    return _process_shared(ret_ast, skip_validation)
 
 def process_zoia_arg(zoia_line: str, src_name: str, *,
-                        skip_validation: bool = False) -> LineElementsNode:
+                        skip_validation: bool = False,
+                        use_direct_parser: bool = False,
+                        leaf_pool: LeafPool | None = None) \
+        -> LineElementsNode:
     """Parses the specified string representation of a Zoia command argument
     value and converts it into a Zoia AST. src_name specifies the name of the
     source to use in errors etc. Also performs validation on the resulting
-    AST."""
-    ins = InputStream(zoia_line)
-    parse_tree = parse(ins, 'lineElementsArg',
-                       sa_err_listener=_RaiseErrorListener())
-    return _process_shared(parse_tree, src_name, skip_validation)
+    AST. See process_zoia_file for use_direct_parser and leaf_pool."""
+    ret_ast = None
+    if use_direct_parser:
+        ret_ast = parse_zoia_arg(zoia_line, src_name, leaf_pool)
+    if ret_ast is None:
+        ins = InputStream(zoia_line)
+        parse_tree = parse(ins, 'lineElementsArg',
+                           sa_err_listener=_RaiseErrorListener())
+        ret_ast = ParseConverter(src_name, leaf_pool).visit(parse_tree)
+    return _process_shared(ret_ast, skip_validation)
+
+# ANTLR does not count a lone '\r' as a new line, so a file containing one has
+# multiple LineNodes with the same line number
+_LONE_CR_REGEX = re.compile('\r(?!\n)')
+
+def _has_lone_cr(zoia_src: str) -> bool:
+    """Checks if the specified source contains a '\r' that is not part of a
+    '\r\n'."""
+    return '\r' in zoia_src and _LONE_CR_REGEX.search(zoia_src) is not None
+
+class _SrcLineShifter(AASTVisitor):
+    """Moves every node of the visited AST down by a number of lines (or up,
+    if the number is negative). Walks the tree directly instead of going
+    through _visit_default, since this has to be fast for big files."""
+    __slots__ = ('_packed_delta',)
+
+    def __init__(self, line_delta: int) -> None:
+        # Adding this to a packed position moves it by line_delta lines
+        self._packed_delta = pack_pos(line_delta, 0)
+
+    def _visit_default(self, node: AASTNode):
+        node.src_packed += self._packed_delta
+
+    def _visit_em_line_element(self, node: AEmLineElementNode):
+        node.src_packed += self._packed_delta
+        self.visit_line_elements(node.elements)
+
+    def _visit_argument(self, node: AArgumentNode):
+        node.src_packed += self._packed_delta
+        self.visit_line_elements(node.arg_value)
+
+    def visit_line(self, node: LineNode):
+        node.src_packed += self._packed_delta
+        if l_elems := node.elements:
+            self.visit_line_elements(l_elems)
+
+    def visit_line_elements(self, node: LineElementsNode):
+        packed_delta = self._packed_delta
+        node.src_packed += packed_delta
+        if (element_packed := node.element_packed) is not None:
+            node.element_packed = array('q', [p + packed_delta
+                                              for p in element_packed])
+        for e in node.elements:
+            e.accept(self)
+
+    def visit_text_fragment(self, node: TextFragmentNode):
+        # Shared nodes don't have a position of their own, see LeafPool
+        if node.src_packed != SHARED_PACKED:
+            node.src_packed += self._packed_delta
+
+    def visit_command(self, node: CommandNode):
+        node.src_packed += self._packed_delta
+        for a in node.arguments:
+            a.accept(self)
+
+def _src_line_key(line_node) -> int:
+    """Sort key for LineNodes by their line number."""
+    return packed_line(line_node.src_packed)
+
+# pylint: disable=too-many-arguments
+def _reparse_lines(zoia_ast: ZoiaFileNode, zoia_src: str, edit_start: int,
+                   edit_end: int, replacement: str, skip_validation: bool,
+                   leaf_pool: LeafPool | None) -> bool:
+    """Implements the incremental part of reparse_zoia_edit. Returns False if
+    the edit can't be handled incrementally, in which case zoia_ast has not
+    been modified."""
+    file_lines = zoia_ast.lines
+    if not file_lines or _has_lone_cr(zoia_src) or _has_lone_cr(replacement):
+        return False
+    # Find the LineNodes that contain the start and end of the edit - a
+    # LineNode can cover multiple lines due to arguments
+    start_line = zoia_src.count('\n', 0, edit_start) + 1
+    end_line = start_line + zoia_src.count('\n', edit_start, edit_end)
+    first_index = bisect_right(file_lines, start_line, key=_src_line_key) - 1
+    if first_index < 0:
+        return False # The edit touches the header, reparse everything
+    last_index = bisect_right(file_lines, end_line, lo=first_index,
+                              key=_src_line_key) - 1
+    # The region to reparse starts at the beginning of the first LineNode's
+    # line and stops right before the line of the LineNode after the last
+    # one (or at the end of the source)
+    first_src_line = packed_line(file_lines[first_index].src_packed)
+    region_start = edit_start
+    for _i in range(start_line - first_src_line + 1):
+        region_start = zoia_src.rfind('\n', 0, region_start)
+    region_start += 1
+    if last_index + 1 < len(file_lines):
+        region_end = edit_end - 1
+        next_src_line = packed_line(file_lines[last_index + 1].src_packed)
+        for _i in range(next_src_line - end_line):
+            region_end = zoia_src.find('\n', region_end + 1)
+        region_end += 1
+    else:
+        region_end = len(zoia_src)
+    # The region still ends with an unedited newline, so this only fails if
+    # the edit introduced a syntax error - the full reparse will report it
+    new_lines = parse_zoia_lines(
+        zoia_src[region_start:edit_start] + replacement +
+        zoia_src[edit_end:region_end], zoia_ast.src_table,
+        first_src_line, leaf_pool)
+    if new_lines is None:
+        return False
+    if not skip_validation:
+        for new_line in new_lines:
+            _validate_ast(new_line)
+    line_delta = (replacement.count('\n') -
+                  zoia_src.count('\n', edit_start, edit_end))
+    if line_delta:
+        line_shifter = _SrcLineShifter(line_delta)
+        for moved_line in file_lines[last_index + 1:]:
+            line_shifter.visit(moved_line)
+    # Get the index before splicing, otherwise it may get created from the
+    # new lines already
+    node_index = zoia_ast.node_index
+    old_lines = file_lines[first_index:last_index + 1]
+    file_lines[first_index:last_index + 1] = new_lines
+    node_index.replace_lines(old_lines, new_lines)
+    return True
+
+def reparse_zoia_edit(zoia_ast: ZoiaFileNode, zoia_src: str, edit_start: int,
+                      edit_end: int, replacement: str, *,
+                      skip_validation: bool = False,
+                      leaf_pool: LeafPool | None = None) \
+        -> tuple[str, ZoiaFileNode]:
+    """Applies an edit to the source code of a Zoia file and updates the
+    specified AST, which must have been parsed from zoia_src, to match. The
+    edit replaces zoia_src[edit_start:edit_end] with replacement.
+
+    Only the LineNodes touched by the edit are reparsed and spliced into
+    zoia_ast.lines, shifting the line numbers of all following nodes as
+    needed. If the edit can't be handled that way (e.g. because it touches
+    the header), the whole file is reparsed instead. Syntax errors are
+    reported just like process_zoia_string does, in which case zoia_ast is
+    left untouched. If zoia_ast was parsed with a leaf_pool, pass the same
+    one here to share the leaves of the reparsed lines too.
+
+    Returns the edited source code and the updated AST. The latter is
+    zoia_ast itself, unless the whole file had to be reparsed."""
+    new_src = zoia_src[:edit_start] + replacement + zoia_src[edit_end:]
+    if _reparse_lines(zoia_ast, zoia_src, edit_start, edit_end, replacement,
+                      skip_validation, leaf_pool):
+        return new_src, zoia_ast
+    return new_src, process_zoia_string(new_src, zoia_ast.src_table.src_file,
+                                        skip_validation=skip_validation,
+                                        leaf_pool=leaf_pool)